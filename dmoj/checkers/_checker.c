@@ -65,6 +65,61 @@ static int check_standard(const char *judge, size_t jlen, const char *process, s
 	}
 }
 
+/* State of an incremental standard check, as returned by feed_standard. The low bits hold the kind of whitespace seen
+ * in the process output since its last token (as returned by skip_spaces), whether the first token was seen, and
+ * whether the process output is in the middle of a token; the rest hold the position in the judge output. */
+#define STREAM_SPACE_MASK 3
+#define STREAM_STARTED 4
+#define STREAM_IN_TOKEN 8
+#define STREAM_POSITION_SHIFT 4
+
+/* Matches the next chunk of process output against the judge output, the same way check_standard would.
+ * Returns the new state, or -1 if the process output can no longer be accepted. */
+static Py_ssize_t feed_standard(const char *judge, size_t jlen, const char *process, size_t plen, Py_ssize_t state) {
+	size_t j = (size_t) state >> STREAM_POSITION_SHIFT, p;
+	int ps = state & STREAM_SPACE_MASK, started = state & STREAM_STARTED, in_token = state & STREAM_IN_TOKEN;
+
+	for (p = 0; p < plen; ++p) {
+		if (iswhite(process[p])) {
+			/* The process token ended, so the judge token must have too. */
+			if (in_token && j < jlen && !iswhite(judge[j])) return -1;
+			in_token = 0;
+			if (isline(process[p]))
+				ps = 2;
+			else if (!ps)
+				ps = 1;
+			continue;
+		}
+
+		if (!in_token) {
+			if (started) {
+				int js = skip_spaces(judge, &j, jlen);
+				if (j == jlen || js != ps) return -1;
+			} else {
+				while (j < jlen && iswhite(judge[j])) ++j;
+				if (j == jlen) return -1;
+				started = STREAM_STARTED;
+			}
+			ps = 0;
+			in_token = STREAM_IN_TOKEN;
+		}
+
+		if (j >= jlen || judge[j] != process[p]) return -1;
+		++j;
+	}
+	return (Py_ssize_t) (j << STREAM_POSITION_SHIFT) | in_token | started | ps;
+}
+
+/* Returns whether the process output fed so far is accepted in its entirety. */
+static int finish_standard(const char *judge, size_t jlen, Py_ssize_t state) {
+	size_t j = (size_t) state >> STREAM_POSITION_SHIFT;
+
+	if (state < 0) return 0;
+	if ((state & STREAM_IN_TOKEN) && j < jlen && !iswhite(judge[j])) return 0;
+	while (j < jlen && iswhite(judge[j])) ++j;
+	return j == jlen;
+}
+
 static PyObject *checker_standard(PyObject *self, PyObject *args) {
 	PyObject *expected, *actual, *result;
 
@@ -90,9 +145,46 @@ static PyObject *checker_standard(PyObject *self, PyObject *args) {
 	return result;
 }
 
+static PyObject *checker_standard_feed(PyObject *self, PyObject *args) {
+	Py_buffer judge, process;
+	Py_ssize_t state;
+
+	UNREFERENCED_PARAMETER(self);
+	if (!PyArg_ParseTuple(args, "y*y*n:standard_feed", &judge, &process, &state))
+		return NULL;
+
+	if (state >= 0) {
+		Py_BEGIN_ALLOW_THREADS
+		state = feed_standard(judge.buf, judge.len, process.buf, process.len, state);
+		Py_END_ALLOW_THREADS
+	}
+	PyBuffer_Release(&judge);
+	PyBuffer_Release(&process);
+	return PyLong_FromSsize_t(state);
+}
+
+static PyObject *checker_standard_finish(PyObject *self, PyObject *args) {
+	Py_buffer judge;
+	Py_ssize_t state;
+	int result;
+
+	UNREFERENCED_PARAMETER(self);
+	if (!PyArg_ParseTuple(args, "y*n:standard_finish", &judge, &state))
+		return NULL;
+
+	result = finish_standard(judge.buf, judge.len, state);
+	PyBuffer_Release(&judge);
+	return PyBool_FromLong(result);
+}
+
 static PyMethodDef checker_methods[] = {
 	{"standard", checker_standard, METH_VARARGS,
 	 "Standard DMOJ checker."},
+	{"standard_feed", checker_standard_feed, METH_VARARGS,
+	 "Feeds a chunk of process output to an incremental standard check, starting from state 0. "
+	 "Returns the new state, which is negative once the output can no longer pass."},
+	{"standard_finish", checker_standard_finish, METH_VARARGS,
+	 "Returns whether an incremental standard check passed, given its final state."},
 	{NULL, NULL, 0, NULL}
 };
 
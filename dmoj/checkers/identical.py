@@ -1,9 +1,12 @@
 from typing import Union
 
 from dmoj.checkers._checker import standard
-from dmoj.result import CheckerResult
+from dmoj.checkers.standard import StandardStream
+from dmoj.result import CheckerResult, CheckerStream
 from dmoj.utils.unicode import utf8bytes
 
+PRESENTATION_ERROR = 'Presentation Error, check your whitespace'
+
 
 def check(process_output: bytes, judge_output: bytes, pe_allowed: bool = True, **kwargs) -> Union[CheckerResult, bool]:
     if judge_output == process_output:
@@ -11,5 +14,35 @@ def check(process_output: bytes, judge_output: bytes, pe_allowed: bool = True, *
     feedback = None
     if pe_allowed and standard(utf8bytes(judge_output), utf8bytes(process_output)):
         # in the event the standard checker would have passed the problem, raise a presentation error
-        feedback = "Presentation Error, check your whitespace"
+        feedback = PRESENTATION_ERROR
     return CheckerResult(False, 0, feedback=feedback)
+
+
+class IdenticalStream(CheckerStream):
+    def __init__(self, judge_output: bytes, pe_allowed: bool = True) -> None:
+        super().__init__()
+        self.judge_output = utf8bytes(judge_output)
+        self._position = 0
+        self._identical = True
+        # Keep track of whether the standard checker would pass, to tell apart presentation errors.
+        self._standard = StandardStream(self.judge_output) if pe_allowed else None
+
+    def _feed(self, chunk) -> bool:
+        if self._identical:
+            self._identical = self.judge_output.startswith(chunk, self._position)
+            self._position += len(chunk)
+        if self._standard is not None:
+            self._standard.feed(chunk)
+        return self._identical or (self._standard is not None and not self._standard.rejected)
+
+    def result(self) -> Union[CheckerResult, bool]:
+        if self._identical and self._position == len(self.judge_output):
+            return True
+        feedback = None
+        if self._standard is not None and self._standard.result():
+            feedback = PRESENTATION_ERROR
+        return CheckerResult(False, 0, feedback=feedback)
+
+
+def stream(judge_output: bytes, pe_allowed: bool = True, **kwargs) -> IdenticalStream:
+    return IdenticalStream(judge_output, pe_allowed)
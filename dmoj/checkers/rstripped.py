@@ -1,7 +1,11 @@
-from re import split as resplit
+from re import compile as recompile, split as resplit
+from typing import List
 
+from dmoj.result import CheckerStream
 from dmoj.utils.unicode import utf8bytes
 
+LINE_SEPARATOR = recompile(b'[\r\n]')
+
 
 def check(process_output: bytes, judge_output: bytes, **kwargs) -> bool:
     process_lines = resplit(b'[\r\n]', utf8bytes(process_output))
@@ -19,3 +23,52 @@ def check(process_output: bytes, judge_output: bytes, **kwargs) -> bool:
             return False
 
     return True
+
+
+class RstrippedStream(CheckerStream):
+    def __init__(self, judge_output: bytes, filter_new_line: bool = False) -> None:
+        super().__init__()
+        self.filter_new_line = filter_new_line
+        self._judge_lines = LINE_SEPARATOR.split(utf8bytes(judge_output))
+        if filter_new_line:
+            self._judge_lines = list(filter(None, self._judge_lines))
+        self._line = 0
+        # Pieces of the last line, which may continue into the next chunk.
+        self._partial: List[bytes] = []
+
+    def _feed(self, chunk) -> bool:
+        chunk = bytes(chunk)
+        lines = LINE_SEPARATOR.split(chunk)
+        if len(lines) == 1:
+            self._partial.append(chunk)
+            return True
+
+        lines[0] = b''.join(self._partial) + lines[0]
+        self._partial = [lines.pop()]
+        return self._match_lines(lines)
+
+    def _match_lines(self, lines) -> bool:
+        if self.filter_new_line:
+            lines = list(filter(None, lines))
+        if self._line + len(lines) > len(self._judge_lines):
+            return False
+        for process_line in lines:
+            if process_line.rstrip() != self._judge_lines[self._line].rstrip():
+                return False
+            self._line += 1
+        return True
+
+    def result(self) -> bool:
+        if self.rejected:
+            return False
+        last_line = b''.join(self._partial)
+        if self.filter_new_line and not last_line:
+            return self._line == len(self._judge_lines)
+        return (
+            self._line + 1 == len(self._judge_lines)
+            and last_line.rstrip() == self._judge_lines[self._line].rstrip()
+        )
+
+
+def stream(judge_output: bytes, filter_new_line: bool = False, **kwargs) -> RstrippedStream:
+    return RstrippedStream(judge_output, filter_new_line)
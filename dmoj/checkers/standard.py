@@ -1,6 +1,7 @@
 from typing import Callable
 
-from ._checker import standard
+from ._checker import standard, standard_feed, standard_finish
+from ..result import CheckerStream
 from ..utils.unicode import utf8bytes
 
 
@@ -10,4 +11,22 @@ def check(
     return _checker(utf8bytes(judge_output), utf8bytes(process_output))
 
 
+class StandardStream(CheckerStream):
+    def __init__(self, judge_output: bytes) -> None:
+        super().__init__()
+        self.judge_output = utf8bytes(judge_output)
+        self._state = 0
+
+    def _feed(self, chunk) -> bool:
+        self._state = standard_feed(self.judge_output, chunk, self._state)
+        return self._state >= 0
+
+    def result(self) -> bool:
+        return standard_finish(self.judge_output, self._state)
+
+
+def stream(judge_output: bytes, **kwargs) -> StandardStream:
+    return StandardStream(judge_output)
+
+
 del standard
@@ -20,34 +20,37 @@ class LocalPacketManager:
     def supported_problems_packet(self, problems):
         pass
 
-    def test_case_status_packet(self, position, result):
+    def supported_problems_delta_packet(self, delta):
         pass
 
-    def compile_error_packet(self, log):
+    def test_case_status_packet(self, submission_id, position, result):
         pass
 
-    def compile_message_packet(self, log):
+    def compile_error_packet(self, submission_id, log):
         pass
 
-    def internal_error_packet(self, message):
+    def compile_message_packet(self, submission_id, log):
         pass
 
-    def begin_grading_packet(self, is_pretested):
+    def internal_error_packet(self, submission_id, message):
         pass
 
-    def grading_end_packet(self):
+    def begin_grading_packet(self, submission_id, is_pretested):
         pass
 
-    def batch_begin_packet(self):
+    def grading_end_packet(self, submission_id, timings=None):
         pass
 
-    def batch_end_packet(self):
+    def batch_begin_packet(self, submission_id):
+        pass
+
+    def batch_end_packet(self, submission_id):
         pass
 
     def current_submission_packet(self):
         pass
 
-    def submission_aborted_packet(self):
+    def submission_aborted_packet(self, submission_id):
         pass
 
     def submission_acknowledged_packet(self, sub_id):
@@ -1,5 +1,7 @@
 from http.server import BaseHTTPRequestHandler
 
+from dmoj import metrics
+
 
 class JudgeControlRequestHandler(BaseHTTPRequestHandler):
     judge = None
@@ -19,4 +21,14 @@ class JudgeControlRequestHandler(BaseHTTPRequestHandler):
         self.send_error(404)
 
     def do_GET(self):
+        if self.path == '/metrics':
+            if self.judge is not None:
+                self.judge.collect_metrics()
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', metrics.CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
         self.send_error(404)
@@ -11,6 +11,7 @@ PTBOX_ABI_COUNT: int
 
 ALL_ABIS: List[int]
 SUPPORTED_ABIS: List[int]
+NATIVE_ABI: int
 
 Debugger: Any
 Process: Any
@@ -66,6 +66,11 @@ cdef extern from 'ptbox.h' nogil:
         bint was_initialized()
         bool use_seccomp()
         bool use_seccomp(bool enabled)
+        int set_path_syscall(int abi, int syscall, int path_arg, int flags_arg)
+        void add_path_prefix(bool write, const char *prefix, bool exact)
+        bool add_path_regex(bool write, const char *pattern)
+        unsigned long trap_count(int abi, int syscall)
+        double trap_time(int abi, int syscall)
 
     cdef bint PTBOX_FREEBSD
     cdef bint PTBOX_SECCOMP
@@ -102,6 +107,16 @@ SUPPORTED_ABIS = list(filter(debugger_supports_abi, ALL_ABIS))
 NATIVE_ABI = native_abi
 
 cdef extern from 'helper.h' nogil:
+    cdef struct seccomp_arg_condition:
+        int arg
+        bool is_pid
+        unsigned long value
+
+    cdef struct seccomp_arg_rule:
+        int syscall
+        int count
+        seccomp_arg_condition conditions[6]
+
     cdef struct child_config:
         unsigned long memory # affects only sbrk heap
         unsigned long address_space # affects sbrk and mmap but not all address space is used memory
@@ -119,6 +134,8 @@ cdef extern from 'helper.h' nogil:
         bool use_seccomp
         int abi_for_seccomp
         bint *seccomp_whitelist
+        int seccomp_rule_count
+        seccomp_arg_rule *seccomp_rules
 
     void cptbox_closefrom(int lowfd)
     int cptbox_child_run(child_config *)
@@ -440,6 +457,15 @@ cdef class Process:
     cpdef _handler(self, abi, syscall, handler):
         self.process.set_handler(abi, syscall, handler)
 
+    cpdef _path_handler(self, abi, syscall, int path_arg, int flags_arg):
+        self.process.set_path_syscall(abi, syscall, path_arg, flags_arg)
+
+    cpdef _add_path_prefix(self, bint is_write, bytes prefix, bint exact):
+        self.process.add_path_prefix(is_write, prefix, exact)
+
+    cpdef _add_path_regex(self, bint is_write, bytes pattern):
+        return self.process.add_path_regex(is_write, pattern)
+
     cpdef _protection_fault(self, syscall, is_update):
         pass
 
@@ -452,11 +478,16 @@ cdef class Process:
     cpdef _get_seccomp_whitelist(self):
         raise NotImplementedError()
 
+    cpdef _get_seccomp_rules(self):
+        return []
+
     cpdef _spawn(self, file, args, env=(), chdir=''):
         cdef child_config config
         config.argv = NULL
         config.envp = NULL
         config.seccomp_whitelist = NULL
+        config.seccomp_rule_count = 0
+        config.seccomp_rules = NULL
 
         try:
             config.address_space = self._child_address
@@ -483,12 +514,27 @@ cdef class Process:
                 for i in range(MAX_SYSCALL):
                     config.seccomp_whitelist[i] = whitelist[i]
 
+                rules = self._get_seccomp_rules()
+                config.seccomp_rules = <seccomp_arg_rule*>malloc(sizeof(seccomp_arg_rule) * len(rules))
+                if rules and not config.seccomp_rules:
+                    PyErr_NoMemory()
+                for i, (syscall, conditions) in enumerate(rules):
+                    assert len(conditions) <= 6
+                    config.seccomp_rules[i].syscall = syscall
+                    config.seccomp_rules[i].count = len(conditions)
+                    for j, (arg, is_pid, value) in enumerate(conditions):
+                        config.seccomp_rules[i].conditions[j].arg = arg
+                        config.seccomp_rules[i].conditions[j].is_pid = is_pid
+                        config.seccomp_rules[i].conditions[j].value = value
+                config.seccomp_rule_count = len(rules)
+
             if self.process.spawn(pt_child, &config):
                 raise RuntimeError('failed to spawn child')
         finally:
             free(config.argv)
             free(config.envp)
             free(config.seccomp_whitelist)
+            free(config.seccomp_rules)
 
     cpdef _monitor(self):
         cdef int exitcode
@@ -510,6 +556,17 @@ cdef class Process:
         if not self.process.use_seccomp(enabled):
             raise RuntimeError("Can't change whether seccomp is used after process is created.")
 
+    def _syscall_traps(self):
+        cdef int abi, syscall
+        cdef unsigned long count
+        traps = []
+        for abi in SUPPORTED_ABIS:
+            for syscall in range(MAX_SYSCALL):
+                count = self.process.trap_count(abi, syscall)
+                if count:
+                    traps.append((abi, syscall, count, self.process.trap_time(abi, syscall)))
+        return traps
+
     @property
     def was_initialized(self):
         return self.process.was_initialized()
@@ -1,10 +1,38 @@
 import errno
+import itertools
 
 DISALLOW = 0
 ALLOW = 1
 _CALLBACK = 2
 STDOUTERR = 3
 
+# Stands for the pid of the sandboxed process in the arguments given to allow_if.
+PID = object()
+
+
+def allow_if(**args):
+    """
+    Declares that the decorated handler allows the syscall whenever its arguments have the given values, e.g.
+    `allow_if(arg0=PID)`. A collection of values allows any of them. When seccomp is in use, such calls are allowed
+    by the kernel without ever reaching the handler, so the handler must still check the arguments itself, and
+    must allow at least every call that matches. Rules involving PID are only checked by the kernel if the sandboxed
+    process can't create others, since they would inherit the rule along with the pid it was made for.
+    """
+    choices = []
+    for name, values in sorted(args.items()):
+        if len(name) != 4 or not name.startswith('arg') or name[3] not in '012345':
+            raise ValueError('Unknown syscall argument: %s' % name)
+        if values is PID or isinstance(values, int):
+            values = (values,)
+        choices.append([(int(name[3:]), value) for value in values])
+
+    def decorator(handler):
+        # Each rule is a tuple of (argument index, value) pairs that must all match.
+        handler.seccomp_rules = list(itertools.product(*choices))
+        return handler
+
+    return decorator
+
 
 def errno_handler(code):
     def handler(debugger):
@@ -1,9 +1,15 @@
-from typing import Any
+from typing import Any, Callable, TypeVar
+
+_Handler = TypeVar('_Handler')
 
 ALLOW: int
 DISALLOW: int
 _CALLBACK: int
 STDOUTERR: int
+PID: Any
+
+def allow_if(**args: Any) -> Callable[[_Handler], _Handler]: ...
+
 ACCESS_EACCES: Any
 ACCESS_EAGAIN: Any
 ACCESS_ENOENT: Any
@@ -99,6 +99,25 @@ int cptbox_child_run(const struct child_config *config) {
             }
         }
 
+        // Syscalls whose handlers allow them for some arguments are allowed in-kernel for those arguments.
+        // We are still the process that will be traced, so getpid() is the pid that handlers compare against. Rules
+        // involving the pid are only given to us if this process can't create others, which would inherit them.
+        for (int i = 0; i < config->seccomp_rule_count; i++) {
+            const struct seccomp_arg_rule *rule = &config->seccomp_rules[i];
+            struct scmp_arg_cmp cmp[6];
+            for (int j = 0; j < rule->count; j++) {
+                const struct seccomp_arg_condition *condition = &rule->conditions[j];
+                cmp[j].arg = condition->arg;
+                cmp[j].op = SCMP_CMP_EQ;
+                cmp[j].datum_a = condition->is_pid ? (scmp_datum_t) getpid() : condition->value;
+                cmp[j].datum_b = 0;
+            }
+            if ((rc = seccomp_rule_add_array(ctx, SCMP_ACT_ALLOW, rule->syscall, rule->count, cmp))) {
+                fprintf(stderr, "seccomp_rule_add_array(..., %d): %s\n", rule->syscall, strerror(-rc));
+                // This failure is not fatal, it'll just cause the syscall to trap anyway.
+            }
+        }
+
         if ((rc = seccomp_load(ctx))) {
             fprintf(stderr, "seccomp_load: %s\n", strerror(-rc));
             goto seccomp_fail;
@@ -7,6 +7,19 @@
 #define PTBOX_SPAWN_FAIL_TRACEME        204
 #define PTBOX_SPAWN_FAIL_EXECVE         205
 
+// A syscall that seccomp allows when all of the conditions on its arguments hold.
+struct seccomp_arg_condition {
+    int arg;
+    bool is_pid; // Compare against the pid of the sandboxed process rather than value.
+    unsigned long value;
+};
+
+struct seccomp_arg_rule {
+    int syscall;
+    int count;
+    struct seccomp_arg_condition conditions[6];
+};
+
 struct child_config {
     unsigned long memory;
     unsigned long address_space;
@@ -23,6 +36,8 @@ struct child_config {
     int stderr_;
     bool use_seccomp;
     int *seccomp_whitelist;
+    int seccomp_rule_count;
+    struct seccomp_arg_rule *seccomp_rules;
 };
 
 void cptbox_closefrom(int lowfd);
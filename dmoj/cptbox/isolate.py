@@ -1,11 +1,14 @@
+import functools
 import logging
 import os
 import re
 import sys
 
+import pylru
+
 from dmoj.cptbox._cptbox import AT_FDCWD, bsd_get_proc_cwd, bsd_get_proc_fdno
 from dmoj.cptbox.tracer import MaxLengthExceeded
-from dmoj.cptbox.handlers import ACCESS_EACCES, ACCESS_ENOENT, ACCESS_EPERM, ALLOW
+from dmoj.cptbox.handlers import ACCESS_EACCES, ACCESS_ENOENT, ACCESS_EPERM, ALLOW, DISALLOW, PID, allow_if
 
 from dmoj.cptbox.syscalls import *
 from dmoj.utils.unicode import utf8text
@@ -19,6 +22,79 @@ except AttributeError:
     # This may not exist on FreeBSD, so we ignore.
     pass
 
+PR_GET_DUMPABLE = 3
+PR_SET_NAME = 15
+PR_GET_NAME = 16
+PR_SET_THP_DISABLE = 41
+PR_SET_VMA = 0x53564D41  # Used on Android
+ALLOWED_PRCTL_OPTIONS = (PR_GET_DUMPABLE, PR_SET_NAME, PR_GET_NAME, PR_SET_THP_DISABLE, PR_SET_VMA)
+
+# How many filesystem access decisions to remember for each sandboxed process tree.
+ACCESS_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=128)
+def _compile_fs_jail(fs_parts):
+    # Compiling the jail is expensive, and executors launch with the same filesystem rules over and over, so only the
+    # rules that mention the pid are compiled for each process. Those are returned for formatting by the caller.
+    static = [part for part in fs_parts if '{pid' not in part]
+    per_pid = tuple(part for part in fs_parts if '{pid' in part)
+    # Disallow accessing everything by default.
+    return re.compile('|'.join(static) if static else '(?!)'), per_pid
+
+
+def _split_fs_jail(fs_parts):
+    # Rules that are plain paths, such as the submission's own directory, differ from one tracer to the next, so they
+    # are matched by the tracer itself rather than compiled into the shared jail, which would then never be reused.
+    prefixes = []
+    exact = set()
+    patterns = []
+    for part in fs_parts:
+        if '{pid' in part:
+            patterns.append(part)
+            continue
+        part = part.format()
+        literal = _literal_prefix(part)
+        if literal is None:
+            patterns.append(part)
+        elif literal[1]:
+            exact.add(literal[0])
+        else:
+            prefixes.append(literal[0])
+    return tuple(prefixes), frozenset(exact), tuple(patterns)
+
+
+# Regex syntax that means the same in Python and in C++'s ECMAScript flavour, at least for the ASCII paths the
+# native policy checks: no named groups, lookbehinds, inline flags, repetition counts or alphanumeric escapes
+# other than \d, \s and \w, and no character classes that are empty or start with ], which Python reads as a member
+# but ECMAScript reads as the end of the class.
+_NATIVE_REGEX = re.compile(
+    r'(?:[^\\()\[{}]|\\[^0-9A-Za-z]|\\[dsw]|\((?!\?)|\(\?[:!=]|\)|\[(?!\^?\])\^?(?:[^\]\\]|\\[^0-9A-Za-z])*\])*$'
+)
+_REGEX_SPECIAL = frozenset('.^$*+?{}[]|()')
+
+
+def _literal_prefix(pattern):
+    # Returns (prefix, exact) if the pattern matches exactly the paths starting with prefix, or, when exact, only
+    # prefix itself; None otherwise.
+    prefix = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == '\\':
+            if i + 1 == len(pattern) or pattern[i + 1].isalnum():
+                return None
+            prefix.append(pattern[i + 1])
+            i += 2
+        elif c == '$' and i == len(pattern) - 1:
+            return ''.join(prefix), True
+        elif c in _REGEX_SPECIAL:
+            return None
+        else:
+            prefix.append(c)
+            i += 1
+    return ''.join(prefix), False
+
 
 class IsolateTracer(dict):
     def __init__(self, read_fs, write_fs=None, writable=(1, 2)):
@@ -27,6 +103,14 @@ class IsolateTracer(dict):
         self.write_fs = write_fs
         self.read_fs_jail = {}
         self.write_fs_jail = {}
+        # Filesystem rules split by how they are matched, keyed by is_write.
+        self._fs_rules = {}
+
+        # Decisions already made, keyed by (pid, directory the path is relative to, path, is_write).
+        self._access_cache = pylru.lrucache(ACCESS_CACHE_SIZE)
+        # The working directory of each process, as long as no process has changed its own. Every process starts in
+        # the directory it was spawned in, so until then, a cached directory can't go stale even if the pid is reused.
+        self._cwd_cache = {}
 
         self._writable = list(writable)
 
@@ -185,6 +269,20 @@ class IsolateTracer(dict):
                 }
             )
 
+    def __setitem__(self, syscall, handler):
+        if syscall in (sys_chdir, sys_fchdir) and handler != DISALLOW:
+            handler = self._track_chdir(handler)
+        super().__setitem__(syscall, handler)
+
+    def _track_chdir(self, handler):
+        def check(debugger):
+            # We can't know which directory we'll end up in until the syscall returns, so stop caching working
+            # directories altogether; chdir is rare enough that this costs little.
+            self._cwd_cache = None
+            return True if handler == ALLOW else handler(debugger)
+
+        return check
+
     def is_write_flags(self, open_flags):
         for flag in open_write_flags:
             # Strict equality is necessary here, since e.g. O_TMPFILE has multiple bits set,
@@ -213,6 +311,8 @@ class IsolateTracer(dict):
             log.debug('Denied access via syscall %s: %s', syscall, file)
             return ACCESS_ENOENT(debugger)
 
+        # Which arguments hold the path and the open flags, so the sandbox can allow plain paths without calling us.
+        check.native_path = (argument, 1 if is_open else -1)
         return check
 
     def check_file_access_at(self, syscall, is_open=False):
@@ -233,8 +333,27 @@ class IsolateTracer(dict):
             log.debug('Denied access via syscall %s: %s', syscall, file)
             return ACCESS_ENOENT(debugger)
 
+        check.native_path = (1, 2 if is_open else -1)
         return check
 
+    def native_path_rules(self):
+        """
+        Yields the filesystem rules that the sandbox can check natively, as (is_write, kind, value) with kind one of
+        'prefix', 'exact' or 'regex'. Rules that depend on the pid, or whose syntax might differ between Python and
+        C++, are left out: the native policy only ever allows, falling back to Python for everything else.
+        """
+        for is_write, fs_parts in ((False, self.read_fs), (True, self.write_fs)):
+            for part in fs_parts or ():
+                if '{pid' in part:
+                    continue
+                part = part.format()
+                literal = _literal_prefix(part)
+                if literal is not None:
+                    prefix, exact = literal
+                    yield is_write, 'exact' if exact else 'prefix', prefix
+                elif _NATIVE_REGEX.match(part):
+                    yield is_write, 'regex', part
+
     def _get_fs_jail(self, debugger, is_write):
         # The only syscalls that can ever have is_write=True are open and
         # openat: if we ever want to support syscalls like unlink or mkdir,
@@ -244,13 +363,21 @@ class IsolateTracer(dict):
         fs = jail.get(debugger.pid)
 
         if fs is None:
-            fs_parts = self.write_fs if is_write else self.read_fs
-            if fs_parts:
-                fs_re = '|'.join(map(lambda p: p.format(pid=debugger.pid), fs_parts))
-            else:
-                fs_re = '(?!)'  # Disallow accessing everything by default.
+            rules = self._fs_rules.get(is_write)
+            if rules is None:
+                rules = self._fs_rules[is_write] = _split_fs_jail((self.write_fs if is_write else self.read_fs) or ())
+            prefixes, exact, patterns = rules
+            static, per_pid = _compile_fs_jail(patterns)
+            pid_re = re.compile('|'.join(map(lambda p: p.format(pid=debugger.pid), per_pid))) if per_pid else None
+
+            def fs(file):
+                return (
+                    file.startswith(prefixes)
+                    or file in exact
+                    or static.match(file) is not None
+                    or (pid_re is not None and pid_re.match(file) is not None)
+                )
 
-            fs = re.compile(fs_re)
             jail[debugger.pid] = fs
 
         return fs
@@ -264,37 +391,58 @@ class IsolateTracer(dict):
         if rel_file is None:
             return '(nil)', False
 
+        is_write = is_open and self.is_write_flags(getattr(debugger, 'uarg%d' % flag_reg))
+
         try:
-            file = self.get_full_path(debugger, rel_file, dirfd)
+            dir = self._get_base_dir(debugger, rel_file, dirfd)
         except UnicodeDecodeError:
             log.exception('Unicode decoding error while opening relative to %d: %r', dirfd, rel_file)
             return '(undecodable)', False
 
-        is_write = is_open and self.is_write_flags(getattr(debugger, 'uarg%d' % flag_reg))
-        if self._get_fs_jail(debugger, is_write).match(file) is None:
-            return file, False
-        return file, True
+        key = (debugger.pid, dir, rel_file, is_write)
+        try:
+            return self._access_cache[key]
+        except KeyError:
+            pass
+
+        file = self._join_path(dir, rel_file)
+        decision = file, self._get_fs_jail(debugger, is_write)(file)
+        self._access_cache[key] = decision
+        return decision
 
     def get_full_path(self, debugger, file, dirfd=AT_FDCWD):
+        return self._join_path(self._get_base_dir(debugger, file, dirfd), file)
+
+    def _get_base_dir(self, debugger, file, dirfd):
+        if file.startswith('/'):
+            return None
         dirfd = (dirfd & 0x7FFFFFFF) - (dirfd & 0x80000000)
-        if not file.startswith('/'):
-            dir = self._getcwd_pid(debugger.pid) if dirfd == AT_FDCWD else self._getfd_pid(debugger.pid, dirfd)
+        if dirfd != AT_FDCWD:
+            return self._getfd_pid(debugger.pid, dirfd)
+
+        cwd_cache = self._cwd_cache
+        if cwd_cache is None:
+            return self._getcwd_pid(debugger.pid)
+        cwd = cwd_cache.get(debugger.pid)
+        if cwd is None:
+            cwd = cwd_cache[debugger.pid] = self._getcwd_pid(debugger.pid)
+        return cwd
+
+    def _join_path(self, dir, file):
+        if dir is not None:
             file = os.path.join(dir, file)
-        file = '/' + os.path.normpath(file).lstrip('/')
-        return file
+        return '/' + os.path.normpath(file).lstrip('/')
 
+    @allow_if(arg0=PID)
     def do_kill(self, debugger):
         # Allow tgkill to execute as long as the target thread group is the debugged process
         # libstdc++ seems to use this to signal itself, see <https://github.com/DMOJ/judge/issues/183>
         return True if debugger.uarg0 == debugger.pid else ACCESS_EPERM(debugger)
 
+    @allow_if(arg0=(0, PID))
     def do_prlimit(self, debugger):
         return True if debugger.uarg0 in (0, debugger.pid) else ACCESS_EPERM(debugger)
 
+    @allow_if(arg0=ALLOWED_PRCTL_OPTIONS)
     def do_prctl(self, debugger):
-        PR_GET_DUMPABLE = 3
-        PR_SET_NAME = 15
-        PR_GET_NAME = 16
-        PR_SET_THP_DISABLE = 41
-        PR_SET_VMA = 0x53564D41  # Used on Android
-        return debugger.arg0 in (PR_GET_DUMPABLE, PR_SET_NAME, PR_GET_NAME, PR_SET_THP_DISABLE, PR_SET_VMA)
+        return debugger.arg0 in ALLOWED_PRCTL_OPTIONS
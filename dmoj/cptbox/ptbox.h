@@ -12,6 +12,10 @@
 #include <sys/ptrace.h>
 
 #include <map>
+#include <memory>
+#include <regex>
+#include <string>
+#include <vector>
 
 #if defined(__FreeBSD__) || defined(__FreeBSD_kernel__)
 #   define PTBOX_FREEBSD 1
@@ -36,6 +40,7 @@
 #endif
 
 #define MAX_SYSCALL 568
+#define PTBOX_MAX_PATH 4096
 #define PTBOX_HANDLER_DENY 0
 #define PTBOX_HANDLER_ALLOW 1
 #define PTBOX_HANDLER_CALLBACK 2
@@ -108,6 +113,29 @@ typedef void (*pt_syscall_return_callback)(void *context, int syscall);
 typedef int (*pt_fork_handler)(void *context);
 typedef int (*pt_event_callback)(void *context, int event, unsigned long param);
 
+// Filesystem rules that can be checked without calling back into Python: a trie of literal prefixes, and the
+// rules that are not literals as regular expressions. Paths are matched from their start, like Python's re.match.
+class pt_path_policy {
+public:
+    pt_path_policy() : root(new node) {}
+    void add_prefix(const char *prefix, bool exact);
+    bool add_regex(const char *pattern);
+    bool allows(const char *path) const;
+private:
+    struct node {
+        bool prefix = false; // Every path starting with the path to this node is allowed.
+        bool exact = false;  // The path to this node is allowed.
+        std::map<char, std::unique_ptr<node>> children;
+    };
+    std::unique_ptr<node> root;
+    std::vector<std::regex> regexes;
+};
+
+struct pt_path_syscall {
+    int path_arg;
+    int flags_arg; // -1 when the syscall can never write.
+};
+
 class pt_process {
 public:
     pt_process(pt_debugger *debugger);
@@ -125,12 +153,30 @@ public:
     bool was_initialized() { return _initialized; }
     bool use_seccomp() { return _use_seccomp; }
     bool use_seccomp(bool enable);
+    unsigned long trap_count(int abi, int syscall) { return traps[abi][syscall]; }
+    int set_path_syscall(int abi, int syscall, int path_arg, int flags_arg);
+    void add_path_prefix(bool write, const char *prefix, bool exact) {
+        (write ? write_policy : read_policy).add_prefix(prefix, exact);
+    }
+    bool add_path_regex(bool write, const char *pattern) {
+        return (write ? write_policy : read_policy).add_regex(pattern);
+    }
+    double trap_time(int abi, int syscall) {
+        return trap_times[abi][syscall].tv_sec + trap_times[abi][syscall].tv_nsec / 1000000000.0;
+    }
 protected:
     int dispatch(int event, unsigned long param);
     int protection_fault(int syscall, int type = PTBOX_EVENT_PROTECTION);
+    bool allows_path(int syscall);
 private:
     pid_t pid;
     int handler[PTBOX_ABI_COUNT][MAX_SYSCALL];
+    // How many syscalls trapped into the tracer, and how long we took to handle them.
+    unsigned long traps[PTBOX_ABI_COUNT][MAX_SYSCALL];
+    struct timespec trap_times[PTBOX_ABI_COUNT][MAX_SYSCALL];
+    // Which syscalls take a path that pt_process can check against the policies itself.
+    pt_path_syscall path_syscalls[PTBOX_ABI_COUNT][MAX_SYSCALL];
+    pt_path_policy read_policy, write_policy;
     pt_handler_callback callback;
     void *context;
     struct timespec exec_time, start_time, end_time;
@@ -0,0 +1,46 @@
+#include "ptbox.h"
+
+void pt_path_policy::add_prefix(const char *prefix, bool exact) {
+    node *current = root.get();
+    for (const char *c = prefix; *c; ++c) {
+        std::unique_ptr<node> &child = current->children[*c];
+        if (!child)
+            child.reset(new node);
+        current = child.get();
+    }
+    if (exact)
+        current->exact = true;
+    else
+        current->prefix = true;
+}
+
+bool pt_path_policy::add_regex(const char *pattern) {
+    try {
+        regexes.emplace_back(pattern, std::regex::ECMAScript | std::regex::optimize);
+    } catch (const std::regex_error &) {
+        return false;
+    }
+    return true;
+}
+
+bool pt_path_policy::allows(const char *path) const {
+    const node *current = root.get();
+    const char *c = path;
+    while (current) {
+        if (current->prefix)
+            return true;
+        if (!*c) {
+            if (current->exact)
+                return true;
+            break;
+        }
+        auto child = current->children.find(*c++);
+        current = child == current->children.end() ? nullptr : child->second.get();
+    }
+
+    for (const std::regex &regex : regexes) {
+        if (std::regex_search(path, regex, std::regex_constants::match_continuous))
+            return true;
+    }
+    return false;
+}
@@ -1,6 +1,7 @@
 #define _BSD_SOURCE
 
 #include <errno.h>
+#include <fcntl.h>
 #include <stdio.h>
 #include <stdlib.h>
 #include <time.h>
@@ -25,6 +26,10 @@ pt_process::pt_process(pt_debugger *debugger) :
     memset(&start_time, 0, sizeof exec_time);
     memset(&end_time, 0, sizeof exec_time);
     memset(handler, 0, sizeof handler);
+    memset(traps, 0, sizeof traps);
+    memset(trap_times, 0, sizeof trap_times);
+    // All bytes set gives -1 for every field, i.e. no path syscalls.
+    memset(path_syscalls, 0xFF, sizeof path_syscalls);
     debugger->set_process(this);
 }
 
@@ -59,6 +64,79 @@ int pt_process::set_handler(int abi, int syscall, int handler) {
     return 0;
 }
 
+int pt_process::set_path_syscall(int abi, int syscall, int path_arg, int flags_arg) {
+    if (syscall >= MAX_SYSCALL || syscall < 0 || path_arg < 0 || path_arg > 5 || flags_arg > 5)
+        return 1;
+    path_syscalls[abi][syscall].path_arg = path_arg;
+    path_syscalls[abi][syscall].flags_arg = flags_arg;
+    return 0;
+}
+
+static long syscall_arg(pt_debugger *debugger, int index) {
+    switch (index) {
+        case 0: return debugger->arg0();
+        case 1: return debugger->arg1();
+        case 2: return debugger->arg2();
+        case 3: return debugger->arg3();
+        case 4: return debugger->arg4();
+        default: return debugger->arg5();
+    }
+}
+
+static bool is_write_flags(unsigned long flags) {
+    static const unsigned long write_flags[] = {
+        O_WRONLY, O_RDWR, O_TRUNC, O_CREAT, O_EXCL,
+#ifdef O_TMPFILE
+        O_TMPFILE,
+#endif
+    };
+    // Strict equality is necessary here, since e.g. O_TMPFILE has multiple bits set.
+    for (unsigned long flag : write_flags) {
+        if ((flags & flag) == flag)
+            return true;
+    }
+    return false;
+}
+
+// Whether path is absolute, ASCII, and already in the form os.path.normpath would give.
+// Anything else is left to Python, which knows how to resolve and decode it.
+static bool is_plain_path(const char *path) {
+    if (path[0] != '/')
+        return false;
+    if (!path[1])
+        return true;
+    for (const char *c = path; *c; ++c) {
+        if ((unsigned char) *c >= 0x80)
+            return false;
+        if (*c != '/')
+            continue;
+        if (c[1] == '/' || !c[1])
+            return false;
+        if (c[1] == '.' && (c[2] == '/' || !c[2] || (c[2] == '.' && (c[3] == '/' || !c[3]))))
+            return false;
+    }
+    return true;
+}
+
+bool pt_process::allows_path(int syscall) {
+    int abi = debugger->abi();
+    const pt_path_syscall &rule = path_syscalls[abi][syscall];
+    if (rule.path_arg < 0)
+        return false;
+
+    unsigned long address = syscall_arg(debugger, rule.path_arg);
+    if (abi == PTBOX_ABI_X86 || abi == PTBOX_ABI_X32 || abi == PTBOX_ABI_ARM)
+        address &= 0xFFFFFFFF;
+
+    bool write = rule.flags_arg >= 0 && is_write_flags(syscall_arg(debugger, rule.flags_arg));
+    // Read one byte past the longest path Python accepts, so overly long paths are left to Python to reject.
+    char *path = debugger->readstr(address, PTBOX_MAX_PATH + 1);
+    bool allowed = path && strlen(path) <= PTBOX_MAX_PATH && is_plain_path(path) &&
+                   (write ? write_policy : read_policy).allows(path);
+    debugger->freestr(path);
+    return allowed;
+}
+
 int pt_process::dispatch(int event, unsigned long param) {
     if (event_proc != NULL)
         return event_proc(event_context, event, param);
@@ -106,7 +184,7 @@ bool pt_process::use_seccomp(bool enabled) {
 
 int pt_process::monitor() {
     bool in_syscall = false, first = true, spawned = false;
-    struct timespec start, end, delta;
+    struct timespec start, end, handled, delta;
     int status, exit_reason = PTBOX_EXIT_NORMAL, err;
     // Set pgid to -this->pid such that -pgid becomes pid, resulting
     // in the initial wait be on the main thread. This allows it a chance
@@ -241,6 +319,13 @@ int pt_process::monitor() {
                 }
             }
 
+            // Keep track of which syscalls reach us, and of how long handling them takes, so that
+            // expensive sandbox policies can be found and whitelisted.
+            bool profiled = syscall >= 0 && syscall < MAX_SYSCALL;
+            int abi = debugger->abi();
+            if (in_syscall && profiled)
+                ++traps[abi][syscall];
+
             if (in_syscall) {
                 if (syscall >= 0 && syscall < MAX_SYSCALL) {
                     switch (handler[debugger->abi()][syscall]) {
@@ -253,7 +338,9 @@ int pt_process::monitor() {
                             break;
                         }
                         case PTBOX_HANDLER_CALLBACK:
-                            if (callback(context, syscall))
+                            // Paths that the policy allows outright don't need Python; denials still go there to
+                            // be logged and answered with the right errno.
+                            if (allows_path(syscall) || callback(context, syscall))
                                 break;
                             //printf("Killed by callback: %d\n", syscall);
                             exit_reason = protection_fault(syscall);
@@ -286,6 +373,12 @@ int pt_process::monitor() {
                 exit_reason = protection_fault(syscall, PTBOX_EVENT_UPDATE_FAIL);
                 continue;
             }
+
+            if (profiled) {
+                clock_gettime(CLOCK_MONOTONIC, &handled);
+                timespec_sub(&handled, &end, &delta);
+                timespec_add(&trap_times[abi][syscall], &delta, &trap_times[abi][syscall]);
+            }
         } else {
 #if PTBOX_FREEBSD
             // No events aside from signal event on FreeBSD
@@ -9,8 +9,20 @@ import threading
 from typing import List, Optional
 
 from dmoj.cptbox._cptbox import *
-from dmoj.cptbox.handlers import ALLOW, DISALLOW, _CALLBACK
-from dmoj.cptbox.syscalls import SYSCALL_COUNT, by_id, translator, sys_exit, sys_exit_group, sys_getpid
+from dmoj.cptbox.handlers import ALLOW, DISALLOW, PID, _CALLBACK
+from dmoj.cptbox.syscalls import (
+    SYSCALL_COUNT,
+    by_id,
+    translator,
+    sys_clone,
+    sys_clone3,
+    sys_exit,
+    sys_exit_group,
+    sys_fork,
+    sys_getpid,
+    sys_vfork,
+)
+from dmoj.utils import timing
 from dmoj.utils.communicate import safe_communicate as _safe_communicate
 from dmoj.utils.os_ext import find_exe_in_path, oom_score_adj, OOM_SCORE_ADJ_MAX
 from dmoj.utils.unicode import utf8bytes, utf8text
@@ -40,6 +52,14 @@ _address_bits = {
 }
 
 
+def _syscall_name(abi, syscall):
+    index = _SYSCALL_INDICIES[abi]
+    for id, call in enumerate(translator):
+        if syscall in call[index]:
+            return by_id[id]
+    return 'unknown'
+
+
 class MaxLengthExceeded(ValueError):
     pass
 
@@ -64,13 +84,7 @@ class AdvancedDebugger(Debugger):
     def get_syscall_name(self, syscall):
         if self.abi == PTBOX_ABI_INVALID:
             return 'failed to read registers'
-        callname = 'unknown'
-        index = _SYSCALL_INDICIES[self.abi]
-        for id, call in enumerate(translator):
-            if syscall in call[index]:
-                callname = by_id[id]
-                break
-        return callname
+        return _syscall_name(self.abi, syscall)
 
     def readstr(self, address, max_size=4096):
         if self.address_bits == 32:
@@ -148,9 +162,21 @@ class TracedPopen(Process):
                             if not callable(handler):
                                 raise ValueError('Handler not callable: ' + handler)
                             self._callbacks[abi][call] = handler
+                            native_path = getattr(handler, 'native_path', None)
+                            if native_path is not None:
+                                self._path_handler(abi, call, *native_path)
                             handler = _CALLBACK
                         self._handler(abi, call, handler)
 
+            native_path_rules = getattr(security, 'native_path_rules', None)
+            if native_path_rules is not None:
+                for is_write, kind, value in native_path_rules():
+                    if kind == 'regex':
+                        if not self._add_path_regex(is_write, utf8bytes(value)):
+                            log.warning('Failed to compile filesystem rule natively: %s', value)
+                    else:
+                        self._add_path_prefix(is_write, utf8bytes(value), kind == 'exact')
+
         self._died = threading.Event()
         self._spawned_or_errored = threading.Event()
         self._spawn_error = None
@@ -166,6 +192,17 @@ class TracedPopen(Process):
         if self._spawn_error:
             raise self._spawn_error
 
+    @property
+    def syscall_profile(self):
+        # Which syscalls trapped into the sandbox rather than being allowed outright, and the time spent handling them.
+        profile = {}
+        for abi, syscall, count, seconds in self._syscall_traps():
+            name = _syscall_name(abi, syscall)
+            totals = profile.setdefault(name, {'count': 0, 'seconds': 0.0})
+            totals['count'] += count
+            totals['seconds'] += seconds
+        return profile
+
     def _get_seccomp_whitelist(self):
         whitelist = [False] * MAX_SYSCALL_NUMBER
         index = _SYSCALL_INDICIES[NATIVE_ABI]
@@ -182,6 +219,27 @@ class TracedPopen(Process):
                     whitelist[call] = handler == ALLOW
         return whitelist
 
+    def _get_seccomp_rules(self):
+        # Syscalls that the kernel can allow depending on their arguments, as (syscall, conditions) with each
+        # condition being (argument index, whether the value is the pid of the process, value).
+        rules = []
+        index = _SYSCALL_INDICIES[NATIVE_ABI]
+        # The filter is inherited by any process the sandboxed one creates, but keeps comparing against the pid of
+        # the original, whereas handlers compare against the calling process. So pid conditions are left to the
+        # handlers unless no process can be created.
+        process_syscalls = (sys_fork, sys_vfork, sys_clone, sys_clone3)
+        can_fork = any(self._security.get(call, DISALLOW) != DISALLOW for call in process_syscalls)
+        for i in range(SYSCALL_COUNT):
+            handler = self._security.get(i, DISALLOW)
+            for conditions in getattr(handler, 'seccomp_rules', ()):
+                if can_fork and any(value is PID for _, value in conditions):
+                    continue
+                conditions = [(arg, value is PID, 0 if value is PID else value) for arg, value in conditions]
+                for call in translator[i][index]:
+                    if call is not None:
+                        rules.append((call, conditions))
+        return rules
+
     def wait(self):
         self._died.wait()
         if not self.was_initialized:
@@ -322,6 +380,7 @@ class TracedPopen(Process):
 
         # TODO(tbrindus): this code should be the same as [self.returncode], so it shouldn't be duplicated
         code = self._monitor()
+        timing.syscalls(self.syscall_profile)
 
         if self._time and self.execution_time > self._time:
             self._is_tle = True
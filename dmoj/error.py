@@ -15,6 +15,13 @@ class OutputLimitExceeded(Exception):
         super().__init__("exceeded %d-byte limit on %s stream" % (limit, stream))
 
 
+class OutputRejected(Exception):
+    def __init__(self, output):
+        super().__init__('output rejected by checker')
+        # The part of the output that was kept.
+        self.output = output
+
+
 class InvalidCommandException(Exception):
     def __init__(self, message=None):
         self.message = message
@@ -12,7 +12,9 @@ import pylru
 
 from dmoj.error import CompileError, OutputLimitExceeded
 from dmoj.judgeenv import env
+from dmoj.utils import timing
 from dmoj.utils.communicate import safe_communicate
+from dmoj.utils.disk_cache import DiskCache, DiskCacheEntry
 from dmoj.utils.unicode import utf8bytes
 from .base_executor import BaseExecutor
 
@@ -27,6 +29,10 @@ from .base_executor import BaseExecutor
 # Contract: if cached=True is specified and an entry exists in the cache,
 # `create_files` and `compile` will not be run, and `_executable` will be loaded
 # from the cache.
+#
+# If `compiled_binary_cache_dir` is configured, compiled binaries are also kept
+# on disk there, so that they are shared between worker processes and judges on
+# the same host, and survive restarts.
 class _CompiledExecutorMeta(abc.ABCMeta):
     @staticmethod
     def _cleanup_cache_entry(_key, executor: 'CompiledExecutor') -> None:
@@ -37,6 +43,15 @@ class _CompiledExecutorMeta(abc.ABCMeta):
     compiled_binary_cache: Dict[str, 'CompiledExecutor'] = pylru.lrucache(
         env.compiled_binary_cache_size, _cleanup_cache_entry
     )
+    _disk_cache: Optional[DiskCache] = None
+
+    @classmethod
+    def get_disk_cache(cls) -> Optional[DiskCache]:
+        if cls._disk_cache is None and env.compiled_binary_cache_dir:
+            cls._disk_cache = DiskCache(
+                env.compiled_binary_cache_dir, env.compiled_binary_cache_size, env.compiled_binary_cache_max_bytes
+            )
+        return cls._disk_cache
 
     def __call__(self, *args, **kwargs) -> 'CompiledExecutor':
         is_cached: bool = kwargs.pop('cached', False)
@@ -58,12 +73,32 @@ class _CompiledExecutorMeta(abc.ABCMeta):
                 if os.path.isfile(executor._executable):
                     obj._executable = executor._executable
                     obj._dir = executor._dir
+                    if executor._cache_entry is not None:
+                        obj._cache_entry = executor._cache_entry.duplicate()
+                    timing.count('binary-cache-hit')
+                    return obj
+
+            disk_cache = self.get_disk_cache()
+            if disk_cache is not None:
+                entry = disk_cache.get(cache_key)
+                if entry is not None:
+                    obj._load_cache_entry(entry)
+                    self.compiled_binary_cache[cache_key] = obj
+                    timing.count('binary-cache-hit')
                     return obj
 
+            timing.count('binary-cache-miss')
+
         obj.create_files(*args, **kwargs)
-        obj.compile()
+        with timing.span('compile'):
+            obj.compile()
 
         if is_cached:
+            disk_cache = self.get_disk_cache()
+            if disk_cache is not None and obj._dir is not None:
+                executable = os.path.relpath(obj.get_executable(), obj._dir)
+                if not executable.startswith(os.pardir):
+                    obj._load_cache_entry(disk_cache.put(cache_key, obj._dir, {'executable': executable}))
             self.compiled_binary_cache[cache_key] = obj
 
         return obj
@@ -121,6 +156,7 @@ class CompiledExecutor(BaseExecutor, metaclass=_CompiledExecutorMeta):
     warning: Optional[bytes] = None
     _executable: Optional[str] = None
     _code: Optional[str] = None
+    _cache_entry: Optional[DiskCacheEntry] = None
 
     def __init__(self, problem_id: str, source_code: bytes, *args, **kwargs):
         super().__init__(problem_id, source_code, **kwargs)
@@ -128,9 +164,18 @@ class CompiledExecutor(BaseExecutor, metaclass=_CompiledExecutorMeta):
         self._executable = None
 
     def cleanup(self) -> None:
-        if not self.is_cached:
+        if self._cache_entry is not None:
+            # The directory belongs to the on-disk cache, which will delete it on eviction.
+            self._cache_entry.close()
+            self._cache_entry = None
+        elif not self.is_cached:
             super().cleanup()
 
+    def _load_cache_entry(self, entry: DiskCacheEntry) -> None:
+        self._cache_entry = entry
+        self._dir = entry.path
+        self._executable = os.path.join(entry.path, entry.metadata['executable'])
+
     def create_files(self, problem_id: str, source_code: bytes, *args, **kwargs) -> None:
         self._code = self._file(self.source_filename_format.format(problem_id=problem_id, ext=self.ext))
         with open(self._code, 'wb') as fo:
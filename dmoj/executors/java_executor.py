@@ -6,6 +6,7 @@ import sys
 from collections import deque
 from typing import Optional
 
+from dmoj.cptbox.handlers import PID, allow_if
 from dmoj.error import CompileError, InternalError
 from dmoj.executors.compiled_executor import CompiledExecutor
 from dmoj.executors.mixins import SingleDigitVersionMixin
@@ -38,10 +39,13 @@ def find_class(source):
     return class_name
 
 
+P_PID = 0
+PROC_STACKGAP_CTL = 17
+PROC_STACKGAP_STATUS = 18
+
+
+@allow_if(arg0=P_PID, arg1=PID, arg2=(PROC_STACKGAP_CTL, PROC_STACKGAP_STATUS))
 def handle_procctl(debugger):
-    P_PID = 0
-    PROC_STACKGAP_CTL = 17
-    PROC_STACKGAP_STATUS = 18
     return (debugger.arg0 == P_PID and debugger.arg1 == debugger.pid and
             debugger.arg2 in (PROC_STACKGAP_CTL, PROC_STACKGAP_STATUS))
 
@@ -3,13 +3,14 @@ import os
 import re
 import shutil
 import sys
+import threading
 from typing import Any, List, Tuple, Union
 
 from dmoj.cptbox import IsolateTracer, TracedPopen, syscalls
 from dmoj.cptbox.handlers import ALLOW
 from dmoj.error import InternalError
 from dmoj.judgeenv import env
-from dmoj.utils import setbufsize_path
+from dmoj.utils import setbufsize_path, timing
 from dmoj.utils.unicode import utf8bytes
 
 BASE_FILESYSTEM = [
@@ -50,6 +51,8 @@ UTF8_LOCALE = 'C.UTF-8'
 if sys.platform.startswith('freebsd') and sys.platform < 'freebsd13':
     UTF8_LOCALE = 'en_US.UTF-8'
 
+_launch_lock = threading.Lock()
+
 
 class PlatformExecutorMixin(metaclass=abc.ABCMeta):
     address_grace = 65536
@@ -93,21 +96,31 @@ class PlatformExecutorMixin(metaclass=abc.ABCMeta):
             env['CPTBOX_STDOUT_BUFFER_SIZE'] = 0
         return env
 
+    @timing.span('spawn')
     def launch(self, *args, **kwargs):
-        for src, dst in kwargs.get('symlinks', {}).items():
-            src = os.path.abspath(os.path.join(self._dir, src))
-            # Disallow the creation of symlinks outside the submission directory.
-            if os.path.commonprefix([src, self._dir]) == self._dir:
-                # If a link already exists under this name, it's probably from a
-                # previous case, but might point to something different.
-                if os.path.islink(src):
-                    os.unlink(src)
-                os.symlink(dst, src)
-            else:
-                raise InternalError('cannot symlink outside of submission directory')
-
-        agent = self._file('setbufsize.so')
-        shutil.copyfile(setbufsize_path, agent)
+        # Cases may be launched concurrently from several threads, which must not trip over each other's links.
+        with _launch_lock:
+            for src, dst in kwargs.get('symlinks', {}).items():
+                src = os.path.abspath(os.path.join(self._dir, src))
+                # Disallow the creation of symlinks outside the submission directory.
+                if os.path.commonprefix([src, self._dir]) == self._dir:
+                    # If a link already exists under this name, it's probably from a
+                    # previous case, but might point to something different.
+                    if os.path.islink(src):
+                        if os.readlink(src) == dst:
+                            continue
+                        os.unlink(src)
+                    os.symlink(dst, src)
+                else:
+                    raise InternalError('cannot symlink outside of submission directory')
+
+            agent = self._file('setbufsize.so')
+            if not os.path.isfile(agent):
+                # The directory may be shared with other processes through the compiled binary cache, so never let
+                # anyone see a partially-copied agent.
+                temp_agent = '%s.%d' % (agent, os.getpid())
+                shutil.copyfile(setbufsize_path, temp_agent)
+                os.replace(temp_agent, agent)
         env = {
             # Forward LD_LIBRARY_PATH for systems (e.g. Android Termux) that require
             # it to find shared libraries
@@ -134,7 +147,7 @@ class PlatformExecutorMixin(metaclass=abc.ABCMeta):
             env=env,
             cwd=utf8bytes(self._dir),
             nproc=self.get_nproc(),
-            fsize=self.fsize,
+            fsize=max(self.fsize, kwargs.get('fsize', 0)),
         )
 
 
@@ -1,9 +1,24 @@
 import os
+from typing import Optional
 
+from dmoj.judgeenv import env
+from dmoj.utils.disk_cache import DiskCache
 from dmoj.utils.helper_files import compile_with_auxiliary_files
 
+_output_cache: Optional[DiskCache] = None
+
 
 class GeneratorManager:
     def get_generator(self, filenames, flags, lang=None, compiler_time_limit=None, should_cache=True):
         filenames = list(map(os.path.abspath, filenames))
         return compile_with_auxiliary_files(filenames, flags, lang, compiler_time_limit, should_cache)
+
+
+def get_generator_output_cache() -> Optional[DiskCache]:
+    """
+    Returns the on-disk cache of generator outputs, or None if `generator_cache_dir` is not configured.
+    """
+    global _output_cache
+    if _output_cache is None and env.generator_cache_dir:
+        _output_cache = DiskCache(env.generator_cache_dir, env.generator_cache_size, env.generator_cache_max_bytes)
+    return _output_cache
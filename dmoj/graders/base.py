@@ -1,14 +1,28 @@
+import threading
+
 from dmoj.problem import BatchedTestCase, TestCase
+from dmoj.utils import timing
 from dmoj.utils.unicode import utf8bytes
 
 
 class BaseGrader:
+    # Whether `grade` may be called for several cases at once from different threads, for problems that set
+    # `parallel_cases`. Graders that keep per-case state on `self` must leave this off.
+    supports_parallel_cases = False
+    # Whether the submission may read its input from, and write its output to, files rather than pipes, for problems
+    # that set `fd_io`. Graders that talk to the submission while it runs must leave this off.
+    supports_fd_io = False
+
     def __init__(self, judge, problem, language, source):
+        # Each grading thread has its own current process.
+        self._current_procs = {}
+        self._current_procs_lock = threading.Lock()
         self.source = utf8bytes(source)
         self.language = language
         self.problem = problem
         self.judge = judge
-        self.binary = self._generate_binary()
+        with timing.span('binary'):
+            self.binary = self._generate_binary()
         self.is_pretested = self.problem.meta.pretests_only and 'pretest_test_cases' in self.problem.config
         self._abort_requested = False
         self._current_proc = None
@@ -21,11 +35,42 @@ class BaseGrader:
     def _generate_binary(self):
         raise NotImplementedError
 
+    @property
+    def _current_proc(self):
+        return self._current_procs.get(threading.get_ident())
+
+    @_current_proc.setter
+    def _current_proc(self, proc):
+        with self._current_procs_lock:
+            self._current_procs[threading.get_ident()] = proc
+
+    def end_case(self):
+        """
+        Forgets the process of the case this thread was grading, once the case is over.
+        """
+        with self._current_procs_lock:
+            self._current_procs.pop(threading.get_ident(), None)
+
     def abort_grading(self):
         self._abort_requested = True
-        if self._current_proc:
+        with self._current_procs_lock:
+            procs = list(self._current_procs.values())
+        for proc in procs:
+            self._kill_process(proc)
+
+    def abort_grading_in_thread(self, thread_id):
+        """
+        Kills the process of the case being graded by `thread_id`, without aborting the whole submission.
+        """
+        with self._current_procs_lock:
+            proc = self._current_procs.get(thread_id)
+        self._kill_process(proc)
+
+    @staticmethod
+    def _kill_process(proc):
+        if proc:
             try:
-                self._current_proc.kill()
+                proc.kill()
             except OSError:
                 pass
 
@@ -11,6 +11,9 @@ from dmoj.utils.unicode import utf8text
 
 
 class BridgedInteractiveGrader(StandardGrader):
+    supports_parallel_cases = False
+    supports_fd_io = False
+
     def __init__(self, judge, problem, language, source):
         super().__init__(judge, problem, language, source)
         self.handler_data = self.problem.config.interactive
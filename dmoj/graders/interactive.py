@@ -91,6 +91,9 @@ class Interactor:
 
 
 class InteractiveGrader(StandardGrader):
+    supports_parallel_cases = False
+    supports_fd_io = False
+
     def _interact_with_process(self, case, result, input):
         interactor = Interactor(self._current_proc)
         self.check = False
@@ -1,29 +1,46 @@
 import logging
+import mmap
+import os
 import subprocess
 
-from dmoj.error import OutputLimitExceeded
+from dmoj.error import OutputLimitExceeded, OutputRejected
 from dmoj.executors import executors
 from dmoj.graders.base import BaseGrader
+from dmoj.judgeenv import env
 from dmoj.result import CheckerResult, Result
+from dmoj.utils import timing
+from dmoj.utils.os_ext import anonymous_file
 
 log = logging.getLogger('dmoj.graders')
 
 
 class StandardGrader(BaseGrader):
+    supports_parallel_cases = True
+    supports_fd_io = True
+
     def grade(self, case):
         result = Result(case)
 
-        input = case.input_data()  # cache generator data
+        with timing.span('data'):
+            input = case.input_data_view()  # cache generator data
+
+        # Subclasses that override `check_result` may want to look at the entire output.
+        if type(self).check_result is StandardGrader.check_result:
+            case.open_checker_stream()
 
-        self._launch_process(case)
+        if self.supports_fd_io and case.config.fd_io:
+            error = self._run_process_with_fds(case, result)
+        else:
+            self._launch_process(case)
 
-        error = self._interact_with_process(case, result, input)
+            error = self._interact_with_process(case, result, input)
 
         process = self._current_proc
 
         self.populate_result(error, result, process)
 
-        check = self.check_result(case, result)
+        with timing.span('check'):
+            check = self.check_result(case, result)
 
         # checkers must either return a boolean (True: full points, False: 0 points)
         # or a CheckerResult, so convert to CheckerResult if it returned bool
@@ -42,6 +59,12 @@ class StandardGrader(BaseGrader):
     def populate_result(self, error, result, process):
         self.binary.populate_result(error, result, process)
 
+        stream = result.case.checker_stream
+        if stream is not None and stream.rejected:
+            # We killed the submission ourselves once its output could no longer pass, which is no runtime error.
+            result.result_flag &= ~Result.RTE
+            result.feedback = ''
+
     def check_result(self, case, result):
         # If the submission didn't crash and didn't time out, there's a chance it might be AC
         # We shouldn't run checkers if the submission is already known to be incorrect, because some checkers
@@ -49,13 +72,22 @@ class StandardGrader(BaseGrader):
         # See https://github.com/DMOJ/judge/issues/170
         checker = case.checker()
         # checker is a `partial` object, NOT a `function` object
-        if not result.result_flag or getattr(checker.func, 'run_on_error', False):
+        if case.checker_stream is not None:
+            # The output was checked while it was being produced.
+            check = case.checker_stream.result() if not result.result_flag else False
+        elif not result.result_flag or getattr(checker.func, 'run_on_error', False):
+            # Built-in checkers can take the input as any bytes-like object, so spare them a copy. Problem-supplied
+            # checkers may rely on it being `bytes`.
+            if checker.func.__module__.startswith('dmoj.checkers.'):
+                judge_input = case.input_data_view()
+            else:
+                judge_input = case.input_data()
             try:
                 check = checker(
                     result.proc_output,
                     case.output_data(),
                     submission_source=self.source,
-                    judge_input=case.input_data(),
+                    judge_input=judge_input,
                     point_value=case.points,
                     case_position=case.position,
                     batch=case.batch,
@@ -88,16 +120,74 @@ class StandardGrader(BaseGrader):
     def _interact_with_process(self, case, result, input):
         process = self._current_proc
         try:
-            result.proc_output, error = process.communicate(
-                input, outlimit=case.config.output_limit_length, errlimit=1048576
-            )
+            with timing.span('communicate'):
+                result.proc_output, error = process.communicate(
+                    input,
+                    outlimit=case.config.output_limit_length,
+                    errlimit=1048576,
+                    stdout_consumer=case.checker_stream,
+                    stdout_prefix_length=case.output_prefix_length,
+                )
         except OutputLimitExceeded:
             error = b''
             process.kill()
+        except OutputRejected as e:
+            # There's no use in letting the submission run any further.
+            result.proc_output = e.output
+            error = b''
+            if process.poll() is None:
+                process.kill()
         finally:
             process.wait()
         return error
 
+    def _run_process_with_fds(self, case, result):
+        """
+        Runs the submission with stdin opened directly on its input data, and stdout redirected to an anonymous file,
+        which is read back once the submission exits. The output limit is enforced by the kernel through `fsize`.
+        """
+        outlimit = case.config.output_limit_length
+        stdin = case.open_input()
+        try:
+            stdout = anonymous_file('stdout', dir=env.tempdir)
+            try:
+                self._current_proc = process = self.binary.launch(
+                    time=self.problem.time_limit,
+                    memory=self.problem.memory_limit,
+                    symlinks=case.config.symlinks,
+                    stdin=stdin,
+                    stdout=stdout,
+                    stderr=subprocess.PIPE,
+                    wall_time=case.config.wall_time_factor * self.problem.time_limit,
+                    # Writing one byte past the limit is how we tell the output was too long.
+                    fsize=outlimit + 1,
+                )
+                os.close(stdin)
+                stdin = None
+
+                try:
+                    with timing.span('communicate'):
+                        _, error = process.communicate(errlimit=1048576)
+                except OutputLimitExceeded:
+                    error = b''
+                    process.kill()
+                finally:
+                    process.wait()
+
+                size = os.fstat(stdout).st_size
+                if size > outlimit:
+                    process.mark_ole()
+                elif not process.is_ole:
+                    # Output is only worth checking if the submission exited cleanly.
+                    stream = case.checker_stream if process.returncode == 0 else None
+                    result.proc_output = _read_output(stdout, size, stream, case.output_prefix_length)
+            finally:
+                os.close(stdout)
+        finally:
+            if stdin is not None:
+                os.close(stdin)
+        return error
+
     def _generate_binary(self):
         return executors[self.language].Executor(
             self.problem.id,
@@ -105,3 +195,14 @@ class StandardGrader(BaseGrader):
             hints=self.problem.config.hints or [],
             unbuffered=self.problem.config.unbuffered,
         )
+
+
+def _read_output(fd, size, stream, prefix_length):
+    if not size:
+        return b''
+    with mmap.mmap(fd, size, access=mmap.ACCESS_READ) as output:
+        if stream is None:
+            return output[:]
+        with memoryview(output) as chunk:
+            stream.feed(chunk)
+        return output[:prefix_length]
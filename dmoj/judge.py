@@ -1,4 +1,5 @@
 #!/usr/bin/python
+import json
 import logging
 import os
 import signal
@@ -6,20 +7,30 @@ import sys
 import multiprocessing
 import threading
 import traceback
+import weakref
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
 from enum import Enum
 from http.server import HTTPServer
 from itertools import groupby
 from operator import itemgetter
-from typing import Any, Callable, Dict, Generator, List, NamedTuple, Optional, Tuple, Union
+from typing import Any, Callable, Dict, Generator, Iterable, List, NamedTuple, Optional, Set, Tuple
 
-from dmoj import packet
+from dmoj import metrics, packet
 from dmoj.control import JudgeControlRequestHandler
 from dmoj.error import CompileError
-from dmoj.judgeenv import clear_problem_dirs_cache, env, get_supported_problems, startup_warnings
+from dmoj.judgeenv import (
+    clear_problem_dirs_cache,
+    env,
+    forget_problem_roots,
+    get_problem_dirs_generation,
+    get_problem_index,
+    startup_warnings,
+    sync_problem_dirs_cache,
+)
 from dmoj.monitor import Monitor
 from dmoj.problem import BatchedTestCase, Problem, TestCase
 from dmoj.result import Result
-from dmoj.utils import builtin_int_patch
+from dmoj.utils import builtin_int_patch, timing
 from dmoj.utils.ansi import ansi_style, print_ansi, strip_ansi
 from dmoj.utils.unicode import unicode_stdout_stderr, utf8bytes, utf8text
 
@@ -44,6 +55,7 @@ class IPC(Enum):
     GRADING_ABORTED = 'GRADING-ABORTED'
     UNHANDLED_EXCEPTION = 'UNHANDLED-EXCEPTION'
     REQUEST_ABORT = 'REQUEST-ABORT'
+    GRADE = 'GRADE'
 
 
 IPC_TEARDOWN_TIMEOUT = 5  # seconds
@@ -68,19 +80,39 @@ Submission = NamedTuple(
 
 
 class Judge:
-    def __init__(self, packet_manager: packet.PacketManager) -> None:
+    def __init__(self, packet_manager: packet.PacketManager, slots: int = 1) -> None:
         self.packet_manager = packet_manager
-        self.current_judge_worker: Optional[JudgeWorker] = None
-        self._grading_lock = threading.Lock()
+        self.slots = slots
+        # Maps submission ID to the worker grading it; each grading slot owns at most one worker at a time.
+        self.current_judge_workers: Dict[int, JudgeWorker] = {}
+        self._workers_lock = threading.Lock()
+        self._grading_slots = threading.BoundedSemaphore(slots)
+        self.worker_pool = JudgeWorkerPool(slots)
 
         self.updater_exit = False
         self.updater_signal = threading.Event()
+        # Problems changed since the last update, or None if every problem must be rescanned.
+        self._updated_problems: Optional[Set[str]] = set()
+        self._updated_problems_lock = threading.Lock()
         self.updater = threading.Thread(target=self._updater_thread)
+        self._timing_log_lock = threading.Lock()
+
+    def collect_metrics(self) -> None:
+        """
+        Updates the metrics that are sampled rather than counted, just before they are exported.
+        """
+        stats = self.packet_manager.transport_stats()
+        metrics.packet_queue_packets.set(stats['queued_packets'])
+        metrics.packet_queue_bytes.set(stats['queued_bytes'])
+        with self._workers_lock:
+            metrics.grading_slots_busy.set(len(self.current_judge_workers))
 
     @property
-    def current_submission(self):
-        worker = self.current_judge_worker
-        return worker.submission if worker else None
+    def current_submissions(self) -> List[Submission]:
+        with self._workers_lock:
+            return [
+                worker.submission for worker in self.current_judge_workers.values() if worker.submission is not None
+            ]
 
     def _updater_thread(self) -> None:
         log = logging.getLogger('dmoj.updater')
@@ -97,26 +129,38 @@ class Judge:
             # if thread:
             #    thread.join()
 
+            with self._updated_problems_lock:
+                problems, self._updated_problems = self._updated_problems, set()
+
             try:
-                clear_problem_dirs_cache()
-                self.packet_manager.supported_problems_packet(get_supported_problems())
+                if problems is None:
+                    clear_problem_dirs_cache()
+                delta = get_problem_index().update(problems)
+                if delta.added or delta.changed or delta.removed:
+                    if problems is not None:
+                        # Problems may have moved between problem directories.
+                        forget_problem_roots()
+                    self.packet_manager.supported_problems_delta_packet(delta)
             except Exception:
                 log.exception('Failed to update problems.')
 
-    def update_problems(self) -> None:
+    def update_problems(self, problems: Optional[Iterable[str]] = None) -> None:
         """
-        Pushes current problem set to server.
+        Pushes changes to the problem set to server. Only the given problems are rescanned, if any.
         """
+        with self._updated_problems_lock:
+            if problems is None or self._updated_problems is None:
+                self._updated_problems = None
+            else:
+                self._updated_problems.update(problems)
         self.updater_signal.set()
 
     def begin_grading(self, submission: Submission, report=logger.info, blocking=False) -> None:
-        # Ensure only one submission is running at a time; this lock is released at the end of submission grading.
-        # This is necessary because `begin_grading` is "re-entrant"; after e.g. grading-end is sent, the network
-        # thread may receive a new submission before the grading thread and worker from the *previous* submission
-        # have finished tearing down. Trashing global state (e.g. `self.current_judge_worker`) before then would be
-        # an error.
-        self._grading_lock.acquire()
-        assert self.current_judge_worker is None
+        # Ensure at most `self.slots` submissions are running at a time; the slot is released at the end of submission
+        # grading. This is necessary because `begin_grading` is "re-entrant"; after e.g. grading-end is sent, the
+        # network thread may receive a new submission before the grading thread and worker from the *previous*
+        # submission have finished tearing down, and that submission must not be counted as a free slot until then.
+        self._grading_slots.acquire()
 
         report(
             ansi_style(
@@ -127,11 +171,20 @@ class Judge:
 
         # FIXME(tbrindus): what if we receive an abort from the judge before IPC handshake completes? We'll send
         # an abort request down the pipe, possibly messing up the handshake.
-        self.current_judge_worker = JudgeWorker(submission)
+        try:
+            worker = self.worker_pool.acquire()
+            worker.begin_grading(submission)
+        except BaseException:
+            self._grading_slots.release()
+            raise
+
+        with self._workers_lock:
+            assert submission.id not in self.current_judge_workers
+            self.current_judge_workers[submission.id] = worker
 
         ipc_ready_signal = threading.Event()
         grading_thread = threading.Thread(
-            target=self._grading_thread_main, args=(ipc_ready_signal, report), daemon=True
+            target=self._grading_thread_main, args=(worker, submission, ipc_ready_signal, report), daemon=True
         )
         grading_thread.start()
 
@@ -140,12 +193,12 @@ class Judge:
         if blocking:
             grading_thread.join()
 
-    def _grading_thread_main(self, ipc_ready_signal: threading.Event, report) -> None:
-        assert self.current_judge_worker is not None
-
+    def _grading_thread_main(
+        self, worker: 'JudgeWorker', submission: Submission, ipc_ready_signal: threading.Event, report
+    ) -> None:
         try:
             ipc_handler_dispatch: Dict[IPC, Callable] = {
-                IPC.HELLO: lambda _report: ipc_ready_signal.set(),
+                IPC.HELLO: lambda _submission, _report: ipc_ready_signal.set(),
                 IPC.COMPILE_ERROR: self._ipc_compile_error,
                 IPC.COMPILE_MESSAGE: self._ipc_compile_message,
                 IPC.GRADING_BEGIN: self._ipc_grading_begin,
@@ -157,7 +210,7 @@ class Judge:
                 IPC.UNHANDLED_EXCEPTION: self._ipc_unhandled_exception,
             }
 
-            for ipc_type, data in self.current_judge_worker.communicate():
+            for ipc_type, data in worker.communicate():
                 try:
                     handler_func = ipc_handler_dispatch[ipc_type]
                 except KeyError:
@@ -165,41 +218,89 @@ class Judge:
                         "judge got unexpected IPC message from worker: %s" % ((ipc_type, data),)
                     ) from None
 
-                handler_func(report, *data)
+                handler_func(submission, report, *data)
 
             report(
                 ansi_style(
-                    'Done grading #ansi[%s](yellow)/#ansi[%s](green|bold).\n'
-                    % (self.current_submission.problem_id, self.current_submission.id)
+                    'Done grading #ansi[%s](yellow)/#ansi[%s](green|bold).\n' % (submission.problem_id, submission.id)
                 )
             )
         except Exception:  # noqa: E722, we want to catch everything
-            self.log_internal_error()
+            self.log_internal_error(submission=submission)
         finally:
-            self.current_judge_worker.wait_with_timeout()
-            self.current_judge_worker = None
+            with self._workers_lock:
+                del self.current_judge_workers[submission.id]
+            self.worker_pool.release(worker)
 
             # Might not have been set if an exception was encountered before HELLO message, so signal here to keep the
             # other side from waiting forever.
             ipc_ready_signal.set()
 
-            self._grading_lock.release()
+            self._grading_slots.release()
 
-    def _ipc_compile_error(self, report, error_message: str) -> None:
+    def _ipc_compile_error(self, submission: Submission, report, error_message: str, timings: Dict[str, Any]) -> None:
         report(ansi_style('#ansi[Failed compiling submission!](red|bold)'))
         report(error_message.rstrip())  # don't print extra newline
-        self.packet_manager.compile_error_packet(error_message)
-
-    def _ipc_compile_message(self, _report, compile_message: str) -> None:
-        self.packet_manager.compile_message_packet(compile_message)
-
-    def _ipc_grading_begin(self, _report, is_pretested: bool) -> None:
-        self.packet_manager.begin_grading_packet(is_pretested)
+        metrics.submissions.inc(outcome='compile-error')
+        self._record_timings(submission, timings)
+        self.packet_manager.compile_error_packet(submission.id, error_message)
+
+    def _ipc_compile_message(self, submission: Submission, _report, compile_message: str) -> None:
+        self.packet_manager.compile_message_packet(submission.id, compile_message)
+
+    def _ipc_grading_begin(self, submission: Submission, _report, is_pretested: bool) -> None:
+        self.packet_manager.begin_grading_packet(submission.id, is_pretested)
+
+    def _ipc_grading_end(self, submission: Submission, _report, timings: Dict[str, Any]) -> None:
+        metrics.submissions.inc(outcome='graded')
+        self._record_timings(submission, timings)
+        self.packet_manager.grading_end_packet(submission.id, timings if env.report_timings else None)
+
+    def _record_timings(self, submission: Submission, timings: Dict[str, Any]) -> None:
+        compile = timings['stages'].get('compile')
+        if compile is not None:
+            metrics.compile_seconds.observe(compile['seconds'])
+        for case in timings['cases'].values():
+            if 'check' in case:
+                metrics.checker_seconds.observe(case['check'])
+            if 'spawn' in case:
+                metrics.sandbox_spawn_seconds.observe(case['spawn'])
+        for result in ('hit', 'miss'):
+            count = timings['events'].get('binary-cache-' + result)
+            if count:
+                metrics.binary_cache.inc(count, result=result)
+
+        syscalls = timings.get('syscalls', {})
+        for name, traps in syscalls.items():
+            metrics.syscall_traps.inc(traps['count'], language=submission.language, syscall=name)
+            metrics.syscall_trap_seconds.inc(traps['seconds'], language=submission.language, syscall=name)
+        if syscalls:
+            busiest = sorted(syscalls.items(), key=lambda item: item[1]['seconds'], reverse=True)[:5]
+            logger.info(
+                'Submission %s (%s) trapped %d syscalls in %.3fs, mostly: %s',
+                submission.id,
+                submission.language,
+                sum(traps['count'] for traps in syscalls.values()),
+                sum(traps['seconds'] for traps in syscalls.values()),
+                ', '.join('%s x%d (%.3fs)' % (name, traps['count'], traps['seconds']) for name, traps in busiest),
+            )
 
-    def _ipc_grading_end(self, _report) -> None:
-        self.packet_manager.grading_end_packet()
+        if env.timing_log:
+            line = json.dumps(
+                {
+                    'submission': submission.id,
+                    'problem': submission.problem_id,
+                    'language': submission.language,
+                    **timings,
+                }
+            )
+            # Grading threads share the file, so write whole lines at once.
+            with self._timing_log_lock, open(env.timing_log, 'a') as f:
+                f.write(line + '\n')
 
-    def _ipc_result(self, report, batch_number: Optional[int], case_number: int, result: Result) -> None:
+    def _ipc_result(
+        self, submission: Submission, report, batch_number: Optional[int], case_number: int, result: Result
+    ) -> None:
         codes = result.readable_codes()
 
         is_sc = result.result_flag & Result.SC
@@ -218,41 +319,53 @@ class Judge:
             )
         case_padding = '  ' if batch_number is not None else ''
         report(ansi_style('%sTest case %2d %-3s %s' % (case_padding, case_number, colored_codes[0], case_info)))
-        self.packet_manager.test_case_status_packet(case_number, result)
+        if not is_sc:
+            metrics.case_execution_seconds.observe(result.execution_time)
+            metrics.case_wall_seconds.observe(result.wall_clock_time)
+        self.packet_manager.test_case_status_packet(submission.id, case_number, result)
 
-    def _ipc_batch_begin(self, report, batch_number: int) -> None:
-        self.packet_manager.batch_begin_packet()
+    def _ipc_batch_begin(self, submission: Submission, report, batch_number: int) -> None:
+        self.packet_manager.batch_begin_packet(submission.id)
         report(ansi_style("#ansi[Batch #%d](yellow|bold)" % batch_number))
 
-    def _ipc_batch_end(self, _report, _batch_number: int) -> None:
-        self.packet_manager.batch_end_packet()
+    def _ipc_batch_end(self, submission: Submission, _report, _batch_number: int) -> None:
+        self.packet_manager.batch_end_packet(submission.id)
 
-    def _ipc_grading_aborted(self, report) -> None:
-        self.packet_manager.submission_aborted_packet()
+    def _ipc_grading_aborted(self, submission: Submission, report) -> None:
+        metrics.submissions.inc(outcome='aborted')
+        self.packet_manager.submission_aborted_packet(submission.id)
         report(ansi_style('#ansi[Forcefully terminating grading. Temporary files may not be deleted.](red|bold)'))
 
-    def _ipc_unhandled_exception(self, _report, message: str) -> None:
+    def _ipc_unhandled_exception(self, submission: Submission, _report, message: str) -> None:
         logger.error("Unhandled exception in worker process")
-        self.log_internal_error(message=message)
+        self.log_internal_error(message=message, submission=submission)
 
     def abort_grading(self, submission_id: Optional[int] = None) -> None:
-        # Capture locally so we don't end up with a TOCTOU NoneType error. This function is typically called
-        # from the network thread, but `current_judge_worker` is updated from the grading thread.
-        worker = self.current_judge_worker
-        if not worker:
+        """
+        Aborts the grading of `submission_id`, or of every submission currently being graded if it is None.
+        """
+        # Capture locally so we don't race with grading threads. This function is typically called from the network
+        # thread, but `current_judge_workers` is updated from the grading threads.
+        with self._workers_lock:
+            if submission_id is None:
+                workers = list(self.current_judge_workers.items())
+            else:
+                worker = self.current_judge_workers.get(submission_id)
+                workers = [(submission_id, worker)] if worker else []
+
+        if not workers:
             if submission_id is not None:
                 # This can happen because message delivery is async; the user may have pressed "Abort" before we
                 # finished grading, but by the time the message reached us we may have finished grading already.
-                logger.info('Received abortion request, but nothing is running')
-        elif submission_id is not None and worker.submission.id != submission_id:
-            logger.warning(
-                'Received abortion request for %d, but %d is currently running', submission_id, worker.submission.id
-            )
-        else:
-            logger.info('Received abortion request for %d', worker.submission.id)
+                logger.info('Received abortion request for %d, but it is not running', submission_id)
+            return
+
+        for id, worker in workers:
+            logger.info('Received abortion request for %d', id)
             # These calls are idempotent, so it doesn't matter if we raced and the worker has exited already.
             worker.request_abort_grading()
-            worker.wait_with_timeout()
+        for _, worker in workers:
+            worker.wait_for_grading_end()
 
     def listen(self) -> None:
         """
@@ -266,12 +379,15 @@ class Judge:
         End any submission currently executing, and exit the judge.
         """
         self.abort_grading()
+        self.worker_pool.close()
         self.updater_exit = True
         self.updater_signal.set()
         if self.packet_manager:
             self.packet_manager.close()
 
-    def log_internal_error(self, exc: BaseException = None, message: str = None) -> None:
+    def log_internal_error(
+        self, exc: BaseException = None, message: str = None, submission: Optional[Submission] = None
+    ) -> None:
         if not message:
             # If exc exists, raise it so that sys.exc_info() is populated with its data.
             if exc:
@@ -287,32 +403,135 @@ class Judge:
 
         logger.error(message)
 
+        if submission is None:
+            return
+
         try:
             # Strip ANSI from the message, since this might be a checker's CompileError ...we don't want to see the raw
             # ANSI codes from GCC/Clang on the site. We could use format_ansi and send HTML to the site, but the site
             # doesn't presently support HTML internal error formatting.
-            self.packet_manager.internal_error_packet(strip_ansi(message))
+            metrics.submissions.inc(outcome='internal-error')
+            self.packet_manager.internal_error_packet(submission.id, strip_ansi(message))
         except Exception:  # noqa E722: don't want `log_internal_error` to trigger `log_internal_error`, ever
             logger.exception('Error encountered while reporting error to site!')
 
 
+class ParallelCaseRunner:
+    """
+    Grades test cases on a pool of threads, while letting the caller consume results in case order.
+    """
+
+    def __init__(self, grader, cases: List[TestCase], max_workers: int) -> None:
+        self.grader = grader
+        self._lock = threading.Lock()
+        self._cancelled: Set[TestCase] = set()
+        # Maps each case being graded to the thread grading it.
+        self._running: Dict[TestCase, int] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        # Cases are queued in order, so earlier cases always start before later ones.
+        self._futures: Dict[TestCase, Future] = {case: self._executor.submit(self._grade, case) for case in cases}
+
+    def _grade(self, case: TestCase) -> Optional[Result]:
+        with self._lock:
+            if case in self._cancelled:
+                return None
+            self._running[case] = threading.get_ident()
+
+        try:
+            with timing.case(case.position + 1):
+                result = self.grader.grade(case)
+            # Results may sit around until every earlier case is done, so don't hold on to the full output.
+            result.proc_output = result.output
+            return result
+        finally:
+            with self._lock:
+                del self._running[case]
+            self.grader.end_case()
+
+    def result(self, case: TestCase) -> Optional[Result]:
+        """
+        Waits for `case` to be graded, returning None if it was cancelled.
+        """
+        try:
+            return self._futures[case].result()
+        except CancelledError:
+            return None
+
+    def cancel(self, cases: List[TestCase]) -> None:
+        with self._lock:
+            for case in cases:
+                if case in self._cancelled:
+                    continue
+                self._cancelled.add(case)
+                self._futures[case].cancel()
+                thread_id = self._running.get(case)
+                if thread_id is not None:
+                    self.grader.abort_grading_in_thread(thread_id)
+
+    def cancel_all(self) -> None:
+        self.cancel([case for case, future in self._futures.items() if not future.done()])
+
+    def close(self) -> None:
+        self.cancel_all()
+        self._executor.shutdown(wait=True)
+
+
 class JudgeWorker:
-    def __init__(self, submission: Submission) -> None:
-        self.submission = submission
+    """
+    Handle to a pre-forked worker process, which grades submissions one at a time until it is recycled.
+    """
+
+    _live_workers: 'weakref.WeakSet[JudgeWorker]' = weakref.WeakSet()
+
+    def __init__(self) -> None:
+        self.submission: Optional[Submission] = None
+        self.submissions_graded = 0
         self._abort_requested = False
         # FIXME(tbrindus): marked Any pending grader cleanups.
         self.grader: Any = None
+        self._case_runner: Optional[ParallelCaseRunner] = None
+
+        # Guards against sending an abort request to a worker that has already moved past the submission it was meant
+        # for; the request would otherwise be picked up as the next submission's first message.
+        self._grading_lock = threading.Lock()
+        self._is_grading = False
+        # Whether both ends of the connection agree that no submission is in flight. If not, the worker can't be
+        # handed another submission.
+        self._is_in_sync = True
+        self._is_healthy = True
+        self._grading_done = threading.Event()
+        self._grading_done.set()
 
         self.worker_process_conn, child_conn = multiprocessing.Pipe()
         self.worker_process = multiprocessing.Process(
-            name="DMOJ Judge Handler for %s/%d" % (self.submission.problem_id, self.submission.id),
-            target=self._worker_process_main,
-            args=(child_conn, self.worker_process_conn),
+            name='DMOJ Judge Worker', target=self._worker_process_main, args=(child_conn, self.worker_process_conn)
         )
+        # Idle workers must not keep the judge alive on exit.
+        self.worker_process.daemon = True
         self.worker_process.start()
         child_conn.close()
+        JudgeWorker._live_workers.add(self)
+
+    def begin_grading(self, submission: Submission) -> None:
+        with self._grading_lock:
+            self.submission = submission
+            self._is_grading = True
+            self._is_in_sync = False
+            self._grading_done.clear()
+            self.worker_process_conn.send((IPC.GRADE, (submission, get_problem_dirs_generation())))
+
+    def end_grading(self) -> None:
+        self.submission = None
+        self.submissions_graded += 1
+        self._grading_done.set()
+
+    def wait_for_grading_end(self, timeout=IPC_TEARDOWN_TIMEOUT) -> None:
+        if not self._grading_done.wait(timeout):
+            logger.error("Worker is still grading, sending SIGKILL!")
+            self.worker_process.kill()
 
     def communicate(self) -> Generator[Tuple[IPC, tuple], None, None]:
+        assert self.submission is not None
         recv_timeout = max(60, int(2 * self.submission.time_limit))
         while True:
             try:
@@ -329,11 +548,53 @@ class JudgeWorker:
                 raise
 
             if ipc_type == IPC.BYE:
-                self.worker_process_conn.send((IPC.BYE, ()))
+                with self._grading_lock:
+                    self.worker_process_conn.send((IPC.BYE, ()))
+                    self._is_grading = False
+                    self._is_in_sync = True
                 return
             else:
+                if ipc_type == IPC.UNHANDLED_EXCEPTION:
+                    # Whatever went wrong may have left the worker in a bad state, so don't reuse it.
+                    self._is_healthy = False
                 yield ipc_type, data
 
+    @property
+    def is_reusable(self) -> bool:
+        if not self._is_healthy or not self._is_in_sync or not self.worker_process.is_alive():
+            return False
+        if self.submissions_graded >= env.worker_max_submissions:
+            return False
+        memory = self.memory_usage()
+        return memory is None or memory < env.worker_max_memory
+
+    def memory_usage(self) -> Optional[int]:
+        """
+        Returns the resident anonymous memory of the worker process in KB, or None if it can't be determined.
+
+        Mapped problem data is left out, since it's shared through the page cache.
+        """
+        pid = self.worker_process.pid
+        if pid is None:
+            return None
+        try:
+            with open('/proc/%d/status' % pid) as f:
+                status = dict(line.split(':', 1) for line in f)
+            # RssAnon is only available from Linux 4.5 onwards.
+            return int((status.get('RssAnon') or status['VmRSS']).split()[0])
+        except (IOError, ValueError, KeyError):
+            pass
+        return None
+
+    def shutdown(self) -> None:
+        if self._is_in_sync and self.worker_process.is_alive():
+            try:
+                self.worker_process_conn.send((IPC.BYE, ()))
+            except Exception:
+                logger.exception('Failed to ask worker to exit, killing it instead')
+        self.wait_with_timeout()
+        self.worker_process_conn.close()
+
     def wait_with_timeout(self, timeout=IPC_TEARDOWN_TIMEOUT) -> None:
         if self.worker_process and self.worker_process.is_alive():
             # Might be None if run was never called, or failed.
@@ -349,10 +610,14 @@ class JudgeWorker:
     def request_abort_grading(self) -> None:
         assert self.worker_process_conn
 
-        try:
-            self.worker_process_conn.send((IPC.REQUEST_ABORT, ()))
-        except Exception:
-            logger.exception("Failed to send abort request to worker, did it race?")
+        with self._grading_lock:
+            if not self._is_grading:
+                return
+
+            try:
+                self.worker_process_conn.send((IPC.REQUEST_ABORT, ()))
+            except Exception:
+                logger.exception("Failed to send abort request to worker, did it race?")
 
     def _worker_process_main(
         self,
@@ -360,11 +625,42 @@ class JudgeWorker:
         worker_process_conn: 'multiprocessing.connection.Connection',
     ) -> None:
         """
-        Main body of judge worker process, which handles grading and sends grading results to the judge controller via
-        IPC.
+        Main body of judge worker process, which waits for submissions and grades them one at a time.
         """
         worker_process_conn.close()
-        setproctitle(multiprocessing.current_process().name)
+        # We inherited the judge's end of every other worker's connection; drop them, lest those workers never see the
+        # judge hang up.
+        for worker in list(JudgeWorker._live_workers):
+            if worker is not self:
+                worker.worker_process_conn.close()
+
+        while True:
+            setproctitle('DMOJ Judge Worker (idle)')
+            try:
+                ipc_type, data = judge_process_conn.recv()
+            except (EOFError, OSError):
+                return
+
+            if ipc_type == IPC.BYE:
+                return
+            elif ipc_type != IPC.GRADE:
+                raise RuntimeError("worker got unexpected IPC message from judge: %s" % ((ipc_type, data),))
+
+            self.submission, problem_dirs_generation = data
+            # The problem directories may have changed since this worker was forked.
+            sync_problem_dirs_cache(problem_dirs_generation)
+            self._abort_requested = False
+            setproctitle('DMOJ Judge Handler for %s/%d' % (self.submission.problem_id, self.submission.id))
+
+            if not self._grade_submission(judge_process_conn):
+                # The judge may not have seen the end of this submission, so we can't trust the connection anymore.
+                return
+
+    def _grade_submission(self, judge_process_conn: 'multiprocessing.connection.Connection') -> bool:
+        """
+        Grades the current submission and sends grading results to the judge controller via IPC. Returns whether the
+        IPC conversation ended cleanly, i.e. whether this worker can grade another submission.
+        """
 
         def _ipc_recv_thread_main() -> None:
             """
@@ -408,9 +704,10 @@ class JudgeWorker:
                     # A grader can raise a `BrokenPipeError` that's indistinguishable from one caused by
                     # `judge_process_conn.send`, but should be handled differently (i.e. not quit the judge).
                     _report_unhandled_exception()
-                    return
+                    return False
 
-                judge_process_conn.send(ipc_msg)
+                with timing.span('ipc'):
+                    judge_process_conn.send(ipc_msg)
 
             judge_process_conn.send((IPC.BYE, ()))
         except BrokenPipeError:
@@ -419,6 +716,7 @@ class JudgeWorker:
             raise
         except:  # noqa: E722, we explicitly want to notify the parent of everything
             _report_unhandled_exception()
+            return False
         finally:
             if ipc_recv_thread is not None:
                 # We may have failed before sending the IPC.BYE down the connection, in which case the judge will never
@@ -433,19 +731,23 @@ class JudgeWorker:
             # should be refactored to have an explicit `cleanup()` or similar, rather than relying on refcounting
             # working out.
             self.grader = None
+            timing.end_submission()
+
+        # Only reuse the connection if the judge acknowledged the end of the submission.
+        return ipc_recv_thread is not None and not ipc_recv_thread.is_alive()
 
     def _grade_cases(self) -> Generator[Tuple[IPC, tuple], None, None]:
-        problem = Problem(
-            self.submission.problem_id, self.submission.time_limit, self.submission.memory_limit, self.submission.meta
-        )
+        submission = self.submission
+        assert submission is not None
+        timings = timing.begin_submission()
+        with timing.span('problem'):
+            problem = Problem(submission.problem_id, submission.time_limit, submission.memory_limit, submission.meta)
 
         try:
-            self.grader = problem.grader_class(
-                self, problem, self.submission.language, utf8bytes(self.submission.source)
-            )
+            self.grader = problem.grader_class(self, problem, submission.language, utf8bytes(submission.source))
         except CompileError as compilation_error:
             error = compilation_error.args[0] or b'compiler exited abnormally'
-            yield IPC.COMPILE_ERROR, (error,)
+            yield IPC.COMPILE_ERROR, (error, timings.to_dict())
             return
         else:
             binary = self.grader.binary
@@ -454,7 +756,7 @@ class JudgeWorker:
 
         yield IPC.GRADING_BEGIN, (self.grader.is_pretested,)
 
-        flattened_cases: List[Tuple[Optional[int], Union[TestCase, BatchedTestCase]]] = []
+        flattened_cases: List[Tuple[Optional[int], TestCase]] = []
         batch_number = 0
         for case in self.grader.cases():
             if isinstance(case, BatchedTestCase):
@@ -464,9 +766,29 @@ class JudgeWorker:
             else:
                 flattened_cases.append((None, case))
 
+        parallel_cases = problem.config.parallel_cases if self.grader.supports_parallel_cases else 1
+        if parallel_cases > 1:
+            self._case_runner = ParallelCaseRunner(self.grader, [case for _, case in flattened_cases], parallel_cases)
+
+        try:
+            if not (yield from self._report_cases(submission, flattened_cases)):
+                return
+        finally:
+            if self._case_runner:
+                self._case_runner.close()
+                self._case_runner = None
+
+        yield IPC.GRADING_END, (timings.to_dict(),)
+
+    def _report_cases(
+        self, submission: Submission, flattened_cases: List[Tuple[Optional[int], TestCase]]
+    ) -> Generator[Tuple[IPC, tuple], None, bool]:
+        """
+        Grades and reports every case, returning whether grading ran to completion rather than being aborted.
+        """
         case_number = 0
         is_short_circuiting = False
-        is_short_circuiting_enabled = self.submission.short_circuit
+        is_short_circuiting_enabled = submission.short_circuit
         for batch_number, cases in groupby(flattened_cases, key=itemgetter(0)):
             if batch_number:
                 yield IPC.BATCH_BEGIN, (batch_number,)
@@ -474,16 +796,23 @@ class JudgeWorker:
             for _, case in cases:
                 case_number += 1
 
+                result: Optional[Result]
                 # Stop grading if we're short circuiting
                 if is_short_circuiting:
                     result = Result(case, result_flag=Result.SC)
                 else:
-                    result = self.grader.grade(case)
+                    if self._case_runner:
+                        result = self._case_runner.result(case)
+                    else:
+                        with timing.case(case.position + 1):
+                            result = self.grader.grade(case)
 
                     # If the submission was killed due to a user-initiated abort, any result is meaningless.
                     if self._abort_requested:
                         yield IPC.GRADING_ABORTED, ()
-                        return
+                        return False
+                    # Cases are only cancelled when short circuiting or aborting, neither of which reaches here.
+                    assert result is not None
 
                     if result.result_flag & Result.WA:
                         # If we failed a 0-point case, we will short-circuit every case after this.
@@ -494,6 +823,16 @@ class JudgeWorker:
                         # past).
                         is_short_circuiting |= batch_number is not None or is_short_circuiting_enabled
 
+                        # Don't waste time on cases that are going to be short-circuited anyway.
+                        if is_short_circuiting and self._case_runner:
+                            self._case_runner.cancel(
+                                [
+                                    later_case
+                                    for later_batch_number, later_case in flattened_cases[case_number:]
+                                    if is_short_circuiting_enabled or later_batch_number == batch_number
+                                ]
+                            )
+
                 # Legacy hack: we need to allow graders to read and write `proc_output` on the `Result` object, but the
                 # judge controller only cares about the trimmed output, and shouldn't waste memory buffering the full
                 # output. So, we trim it here so we don't run out of memory in the controller.
@@ -504,17 +843,72 @@ class JudgeWorker:
                 yield IPC.BATCH_END, (batch_number,)
                 is_short_circuiting &= is_short_circuiting_enabled
 
-        yield IPC.GRADING_END, ()
+        return True
 
     def _do_abort(self) -> None:
         self._abort_requested = True
         if self.grader:
             self.grader.abort_grading()
+        case_runner = self._case_runner
+        if case_runner:
+            case_runner.cancel_all()
+
+
+class JudgeWorkerPool:
+    """
+    Pool of pre-forked `JudgeWorker`s, so that submissions don't pay for spawning and warming up a process.
+
+    Workers are recycled after grading `worker_max_submissions` submissions, or once their resident memory exceeds
+    `worker_max_memory`, so that state leaking from one submission can only ever affect a bounded number of others.
+    """
+
+    def __init__(self, size: int) -> None:
+        self._lock = threading.Lock()
+        self._idle: List[JudgeWorker] = []
+        self._closed = False
+        for _ in range(size):
+            self._idle.append(JudgeWorker())
+
+    def acquire(self) -> JudgeWorker:
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.worker_process.is_alive():
+                    return worker
+                metrics.worker_restarts.inc(reason='died')
+                worker.shutdown()
+        return JudgeWorker()
+
+    def release(self, worker: JudgeWorker) -> None:
+        worker.end_grading()
+        with self._lock:
+            if not self._closed and worker.is_reusable:
+                self._idle.append(worker)
+                return
+
+        logger.info(
+            'Recycling worker process %d after %d submissions', worker.worker_process.pid, worker.submissions_graded
+        )
+        worker.shutdown()
+
+        # Replace the worker now, rather than making the next submission wait for it.
+        with self._lock:
+            if not self._closed:
+                metrics.worker_restarts.inc(reason='recycled' if worker.worker_process.exitcode == 0 else 'died')
+                self._idle.append(JudgeWorker())
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.shutdown()
 
 
 class ClassicJudge(Judge):
     def __init__(self, host, port, **kwargs) -> None:
-        super().__init__(packet.PacketManager(host, port, self, env['id'], env['key'], **kwargs))
+        slots = env.grading_slots
+        super().__init__(packet.PacketManager(host, port, self, env['id'], env['key'], slots=slots, **kwargs), slots)
 
 
 def sanity_check():
@@ -629,6 +1023,8 @@ def main():  # pragma: no cover
 
     print()
     with monitor:
+        # From here on, the monitor reports every change to the problem index, which no longer needs full rescans.
+        get_problem_index().watched = monitor.is_real
         try:
             judge.listen()
         except KeyboardInterrupt:
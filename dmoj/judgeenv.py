@@ -1,7 +1,10 @@
 import argparse
+import hashlib
+import json
 import os
 import ssl
-from typing import Dict, List, Set
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
 
 import yaml
 
@@ -9,7 +12,7 @@ from dmoj.config import ConfigNode
 
 # noinspection PyUnresolvedReferences
 from dmoj.utils import pyyaml_patch  # noqa: F401, imported for side effect
-from dmoj.utils.unicode import utf8text
+from dmoj.utils.unicode import utf8bytes, utf8text
 
 problem_dirs = ()
 problem_watches = ()
@@ -20,22 +23,55 @@ env = ConfigNode(
         'generator_compiler_time_limit': 30,  # 30 seconds
         'generator_time_limit': 20,  # 20 seconds
         'generator_memory_limit': 524288,  # 512mb of RAM
+        'generator_cache_dir': None,  # Location to cache generator output across submissions, disabled if left blank
+        'generator_cache_size': 10000,  # Maximum number of generated test cases to cache (LRU order)
+        'generator_cache_max_bytes': 4294967296,  # Maximum total size of cached generator output
         'compiler_time_limit': 10,  # Kill compiler after 10 seconds
         'compiler_size_limit': 131072,  # Maximum allowable compiled file size, 128mb
         'compiler_output_character_limit': 65536,  # Number of characters allowed in compile output
         'compiled_binary_cache_dir': None,  # Location to store cached binaries, defaults to tempdir
         'compiled_binary_cache_size': 100,  # Maximum number of executables to cache (LRU order)
+        'compiled_binary_cache_max_bytes': 1073741824,  # Maximum total size of executables cached on disk
+        'problem_cache_size': 100,  # Maximum number of parsed problems to keep across submissions (LRU order)
+        'test_data_cache_size': 1000,  # Maximum number of normalized test data files to keep across submissions
+        'test_data_cache_max_bytes': 1073741824,  # Maximum total size of normalized test data to keep
+        # Location to share normalized copies of test data between worker processes, which otherwise keep their own
+        # copies in memory if left blank.
+        'test_data_cache_dir': None,
+        # Location to extract problem archives to, once per archive, so that test data is never decompressed while
+        # grading; members are extracted for every submission if left blank. Best placed on tmpfs or an SSD.
+        'archive_cache_dir': None,
+        'archive_cache_size': 100,  # Maximum number of extracted archives to keep (LRU order)
+        'archive_cache_max_bytes': 8589934592,  # Maximum total size of extracted archives
         'runtime': {},
         # Map of executor: [list of extra allowed file regexes], used to configure
         # the filesystem sandbox on a per-machine basis, without having to hack
         # executor source.
         'extra_fs': {},
+        # Maximum total size of packets waiting to be sent to the site, beyond which grading waits for the network
+        'outbound_queue_max_bytes': 67108864,
+        # File to append the time spent in each stage of grading to, as one JSON object per submission
+        'timing_log': None,
+        # Whether to send the same timings to the site along with grading-end
+        'report_timings': False,
         # List of judge URLs to ping on problem data updates (the URLs are expected
         # to host judges running with --api-host and --api-port)
         'update_pings': [],
+        'update_ping_timeout': 10,  # Seconds to wait for each judge to respond to an update ping
+        # Problem changes are reported once no further changes have been seen for this many seconds, so that a burst
+        # of changes (e.g. uploading an archive) only causes one update.
+        'problem_watch_quiet_window': 1.0,
         # Directory to use as temporary submission storage, system default
         # (e.g. /tmp) if left blank.
         'tempdir': None,
+        # Number of submissions that may be graded concurrently, each in its own
+        # worker process.
+        'grading_slots': 1,
+        # Worker processes are reused across submissions, and recycled after grading
+        # this many submissions...
+        'worker_max_submissions': 50,
+        # ...or once their resident memory, not counting mapped files, exceeds this many KB.
+        'worker_max_memory': 524288,
     },
     dynamic=False,
 )
@@ -283,28 +319,161 @@ def get_problem_roots(warnings=False):
     return cleaned_dirs
 
 
-def clear_problem_dirs_cache():
+def clear_problem_dirs_cache() -> None:
     global _problem_dirs_cache
     _problem_dirs_cache = None
+    forget_problem_roots()
+
+
+# Bumped whenever the cached problem locations may have gone stale. Worker processes only inherit a snapshot of the
+# caches, so they compare generations with the judge before each submission; see `sync_problem_dirs_cache`.
+_problem_dirs_generation = 0
+
+
+def forget_problem_roots() -> None:
+    """
+    Forgets which problem directory each problem was found in, e.g. because problems may have moved between them.
+    """
+    global _problem_dirs_generation
+    _problem_root_cache.clear()
+    _problem_dirs_generation += 1
+
+
+def get_problem_dirs_generation() -> int:
+    return _problem_dirs_generation
+
+
+def sync_problem_dirs_cache(generation: int) -> None:
+    """
+    Clears this process's problem directory caches, unless they are as recent as those of the process at `generation`.
+    """
+    global _problem_dirs_generation
+    if generation != _problem_dirs_generation:
+        clear_problem_dirs_cache()
+        _problem_dirs_generation = generation
 
 
 def get_problem_watches():
     return problem_watches
 
 
+class ProblemIndexDelta(NamedTuple):
+    added: List[Tuple[str, float]]
+    changed: List[Tuple[str, float]]
+    removed: List[str]
+    # Digest of the index after the change.
+    digest: str
+
+
+class ProblemIndex:
+    """
+    The problems supported by this judge, as (problem id, mtime) pairs.
+
+    Scanning every problem root is slow with many problems, especially on networked mounts, so once `watched` is set,
+    the index trusts whoever set it to report changed problems through `update`, and only rescans those. Otherwise,
+    every read rescans all roots.
+    """
+
+    def __init__(self) -> None:
+        self.watched = False
+        self._problems: Optional[Dict[str, float]] = None
+        self._lock = threading.RLock()
+
+    def problems(self) -> List[Tuple[str, float]]:
+        return self.snapshot()[0]
+
+    @property
+    def digest(self) -> str:
+        return self.snapshot()[1]
+
+    def snapshot(self) -> Tuple[List[Tuple[str, float]], str]:
+        """
+        Returns the problem list, and its digest: the SHA-256 of the list's JSON encoding, sorted by problem id.
+        """
+        with self._lock:
+            if self._problems is None or not self.watched:
+                self.update()
+            assert self._problems is not None
+            problems = sorted(self._problems.items())
+        return problems, hashlib.sha256(utf8bytes(json.dumps(problems))).hexdigest()
+
+    def update(self, problem_ids: Optional[Iterable[str]] = None) -> ProblemIndexDelta:
+        """
+        Rescans the problems in `problem_ids`, or every problem if it is None, and returns the changes.
+        """
+        with self._lock:
+            old = self._problems or {}
+            if problem_ids is None or self._problems is None:
+                new = self._scan_all()
+            else:
+                new = dict(old)
+                for problem_id in problem_ids:
+                    mtime = self._scan_problem(problem_id)
+                    if mtime is None:
+                        new.pop(problem_id, None)
+                    else:
+                        new[problem_id] = mtime
+            self._problems = new
+
+            problems = sorted(new.items())
+            return ProblemIndexDelta(
+                added=[(problem, mtime) for problem, mtime in problems if problem not in old],
+                changed=[(problem, mtime) for problem, mtime in problems if old.get(problem, mtime) != mtime],
+                removed=sorted(old.keys() - new.keys()),
+                digest=hashlib.sha256(utf8bytes(json.dumps(problems))).hexdigest(),
+            )
+
+    @staticmethod
+    def locate(path: str) -> Optional[Tuple[str, str]]:
+        """
+        Returns the id of the problem that `path` belongs to, and `path` relative to that problem's directory, or None
+        if `path` isn't inside a problem (e.g. it is a problem root itself).
+        """
+        path = os.path.abspath(utf8text(path))
+        for root in get_problem_roots():
+            relative = os.path.relpath(path, os.path.abspath(root))
+            if relative != os.curdir and relative != os.pardir and not relative.startswith(os.pardir + os.sep):
+                problem_id, _, relative = relative.partition(os.sep)
+                return problem_id, relative
+        return None
+
+    @staticmethod
+    def _scan_problem(problem_id: str) -> Optional[float]:
+        # The first root containing a problem is the one it's graded from; see `get_problem_root`.
+        for root in get_problem_roots():
+            problem_dir = os.path.join(root, problem_id)
+            if os.access(os.path.join(problem_dir, 'init.yml'), os.R_OK):
+                try:
+                    return os.path.getmtime(problem_dir)
+                except OSError:
+                    pass
+        return None
+
+    @staticmethod
+    def _scan_all() -> Dict[str, float]:
+        problems: Dict[str, float] = {}
+        for dir in get_problem_roots():
+            for problem in os.listdir(dir):
+                problem = utf8text(problem)
+                if problem not in problems and os.access(os.path.join(dir, problem, 'init.yml'), os.R_OK):
+                    problems[problem] = os.path.getmtime(os.path.join(dir, problem))
+        return problems
+
+
+_problem_index = ProblemIndex()
+
+
+def get_problem_index() -> ProblemIndex:
+    return _problem_index
+
+
 def get_supported_problems():
     """
     Fetches a list of all problems supported by this judge.
     :return:
         A list of all problems in tuple format: (problem id, mtime)
     """
-    problems = []
-    for dir in get_problem_roots():
-        for problem in os.listdir(dir):
-            problem = utf8text(problem)
-            if os.access(os.path.join(dir, problem, 'init.yml'), os.R_OK):
-                problems.append((problem, os.path.getmtime(os.path.join(dir, problem))))
-    return problems
+    return get_problem_index().problems()
 
 
 def get_runtime_versions():
@@ -0,0 +1,477 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import time
+import zlib
+from collections import deque
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Set
+
+import yaml
+
+from dmoj.packet import PacketManager
+from dmoj.utils.unicode import utf8bytes, utf8text
+
+log = logging.getLogger(__name__)
+
+# Stages of a submission, each timed from the end of the previous one.
+STAGES = ['queue', 'acknowledge', 'begin', 'compile', 'cases']
+
+
+class CorpusEntry(NamedTuple):
+    problem: str
+    language: str
+    source: str
+    time_limit: float
+    memory_limit: int
+
+
+def load_corpus(tests_dir: str, problem_regex: Optional[str] = None) -> List[CorpusEntry]:
+    """
+    Reads every submission from a directory laid out like the judge's testsuite, i.e. `problem/tests/case/test.yml`.
+    """
+    corpus = []
+    for problem in sorted(os.listdir(tests_dir)):
+        if problem_regex is not None and not re.match(problem_regex, problem):
+            continue
+        cases_dir = os.path.join(tests_dir, problem, 'tests')
+        if not os.path.isdir(cases_dir):
+            continue
+
+        for case in sorted(os.listdir(cases_dir)):
+            case_dir = os.path.join(cases_dir, case)
+            config: Dict[str, Any] = {}
+            for file in ('test.yml', 'test.posix.yml', 'test.linux.yml'):
+                try:
+                    with open(os.path.join(case_dir, file)) as f:
+                        config.update(yaml.safe_load(f.read()))
+                except IOError:
+                    pass
+            if not config or config.get('skip'):
+                continue
+
+            sources = [config['source']] if isinstance(config['source'], str) else config['source']
+            for source in sources:
+                with open(os.path.join(case_dir, source)) as f:
+                    corpus.append(CorpusEntry(problem, config['language'], f.read(), config['time'], config['memory']))
+    return corpus
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Returns the nearest-rank percentile of `values`, which must be sorted.
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(fraction * len(values) + 0.5) - 1))]
+
+
+class SimulatedSubmission:
+    def __init__(self, id: int, entry: CorpusEntry) -> None:
+        self.id = id
+        self.entry = entry
+        self.judge: Optional['SimulatedJudge'] = None
+        self.abort = False
+        # Time of each event seen for this submission, in order: created, sent, acknowledged, begun, compiled, ended.
+        self.times: List[float] = [time.monotonic()]
+        self.outcome: Optional[str] = None
+
+    def mark(self, index: int) -> None:
+        while len(self.times) < index:
+            self.times.append(self.times[-1])
+        if len(self.times) == index:
+            self.times.append(time.monotonic())
+
+
+class SimulatedJudge:
+    """
+    A judge connected to the simulator, and the site's side of its connection.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.name = ''
+        self.slots = 1
+        self.problems: Set[str] = set()
+        self.executors: Set[str] = set()
+        self.grading: Dict[int, SimulatedSubmission] = {}
+        self.compressor: Optional[Any] = None
+        self.decompressor: Optional[Any] = None
+
+    def can_grade(self, entry: CorpusEntry) -> bool:
+        return entry.problem in self.problems and entry.language in self.executors
+
+    async def read(self) -> dict:
+        size = PacketManager.SIZE_PACK.unpack(await self.reader.readexactly(PacketManager.SIZE_PACK.size))[0]
+        data = await self.reader.readexactly(size)
+        return json.loads(utf8text(self.decompressor.decompress(data) if self.decompressor else zlib.decompress(data)))
+
+    def send(self, packet: dict) -> None:
+        data = utf8bytes(json.dumps(packet))
+        if self.compressor:
+            data = self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        else:
+            data = zlib.compress(data)
+        self.writer.writelines((PacketManager.SIZE_PACK.pack(len(data)), data))
+
+
+class SiteSimulator:
+    """
+    Stands in for the site, speaking its side of the judge protocol, and hands a corpus of submissions to whichever
+    judges connect, recording how long each stage of grading takes.
+
+    Submissions arrive at `rate` per second on average, or, if `rate` is None, whenever a grading slot is free. A
+    fraction `abort_fraction` of them are aborted shortly after grading begins.
+    """
+
+    def __init__(
+        self,
+        corpus: List[CorpusEntry],
+        count: int,
+        rate: Optional[float] = None,
+        judges: int = 1,
+        key: Optional[str] = None,
+        abort_fraction: float = 0.0,
+        ping_interval: float = 10.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        if not corpus:
+            raise ValueError('corpus is empty')
+        self.corpus = corpus
+        self.count = count
+        self.rate = rate
+        self.judges_required = judges
+        self.key = key
+        self.abort_fraction = abort_fraction
+        self.ping_interval = ping_interval
+        self.random = random.Random(seed)
+
+        self.loop = asyncio.new_event_loop()
+        self.server: Optional[asyncio.base_events.Server] = None
+        self.port = 0
+        self.judges: List[SimulatedJudge] = []
+        self.pending: Deque[SimulatedSubmission] = deque()
+        self.submissions: Dict[int, SimulatedSubmission] = {}
+        self.finished = 0
+        self.ping_times: List[float] = []
+        self.start_time = 0.0
+        self.end_time = 0.0
+        # Created by listen, on the event loop, as asyncio primitives from before Python 3.10 bind to the loop current
+        # on creation.
+        self._changed: asyncio.Event
+        self._done: asyncio.Event
+
+    def listen(self, host: str, port: int) -> None:
+        self.server = self.loop.run_until_complete(self._listen(host, port))
+        self.port = self.server.sockets[0].getsockname()[1]
+        log.info('Listening for judges on: [%s]:%s', host, self.port)
+
+    async def _listen(self, host: str, port: int) -> asyncio.base_events.Server:
+        self._changed = asyncio.Event()
+        self._done = asyncio.Event()
+        return await asyncio.start_server(self._handle_judge, host, port)
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Grades `count` submissions, and returns a report on how long they took.
+        """
+        assert self.server is not None, 'listen must be called first'
+        try:
+            self.loop.run_until_complete(self._run())
+        finally:
+            self.server.close()
+            for judge in self.judges:
+                judge.writer.close()
+            self.loop.run_until_complete(self.server.wait_closed())
+            self.loop.close()
+        return self.report()
+
+    async def _run(self) -> None:
+        while len(self.judges) < self.judges_required:
+            await self._wait_for_change()
+
+        gradable = [entry for entry in self.corpus if any(judge.can_grade(entry) for judge in self.judges)]
+        if not gradable:
+            raise ValueError('no judge can grade any submission in the corpus')
+        if len(gradable) < len(self.corpus):
+            log.warning('Skipping %d submissions no judge can grade.', len(self.corpus) - len(gradable))
+        self.corpus = gradable
+
+        log.info('Starting load test with %d judge(s).', len(self.judges))
+        self.start_time = time.monotonic()
+        tasks = [self.loop.create_task(self._dispatch_forever()), self.loop.create_task(self._ping_forever())]
+        if self.rate is not None:
+            tasks.append(self.loop.create_task(self._arrive_forever(self.rate)))
+        try:
+            await self._done.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+        self.end_time = time.monotonic()
+
+    async def _wait_for_change(self) -> None:
+        self._changed.clear()
+        await self._changed.wait()
+
+    def _create_submission(self) -> None:
+        id = len(self.submissions) + 1
+        submission = SimulatedSubmission(id, self.random.choice(self.corpus))
+        submission.abort = self.random.random() < self.abort_fraction
+        self.submissions[id] = submission
+        self.pending.append(submission)
+        self._changed.set()
+
+    async def _arrive_forever(self, rate: float) -> None:
+        while len(self.submissions) < self.count:
+            self._create_submission()
+            await asyncio.sleep(self.random.expovariate(rate))
+
+    async def _dispatch_forever(self) -> None:
+        while True:
+            self._dispatch_pending()
+            if self.rate is None:
+                # Closed loop: every free slot is handed a submission, and one is kept waiting for the next to free up.
+                while len(self.submissions) < self.count and not self.pending:
+                    self._create_submission()
+                    self._dispatch_pending()
+            await self._wait_for_change()
+
+    def _dispatch_pending(self) -> None:
+        for submission in list(self.pending):
+            judge = self._find_judge(submission.entry)
+            if judge is None:
+                continue
+            self.pending.remove(submission)
+            self._send_submission(judge, submission)
+
+    def _find_judge(self, entry: CorpusEntry) -> Optional[SimulatedJudge]:
+        judges = [judge for judge in self.judges if len(judge.grading) < judge.slots and judge.can_grade(entry)]
+        if not judges:
+            return None
+        return min(judges, key=lambda judge: len(judge.grading) / judge.slots)
+
+    def _send_submission(self, judge: SimulatedJudge, submission: SimulatedSubmission) -> None:
+        submission.judge = judge
+        submission.mark(1)
+        judge.grading[submission.id] = submission
+        entry = submission.entry
+        judge.send(
+            {
+                'name': 'submission-request',
+                'submission-id': submission.id,
+                'problem-id': entry.problem,
+                'language': entry.language,
+                'source': entry.source,
+                'time-limit': entry.time_limit,
+                'memory-limit': entry.memory_limit,
+                'short-circuit': False,
+                'meta': {},
+            }
+        )
+
+    async def _ping_forever(self) -> None:
+        while True:
+            for judge in self.judges:
+                judge.send({'name': 'ping', 'when': time.time()})
+            await asyncio.sleep(self.ping_interval)
+
+    async def _abort_later(self, judge: SimulatedJudge, submission: SimulatedSubmission) -> None:
+        await asyncio.sleep(self.random.uniform(0, 0.5))
+        if submission.outcome is None:
+            judge.send({'name': 'terminate-submission', 'submission-id': submission.id})
+
+    def _finish(self, judge: SimulatedJudge, submission: SimulatedSubmission, outcome: str) -> None:
+        if submission.outcome is not None:
+            return
+        submission.outcome = outcome
+        judge.grading.pop(submission.id, None)
+        self.finished += 1
+        if self.finished >= self.count:
+            self._done.set()
+        self._changed.set()
+
+    async def _handle_judge(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        judge = SimulatedJudge(reader, writer)
+        try:
+            handshake = await judge.read()
+            if handshake['name'] != 'handshake' or (self.key is not None and handshake['key'] != self.key):
+                log.warning('Rejecting judge: %s', handshake.get('id'))
+                judge.send({'name': 'handshake-failure'})
+                return
+
+            judge.name = handshake['id']
+            judge.slots = handshake.get('slots', 1)
+            judge.problems = {problem for problem, _ in handshake.get('problems') or []}
+            judge.executors = set(handshake['executors'])
+            response: Dict[str, Any] = {'name': 'handshake-success', 'journal': []}
+            if handshake.get('protocol', PacketManager.LEGACY_PROTOCOL) >= PacketManager.STREAMING_PROTOCOL:
+                response['protocol'] = PacketManager.STREAMING_PROTOCOL
+            judge.send(response)
+            if 'protocol' in response:
+                judge.compressor = zlib.compressobj()
+                judge.decompressor = zlib.decompressobj()
+
+            log.info('Judge connected: %s (%d slots, %d problems)', judge.name, judge.slots, len(judge.problems))
+            self.judges.append(judge)
+            self._changed.set()
+            while True:
+                self._receive_packet(judge, await judge.read())
+        except (OSError, asyncio.IncompleteReadError, ValueError, KeyError):
+            pass
+        finally:
+            writer.close()
+            if judge in self.judges:
+                log.warning('Judge disconnected: %s', judge.name)
+                self.judges.remove(judge)
+                # The simulator doesn't resume submissions across reconnects, so whatever was grading is lost.
+                for submission in list(judge.grading.values()):
+                    self._finish(judge, submission, 'lost')
+
+    def _receive_packet(self, judge: SimulatedJudge, packet: dict) -> None:
+        name = packet['name']
+        if name == 'ping-response':
+            self.ping_times.append(time.time() - packet['when'])
+            return
+        elif name == 'supported-problems':
+            judge.problems = {problem for problem, _ in packet['problems']}
+            self._changed.set()
+            return
+        elif name == 'supported-problems-delta':
+            judge.problems.update(problem for problem, _ in packet['added'])
+            judge.problems.difference_update(packet['removed'])
+            self._changed.set()
+            return
+        elif name == 'current-submission-id':
+            return
+
+        id = packet.get('submission-id')
+        submission = self.submissions.get(id) if id is not None else None
+        if submission is None:
+            log.error('Unexpected packet from %s: %s', judge.name, packet)
+            return
+
+        if name == 'submission-acknowledged':
+            submission.mark(2)
+        elif name == 'grading-begin':
+            submission.mark(3)
+            if submission.abort:
+                self.loop.create_task(self._abort_later(judge, submission))
+        elif name == 'compile-error':
+            submission.mark(4)
+            submission.mark(5)
+            self._finish(judge, submission, 'compile-error')
+        elif name == 'test-case-status':
+            submission.mark(4)
+        elif name == 'grading-end':
+            submission.mark(5)
+            self._finish(judge, submission, 'graded')
+        elif name == 'internal-error':
+            self._finish(judge, submission, 'internal-error')
+        elif name == 'submission-terminated':
+            self._finish(judge, submission, 'aborted')
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Returns throughput, and latency percentiles in milliseconds per stage, over submissions that finished.
+        """
+        elapsed = max(self.end_time - self.start_time, 1e-9)
+        outcomes: Dict[str, int] = {}
+        for submission in self.submissions.values():
+            outcome = submission.outcome or 'unfinished'
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+        completed = [
+            submission
+            for submission in self.submissions.values()
+            if submission.outcome in ('graded', 'compile-error') and len(submission.times) == len(STAGES) + 1
+        ]
+        latencies = {
+            stage: sorted(1000 * (submission.times[i + 1] - submission.times[i]) for submission in completed)
+            for i, stage in enumerate(STAGES)
+        }
+        latencies['grading'] = sorted(1000 * (submission.times[5] - submission.times[2]) for submission in completed)
+        latencies['ping'] = sorted(1000 * value for value in self.ping_times)
+
+        return {
+            'elapsed': elapsed,
+            'submissions': len(self.submissions),
+            'completed': len(completed),
+            'outcomes': outcomes,
+            'throughput': len(completed) / elapsed,
+            'latency': {
+                stage: {
+                    'count': len(values),
+                    'p50': percentile(values, 0.5),
+                    'p90': percentile(values, 0.9),
+                    'p99': percentile(values, 0.99),
+                    'max': values[-1] if values else 0.0,
+                }
+                for stage, values in latencies.items()
+            },
+        }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        'Graded %d submissions in %.1fs: %.2f submissions/s'
+        % (report['completed'], report['elapsed'], report['throughput']),
+        'Outcomes: ' + ', '.join('%s: %d' % item for item in sorted(report['outcomes'].items())),
+        '',
+        '%-12s %8s %10s %10s %10s %10s' % ('stage (ms)', 'count', 'p50', 'p90', 'p99', 'max'),
+    ]
+    for stage, stats in report['latency'].items():
+        lines.append(
+            '%-12s %8d %10.1f %10.1f %10.1f %10.1f'
+            % (stage, stats['count'], stats['p50'], stats['p90'], stats['p99'], stats['max'])
+        )
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Stands in for the site, and measures the throughput of the judges that connect to it.'
+    )
+    parser.add_argument('tests_dir', help='directory of submissions to replay, laid out like the testsuite')
+    parser.add_argument('problem_regex', nargs='?', help='when specified, only matched problems are submitted')
+    parser.add_argument('-b', '--bind', default='127.0.0.1', help='address to listen for judges on')
+    parser.add_argument('-p', '--port', type=int, default=9999, help='port to listen for judges on')
+    parser.add_argument('-n', '--count', type=int, default=100, help='number of submissions to grade')
+    parser.add_argument(
+        '-r', '--rate', type=float, help='submissions per second, on average (default: whenever a slot is free)'
+    )
+    parser.add_argument('-j', '--judges', type=int, default=1, help='number of judges to wait for before starting')
+    parser.add_argument('-k', '--key', help='key judges must authenticate with (default: any)')
+    parser.add_argument('--abort-fraction', type=float, default=0.0, help='fraction of submissions to abort')
+    parser.add_argument('--ping-interval', type=float, default=10.0, help='seconds between pings to each judge')
+    parser.add_argument('--seed', type=int, help='random seed, for reproducible runs')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    parser.add_argument('-l', '--log-file', help='log file to use')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        filename=args.log_file, level=logging.INFO, format='%(levelname)s %(asctime)s %(module)s %(message)s'
+    )
+
+    corpus = load_corpus(args.tests_dir, args.problem_regex)
+    print('Loaded %d submissions from: %s' % (len(corpus), args.tests_dir))
+    simulator = SiteSimulator(
+        corpus,
+        args.count,
+        rate=args.rate,
+        judges=args.judges,
+        key=args.key,
+        abort_fraction=args.abort_fraction,
+        ping_interval=args.ping_interval,
+        seed=args.seed,
+    )
+    simulator.listen(args.bind, args.port)
+    report = simulator.run()
+    print(json.dumps(report, indent=4) if args.json else format_report(report))
+
+
+if __name__ == '__main__':
+    main()
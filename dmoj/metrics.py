@@ -0,0 +1,181 @@
+import bisect
+import threading
+from typing import Dict, List, Sequence, Tuple, TypeVar
+
+# Upper bounds, in seconds, of the buckets for histograms of durations.
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = ['%s="%s"' % (name, _escape(value)) for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{%s}' % ','.join(pairs) if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    type = ''
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError('%s takes labels %s, got %s' % (self.name, self.labels, tuple(labels)))
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self) -> List[str]:
+        return ['# HELP %s %s' % (self.name, self.help), '# TYPE %s %s' % (self.name, self.type)] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [
+                '%s%s %s' % (self.name, _format_labels(self.labels, key), _format_value(value))
+                for key, value in sorted(self._values.items())
+            ]
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(
+        self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DURATION_BUCKETS
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # Per label values: the count of observations in each bucket (not cumulative), and their sum.
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * len(self.buckets), [0.0]))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            counts, _ = self._values.get(self._key(labels), ([0], [0.0]))
+            return sum(counts)
+
+    def _samples(self) -> List[str]:
+        samples = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    labels = _format_labels(self.labels, key, 'le="%s"' % _format_value(bound))
+                    samples.append('%s_bucket%s %d' % (self.name, labels, cumulative))
+                labels = _format_labels(self.labels, key)
+                samples.append('%s_sum%s %s' % (self.name, labels, _format_value(total[0])))
+                samples.append('%s_count%s %d' % (self.name, labels, cumulative))
+        return samples
+
+
+M = TypeVar('M', bound=Metric)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: M) -> M:
+        if metric.name in self._metrics:
+            raise ValueError('metric already registered: %s' % metric.name)
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+submissions = REGISTRY.register(Counter('dmoj_submissions_total', 'Submissions graded, by outcome.', ['outcome']))
+compile_seconds = REGISTRY.register(Histogram('dmoj_compile_seconds', 'Time spent compiling submissions.'))
+case_execution_seconds = REGISTRY.register(
+    Histogram('dmoj_case_execution_seconds', 'CPU time used by submissions on each test case.')
+)
+case_wall_seconds = REGISTRY.register(
+    Histogram('dmoj_case_wall_seconds', 'Wall time taken by submissions on each test case.')
+)
+checker_seconds = REGISTRY.register(Histogram('dmoj_checker_seconds', 'Time spent checking each test case.'))
+sandbox_spawn_seconds = REGISTRY.register(
+    Histogram('dmoj_sandbox_spawn_seconds', 'Time spent launching sandboxed processes for each test case.')
+)
+binary_cache = REGISTRY.register(
+    Counter('dmoj_compiled_binary_cache_total', 'Lookups in the compiled binary cache, by result.', ['result'])
+)
+syscall_traps = REGISTRY.register(
+    Counter(
+        'dmoj_sandbox_syscall_traps_total',
+        'Syscalls made by sandboxed processes that trapped into the tracer, by language and syscall.',
+        ['language', 'syscall'],
+    )
+)
+syscall_trap_seconds = REGISTRY.register(
+    Counter(
+        'dmoj_sandbox_syscall_trap_seconds_total',
+        'Time the tracer spent handling trapped syscalls, by language and syscall.',
+        ['language', 'syscall'],
+    )
+)
+worker_restarts = REGISTRY.register(
+    Counter('dmoj_worker_restarts_total', 'Worker processes replaced, by reason.', ['reason'])
+)
+packet_queue_packets = REGISTRY.register(Gauge('dmoj_packet_queue_packets', 'Packets waiting to be sent to the site.'))
+packet_queue_bytes = REGISTRY.register(Gauge('dmoj_packet_queue_bytes', 'Bytes waiting to be sent to the site.'))
+grading_slots_busy = REGISTRY.register(Gauge('dmoj_grading_slots_busy', 'Submissions currently being graded.'))
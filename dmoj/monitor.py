@@ -1,10 +1,14 @@
 import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import closing
-from threading import Event, Thread
+from threading import Event, Lock, Thread
+from typing import Optional, Set
 from urllib.request import urlopen
 
 from dmoj import judgeenv
-from dmoj.judgeenv import get_problem_watches, startup_warnings
+from dmoj.judgeenv import get_problem_index, get_problem_watches, startup_warnings
 from dmoj.utils.ansi import print_ansi
 
 try:
@@ -13,14 +17,21 @@ try:
 except ImportError:
     startup_warnings.append('watchdog module not found, install it to automatically update problems')
     Observer = None
+    FileSystemEventHandler = object  # type: ignore
 
 logger = logging.getLogger(__name__)
 
+# Editor swap, backup and lock files (vim, emacs and the like), which come and go without the problem changing.
+IGNORED_FILE = re.compile(r'^(?:\.#.*|#.*#|.*~|.*\.sw[a-p]|4913|\.DS_Store)$')
+# Directories inside problems whose contents don't affect the problem, e.g. testsuite tests for it.
+IGNORED_DIRECTORIES = frozenset(['tests'])
+
 
 class RefreshWorker(Thread):
-    def __init__(self, urls):
+    def __init__(self, urls, timeout):
         super().__init__()
         self.urls = urls
+        self.timeout = timeout
         self.daemon = True
         self._trigger = Event()
         self._terminate = False
@@ -32,32 +43,104 @@ class RefreshWorker(Thread):
         self._terminate = True
         self._trigger.set()
 
+    def ping(self, url):
+        logger.info('Pinging for problem update: %s', url)
+        try:
+            with closing(urlopen(url, data=b'', timeout=self.timeout)) as f:
+                f.read()
+        except Exception:
+            logger.exception('Failed to ping for problem update: %s', url)
+
     def run(self):
-        while True:
-            self._trigger.wait()
-            self._trigger.clear()
-            if self._terminate:
-                break
+        # Ping every judge at once, so that a slow or unreachable one can't hold up the rest.
+        with ThreadPoolExecutor(max_workers=len(self.urls)) as executor:
+            while True:
+                self._trigger.wait()
+                self._trigger.clear()
+                if self._terminate:
+                    break
 
-            for url in self.urls:
-                logger.info('Pinging for problem update: %s', url)
-                try:
-                    with closing(urlopen(url, data='')) as f:
-                        f.read()
-                except Exception:
-                    logger.exception('Failed to ping for problem update: %s', url)
+                for _ in executor.map(self.ping, self.urls):
+                    pass
 
 
 class SendProblemsHandler(FileSystemEventHandler):
-    def __init__(self, refresher=None):
+    """
+    Collects the problems changed by filesystem events, and reports them all at once after no events have arrived for
+    `quiet_window` seconds, so that e.g. uploading an archive results in a single update.
+    """
+
+    def __init__(self, refresher=None, quiet_window=1.0):
         self.refresher = refresher
         self.callback = None
+        self.quiet_window = quiet_window
+        # Ids of changed problems, or None if changes can't be attributed to specific problems.
+        self._dirty: Optional[Set[str]] = set()
+        self._lock = Lock()
+        self._trigger = Event()
+        self._terminate = False
+        self._thread = Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._terminate = True
+        self._trigger.set()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
 
     def on_any_event(self, event):
-        if self.callback is not None:
-            self.callback()
-        if self.refresher is not None:
-            self.refresher.refresh()
+        paths = [event.src_path]
+        if getattr(event, 'dest_path', None):
+            paths.append(event.dest_path)
+
+        relevant = False
+        with self._lock:
+            for path in paths:
+                relevant |= self._mark_dirty(path)
+        if relevant:
+            self._trigger.set()
+
+    def _mark_dirty(self, path):
+        if IGNORED_FILE.match(os.path.basename(path)):
+            return False
+
+        location = get_problem_index().locate(path)
+        if location is None:
+            self._dirty = None
+            return True
+
+        problem_id, relative = location
+        if IGNORED_DIRECTORIES.intersection(relative.split(os.sep)):
+            return False
+        if self._dirty is not None:
+            self._dirty.add(problem_id)
+        return True
+
+    def _run(self):
+        while True:
+            self._trigger.wait()
+            # Keep waiting until a whole window passes without events.
+            while not self._terminate:
+                self._trigger.clear()
+                if not self._trigger.wait(self.quiet_window):
+                    break
+            if self._terminate:
+                return
+
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+            logger.info('Problems changed: %s', 'all' if dirty is None else ', '.join(sorted(dirty)))
+
+            if self.callback is not None:
+                try:
+                    self.callback(dirty)
+                except Exception:
+                    logger.exception('Failed to report problem changes.')
+            if self.refresher is not None:
+                self.refresher.refresh()
 
 
 class Monitor:
@@ -65,11 +148,11 @@ class Monitor:
         if Observer is not None and not judgeenv.no_watchdog:
             if judgeenv.env.update_pings:
                 logger.info('Using thread to ping urls: %r', judgeenv.env.update_pings)
-                self._refresher = RefreshWorker(judgeenv.env.update_pings)
+                self._refresher = RefreshWorker(judgeenv.env.update_pings, judgeenv.env.update_ping_timeout)
             else:
                 self._refresher = None
 
-            self._handler = SendProblemsHandler(self._refresher)
+            self._handler = SendProblemsHandler(self._refresher, judgeenv.env.problem_watch_quiet_window)
             self._monitor = Observer()
             for dir in get_problem_watches():
                 self._monitor.schedule(self._handler, dir, recursive=True)
@@ -93,6 +176,7 @@ class Monitor:
 
     def start(self):
         if self._monitor is not None:
+            self._handler.start()
             try:
                 self._monitor.start()
             except OSError:
@@ -104,6 +188,7 @@ class Monitor:
     def join(self):
         if self._monitor is not None:
             self._monitor.join()
+            self._handler.join()
         if self._refresher is not None:
             self._refresher.join()
 
@@ -113,6 +198,8 @@ class Monitor:
         if self._monitor is not None:
             self._monitor.stop()
             self._monitor.join(1)
+            self._handler.stop()
+            self._handler.join(1)
 
     def __enter__(self):
         self.start()
@@ -1,19 +1,18 @@
-import errno
+import asyncio
 import json
 import logging
-import os
 import socket
 import ssl
 import struct
-import sys
 import threading
 import time
-import traceback
 import zlib
-from typing import List, Optional, TYPE_CHECKING, Tuple
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, TYPE_CHECKING, Tuple
 
 from dmoj import sysinfo
-from dmoj.judgeenv import get_runtime_versions, get_supported_problems
+from dmoj.judgeenv import ProblemIndexDelta, env, get_problem_index, get_runtime_versions, get_supported_problems
 from dmoj.result import Result
 from dmoj.utils.unicode import utf8bytes, utf8text
 
@@ -27,9 +26,160 @@ class JudgeAuthenticationFailed(Exception):
     pass
 
 
+class OutboundQueue:
+    """
+    Encoded packets waiting to be sent to the site, in order. Packets are put by any thread, and taken by the network
+    thread once sent.
+
+    The queue is bounded by the total size of its packets. Threads wait for space before putting a packet into a full
+    queue, which is the only way the network can hold up grading; how often and for how long this happens is recorded.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        # Called whenever a packet is put.
+        self.on_put: Optional[Callable[[], None]] = None
+        self._packets: Deque[bytes] = deque()
+        self._size = 0
+        self._not_full = threading.Condition()
+        self._closed = False
+
+        self.peak_bytes = 0
+        self.blocked_count = 0
+        self.blocked_seconds = 0.0
+
+    def wait_for_space(self, size: int) -> None:
+        """
+        Blocks until a packet of `size` bytes fits in the queue.
+        """
+        with self._not_full:
+            if self._is_full(size):
+                self.blocked_count += 1
+                start = time.monotonic()
+                while self._is_full(size):
+                    self._not_full.wait()
+                self.blocked_seconds += time.monotonic() - start
+
+    def put(self, data: bytes) -> None:
+        with self._not_full:
+            self._packets.append(data)
+            self._size += len(data)
+            self.peak_bytes = max(self.peak_bytes, self._size)
+
+        if self.on_put is not None:
+            self.on_put()
+
+    def _is_full(self, incoming: int) -> bool:
+        # Always accept a packet into an empty queue, however large.
+        return not self._closed and self._size > 0 and self._size + incoming > self.max_bytes
+
+    def close(self) -> None:
+        """
+        Stops blocking threads putting packets, since nothing will drain the queue anymore.
+        """
+        with self._not_full:
+            self._closed = True
+            self._not_full.notify_all()
+
+    def peek(self) -> List[bytes]:
+        """
+        Returns every queued packet, leaving them queued.
+        """
+        with self._not_full:
+            return list(self._packets)
+
+    def pop(self, count: int) -> None:
+        """
+        Removes the first `count` packets, once they have been sent.
+        """
+        with self._not_full:
+            for _ in range(count):
+                self._size -= len(self._packets.popleft())
+            self._not_full.notify_all()
+
+    def clear(self) -> None:
+        with self._not_full:
+            self._packets.clear()
+            self._size = 0
+            self._not_full.notify_all()
+
+    def __len__(self) -> int:
+        return len(self._packets)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+
+class SubmissionJournal:
+    """
+    Every packet sent about a submission, so that whatever the site missed can be replayed after a reconnect.
+    """
+
+    def __init__(self) -> None:
+        self.packets: List[bytes] = []
+        self.finished = False
+
+
+class TestCaseBatch:
+    """
+    Test case results for a submission, waiting to be sent together in one packet.
+    """
+
+    def __init__(self) -> None:
+        self.cases: List[Tuple[int, Result]] = []
+        # Rough size of the results once encoded, dominated by their output and feedback.
+        self.size = 0
+        self.queued_at = time.monotonic()
+
+
 class PacketManager:
     SIZE_PACK = struct.Struct('!I')
 
+    # Packets are zlib-compressed JSON, prefixed with their length. Under the legacy protocol, each packet is compressed
+    # on its own. Under the streaming protocol, each direction of a connection is instead a single zlib stream, which
+    # every packet is sync flushed into, so that small packets share the compressor's history and setup. The handshake
+    # always uses the legacy protocol; the judge offers its newest protocol, and the site picks the one to use from then
+    # on in its response.
+    LEGACY_PROTOCOL = 1
+    STREAMING_PROTOCOL = 2
+    PROTOCOL_VERSION = STREAMING_PROTOCOL
+
+    # Packets about a submission are journaled until it is finished, and the site has acknowledged receiving all of
+    # them. Each handshake carries `journal`, a list of [submission id, number of packets sent] for every journaled
+    # submission. A site able to resume them replies with its own `journal` list of [submission id, number of packets
+    # received], and the rest are sent again; submissions it leaves out are abandoned, and no longer graded. A site
+    # which doesn't reply with a `journal` is assumed to have abandoned every submission.
+    JOURNALED_PACKETS = frozenset(
+        [
+            'submission-acknowledged',
+            'grading-begin',
+            'compile-message',
+            'test-case-status',
+            'batch-begin',
+            'batch-end',
+            'compile-error',
+            'internal-error',
+            'grading-end',
+            'submission-terminated',
+        ]
+    )
+    FINAL_PACKETS = frozenset(['compile-error', 'internal-error', 'grading-end', 'submission-terminated'])
+    # Journals of finished submissions are dropped beyond this many, oldest first, even if not yet acknowledged.
+    MAX_FINISHED_JOURNALS = 32
+
+    # Test case results arriving in quick succession are batched, and a batch is sent once it holds this many results
+    # or bytes, or its first result has waited this many seconds. A result arriving after the queue has been idle for
+    # TESTCASE_IDLE_FLUSH seconds is sent immediately, so that slow test cases are reported without delay.
+    TESTCASE_BATCH_MAX_CASES = 64
+    TESTCASE_BATCH_MAX_BYTES = 65536
+    TESTCASE_BATCH_MAX_DELAY = 0.25
+    TESTCASE_IDLE_FLUSH = 0.1
+
+    # Seconds to wait for the site before giving up on a connection.
+    CONNECT_TIMEOUT = 5
+    READ_TIMEOUT = 300
+
     ssl_context: Optional[ssl.SSLContext]
     judge: 'Judge'
 
@@ -43,12 +193,14 @@ class PacketManager:
         secure: bool = False,
         no_cert_check: bool = False,
         cert_store: Optional[str] = None,
+        slots: int = 1,
     ):
         self.host = host
         self.port = port
         self.judge = judge
         self.name = name
         self.key = key
+        self.slots = slots
         self._closed = False
 
         log.info('Preparing to connect to [%s]:%s as: %s', host, port, name)
@@ -74,178 +226,406 @@ class PacketManager:
         self.no_cert_check = no_cert_check
         self.cert_store = cert_store
 
-        self._lock = threading.RLock()
-        self._batch = 0
+        # Whether the site remembers our problem list by digest, so that the list can be left out of handshakes and
+        # changes to it sent as deltas.
+        self._site_problem_digests = False
+        self._compressor: Optional['zlib._Compress'] = None
+        self._decompressor: Optional['zlib._Decompress'] = None
+        # Batch counters, per submission currently being graded.
+        self._batches: Dict[int, int] = defaultdict(int)
         self._testcase_queue_lock = threading.Lock()
-        self._testcase_queue: List[Tuple[int, Result]] = []
+        self._testcase_queue: Dict[int, TestCaseBatch] = {}
+        self._testcase_last_queued = 0.0
+        self.testcase_batches = 0
+        self.testcase_cases_sent = 0
+        self.testcase_max_batch = 0
+        self.testcase_flush_seconds = 0.0
+        self.testcase_max_flush_seconds = 0.0
+
+        # All network I/O happens on an event loop, run by whichever thread calls `run`; packets are handed to it
+        # through `_outbound`, so that threads sending packets never wait on the network.
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread: Optional[int] = None
+        self._outbound = OutboundQueue(env.outbound_queue_max_bytes)
+        self._outbound.on_put = self._wake_sender
+        # Incremented whenever the queue is refilled from the journals, which invalidates packets taken from it before.
+        self._outbound_generation = 0
+        self._journals: Dict[int, SubmissionJournal] = OrderedDict()
+        # Held while journaling and queueing a packet, so that both happen in the same order.
+        self._journal_lock = threading.Lock()
+        # Received packets are handled in order, off the event loop, since handling may block.
+        self._handler = ThreadPoolExecutor(max_workers=1)
+        # Submissions are started in order on a thread of their own, as starting one waits for a free grading slot,
+        # which mustn't hold up pings, or the very abort that would free a slot.
+        self._submission_handler = ThreadPoolExecutor(max_workers=1)
+        # Submissions accepted but not yet started, which an abort request takes out of line.
+        self._pending_submissions: Set[int] = set()
+        self._pending_lock = threading.Lock()
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        # Created on the event loop, as asyncio primitives from before Python 3.10 bind to the loop current on creation.
+        self._outbound_ready: Optional[asyncio.Event] = None
+        self._connected: Optional[asyncio.Event] = None
+        self._closing: Optional[asyncio.Event] = None
+        self.packets_sent = 0
+        self.bytes_sent = 0
 
         # Exponential backoff: starting at 4 seconds.
         # Certainly hope it won't stack overflow, since it will take days if not years.
         self.fallback = 4
 
-        self.conn = None
-        self._do_reconnect()
-
-    def _connect(self):
-        problems = get_supported_problems()
-        versions = get_runtime_versions()
+        self._run_loop(self._do_reconnect())
 
-        log.info('Opening connection to: [%s]:%s', self.host, self.port)
+    def _run_loop(self, coroutine):
+        self._loop_thread = threading.get_ident()
+        try:
+            return self._loop.run_until_complete(coroutine)
+        finally:
+            self._loop_thread = None
+
+    def _wake_sender(self):
+        if self._outbound_ready is None or self._loop.is_closed():
+            return
+        if threading.get_ident() == self._loop_thread:
+            self._outbound_ready.set()
+        else:
+            self._loop.call_soon_threadsafe(self._outbound_ready.set)
 
-        while True:
-            try:
-                self.conn = socket.create_connection((self.host, self.port), timeout=5)
-            except OSError as e:
-                if e.errno != errno.EINTR:
-                    raise
-            else:
-                break
+    async def _connect(self):
+        if self._outbound_ready is None:
+            self._outbound_ready = asyncio.Event()
+            self._connected = asyncio.Event()
+            self._closing = asyncio.Event()
 
-        self.conn.settimeout(300)
-        self.conn.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        problems, problems_digest = get_problem_index().snapshot()
+        versions = get_runtime_versions()
 
+        log.info('Opening connection to: [%s]:%s', self.host, self.port)
         if self.ssl_context:
             log.info('Starting TLS on: [%s]:%s', self.host, self.port)
-            self.conn = self.ssl_context.wrap_socket(self.conn, server_hostname=self.host)
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                self.host,
+                self.port,
+                ssl=self.ssl_context,
+                server_hostname=self.host if self.ssl_context else None,
+                limit=2 ** 26,
+            ),
+            PacketManager.CONNECT_TIMEOUT,
+        )
+        self._writer.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
 
         log.info('Starting handshake with: [%s]:%s', self.host, self.port)
-        self.input = self.conn.makefile('rb')
-        self.output = self.conn.makefile('wb', 0)
-        self.handshake(problems, versions, self.name, self.key)
+        await self.handshake(problems, versions, self.name, self.key, problems_digest)
         log.info('Judge "%s" online: [%s]:%s', self.name, self.host, self.port)
+        self._connected.set()
 
-    def _reconnect(self):
+    async def _reconnect(self):
         if self.fallback > 86400:
             # Return 0 to avoid supervisor restart.
             raise SystemExit(0)
 
         log.warning('Attempting reconnection in %.0fs: [%s]:%s', self.fallback, self.host, self.port)
 
-        if self.conn is not None:
+        self._connected.clear()
+        if self._writer is not None:
             log.info('Dropping old connection.')
-            self.conn.close()
-        time.sleep(self.fallback)
+            self._writer.close()
+        try:
+            # Closing the connection cuts the wait short.
+            await asyncio.wait_for(self._closing.wait(), self.fallback)
+        except asyncio.TimeoutError:
+            pass
         self.fallback *= 1.5
-        self._do_reconnect()
+        if not self._closed:
+            await self._do_reconnect()
 
-    def _do_reconnect(self):
+    async def _do_reconnect(self):
         try:
-            self._connect()
+            await self._connect()
         except JudgeAuthenticationFailed:
             log.error('Authentication as "%s" failed on: [%s]:%s', self.name, self.host, self.port)
-            self._reconnect()
-        except socket.error:
+            await self._reconnect()
+        except (OSError, asyncio.TimeoutError):
             log.exception('Connection failed due to socket error: [%s]:%s', self.host, self.port)
-            self._reconnect()
+            await self._reconnect()
 
     def __del__(self):
         self.close()
 
     def close(self):
-        if self.conn and not self._closed:
+        """
+        Closes the connection to the site, which stops `run`. Safe to call from any thread.
+        """
+        was_closed, self._closed = self._closed, True
+        if self._writer is not None and not was_closed:
             try:
-                # May already be closed despite self._closed == False if a network error occurred and `close` is being
-                # called as part of cleanup.
-                self.conn.shutdown(socket.SHUT_RDWR)
-            except socket.error:
+                # Shutting the socket down wakes the event loop, wherever this is called from, which must then see that
+                # the connection was closed rather than lost.
+                self._writer.get_extra_info('socket').shutdown(socket.SHUT_RDWR)
+            except (OSError, AttributeError):
                 pass
-        self._closed = True
+        if self._closing is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._closing.set)
+        self._outbound.close()
 
-    def _read_forever(self):
-        try:
-            while True:
-                self._receive_packet(self._read_single())
-        except KeyboardInterrupt:
-            pass
-        except Exception:  # connection reset by peer
-            log.exception('Exception while reading packet from site, will not attempt to reconnect! Quitting judge.')
-            # TODO(tbrindus): this is really sad. This isn't equivalent to `raise SystemExit(1)` since we're not on the
-            # main thread, and doing the latter would only exit the network thread. We should fix mid-grading reconnects
-            # so that we don't need this sledgehammer approach that relies on Docker restarting the judge for us.
-            os._exit(1)
-
-    def _read_single(self) -> dict:
-        try:
-            data = self.input.read(PacketManager.SIZE_PACK.size)
-        except socket.error:
-            self._reconnect()
-            return self._read_single()
-        if not data:
-            self._reconnect()
-            return self._read_single()
-        size = PacketManager.SIZE_PACK.unpack(data)[0]
-        try:
-            packet = zlib.decompress(self.input.read(size))
-        except zlib.error:
-            self._reconnect()
-            return self._read_single()
-        else:
-            return json.loads(utf8text(packet))
+    async def _read_forever(self):
+        while True:
+            packet = await self._read_single()
+            if packet is None:
+                return
+            try:
+                await self._loop.run_in_executor(self._handler, self._receive_packet, packet)
+            except Exception:
+                log.exception('Failed to handle packet from site: %s', packet.get('name'))
+
+    async def _read_single(self) -> Optional[dict]:
+        """
+        Returns the next packet from the site, reconnecting as needed, or None once the connection is closed.
+        """
+        while True:
+            reader = self._reader
+            assert reader is not None
+            try:
+                data = await asyncio.wait_for(
+                    reader.readexactly(PacketManager.SIZE_PACK.size), PacketManager.READ_TIMEOUT
+                )
+                size = PacketManager.SIZE_PACK.unpack(data)[0]
+                packet = self._decompress(await asyncio.wait_for(reader.readexactly(size), PacketManager.READ_TIMEOUT))
+                return json.loads(utf8text(packet))
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, zlib.error, ValueError):
+                if self._closed:
+                    return None
+                await self._reconnect()
+
+    def _compress(self, data: bytes) -> bytes:
+        if self._compressor is None:
+            return zlib.compress(data)
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def _decompress(self, data: bytes) -> bytes:
+        if self._decompressor is None:
+            return zlib.decompress(data)
+        return self._decompressor.decompress(data)
+
+    async def _send_forever(self):
+        while True:
+            await self._outbound_ready.wait()
+            self._outbound_ready.clear()
+
+            while len(self._outbound):
+                await self._connected.wait()
+                generation = self._outbound_generation
+                packets = self._outbound.peek()
+                frames = []
+                for data in packets:
+                    # Under the streaming protocol, packets must be compressed in the order they are sent.
+                    raw = self._compress(data)
+                    frames += (PacketManager.SIZE_PACK.pack(len(raw)), raw)
+                    self.bytes_sent += PacketManager.SIZE_PACK.size + len(raw)
+                try:
+                    self._writer.writelines(frames)
+                    await self._writer.drain()
+                except Exception:  # connection reset by peer
+                    if self._closed:
+                        return
+                    log.exception('Exception while sending packet to site: [%s]:%s', self.host, self.port)
+                    # Closing the connection gets the reader to reconnect, after which the journals are replayed.
+                    self._connected.clear()
+                    self._writer.close()
+                    continue
+
+                # If we reconnected in the meantime, the packets were requeued from the journals if the site needs them.
+                if generation == self._outbound_generation:
+                    self._outbound.pop(len(packets))
+                self.packets_sent += len(packets)
 
     def run(self):
-        threading.Thread(target=self._periodically_flush_testcase_queue).start()
-        self._read_forever()
+        self._run_loop(self._run())
+        self._handler.shutdown(wait=False)
+        self._submission_handler.shutdown(wait=False)
+        self._loop.close()
+
+    async def _run(self):
+        tasks = [
+            self._loop.create_task(self._send_forever()),
+            self._loop.create_task(self._periodically_flush_testcase_queue()),
+        ]
+        # Catch up on anything queued before we got here.
+        self._outbound_ready.set()
+        try:
+            await self._read_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
 
     def disconnect(self):
         self.close()
         self.judge.abort_grading()
-        sys.exit(0)
 
-    def _flush_testcase_queue(self):
+    def transport_stats(self) -> Dict[str, Any]:
+        """
+        Returns statistics about packets sent to the site, and how much they have been held up by the network.
+        """
+        return {
+            'queued_packets': len(self._outbound),
+            'queued_bytes': self._outbound.size,
+            'peak_queued_bytes': self._outbound.peak_bytes,
+            'blocked_sends': self._outbound.blocked_count,
+            'blocked_seconds': self._outbound.blocked_seconds,
+            'packets_sent': self.packets_sent,
+            'bytes_sent': self.bytes_sent,
+            'testcase_batches': self.testcase_batches,
+            'testcase_cases_sent': self.testcase_cases_sent,
+            'testcase_max_batch': self.testcase_max_batch,
+            'testcase_flush_seconds': self.testcase_flush_seconds,
+            'testcase_max_flush_seconds': self.testcase_max_flush_seconds,
+        }
+
+    def _flush_testcase_queue(self, submission_id: Optional[int] = None):
+        """
+        Sends all queued test case results for `submission_id`, or for every submission if it is None.
+        """
+        # Sending may block until the network catches up, so it must happen without holding the lock, which the
+        # event loop needs to make progress.
         with self._testcase_queue_lock:
-            if not self._testcase_queue:
-                return
-
-            self._send_packet(
-                {
-                    'name': 'test-case-status',
-                    'submission-id': self.judge.current_submission.id,
-                    'cases': [
-                        {
-                            'position': position,
-                            'status': result.result_flag,
-                            'time': result.execution_time,
-                            'points': result.points,
-                            'total-points': result.total_points,
-                            'memory': result.max_memory,
-                            'output': result.output,
-                            'extended-feedback': result.extended_feedback,
-                            'feedback': result.feedback,
-                        }
-                        for position, result in self._testcase_queue
-                    ],
-                }
-            )
-
-            self._testcase_queue.clear()
+            batches = self._take_testcase_batches(submission_id)
+        for id, batch in batches:
+            self._send_test_case_status(id, batch.cases)
+
+    def _take_testcase_batches(
+        self, submission_id: Optional[int] = None, max_delay: Optional[float] = None
+    ) -> List[Tuple[int, TestCaseBatch]]:
+        """
+        Removes and returns the queued batches for `submission_id`, or for every submission if it is None. If
+        `max_delay` is given, only batches which have waited at least that many seconds are taken. The caller must
+        hold `_testcase_queue_lock`.
+        """
+        if submission_id is None:
+            submission_ids = list(self._testcase_queue.keys())
+        elif submission_id in self._testcase_queue:
+            submission_ids = [submission_id]
+        else:
+            return []
+
+        now = time.monotonic()
+        batches = []
+        for id in submission_ids:
+            batch = self._testcase_queue[id]
+            if max_delay is not None and now - batch.queued_at < max_delay:
+                continue
+            del self._testcase_queue[id]
+            batches.append((id, batch))
+
+            latency = now - batch.queued_at
+            self.testcase_batches += 1
+            self.testcase_cases_sent += len(batch.cases)
+            self.testcase_max_batch = max(self.testcase_max_batch, len(batch.cases))
+            self.testcase_flush_seconds += latency
+            self.testcase_max_flush_seconds = max(self.testcase_max_flush_seconds, latency)
+        return batches
+
+    def _send_test_case_status(self, submission_id: int, cases: List[Tuple[int, Result]]):
+        self._send_packet(
+            {
+                'name': 'test-case-status',
+                'submission-id': submission_id,
+                'cases': [
+                    {
+                        'position': position,
+                        'status': result.result_flag,
+                        'time': result.execution_time,
+                        'points': result.points,
+                        'total-points': result.total_points,
+                        'memory': result.max_memory,
+                        'output': result.output,
+                        'extended-feedback': result.extended_feedback,
+                        'feedback': result.feedback,
+                    }
+                    for position, result in cases
+                ],
+            }
+        )
 
-    def _periodically_flush_testcase_queue(self):
+    async def _periodically_flush_testcase_queue(self):
         while not self._closed:
+            # Batches that fill up are sent as they are queued, so only those that have waited too long are left.
+            await asyncio.sleep(PacketManager.TESTCASE_BATCH_MAX_DELAY / 5)
+            # The event loop must never wait on a grading thread, which may itself be waiting for the loop to drain
+            # the outbound queue; if the lock is taken, try again on the next tick.
+            if not self._testcase_queue_lock.acquire(blocking=False):
+                continue
             try:
-                time.sleep(0.25)
                 # It is okay if we flush the testcase queue even while the connection is not open or there's nothing
-                # grading, since the only thing that can queue testcases is a currently-grading submission.
-                self._flush_testcase_queue()
-            except KeyboardInterrupt:
-                break
+                # grading, since the only things that can queue testcases are currently-grading submissions.
+                # Sending never blocks on the event loop, so it happens under the lock: a grading thread flushing the
+                # same submission afterwards then can't send anything ahead of these results.
+                for id, batch in self._take_testcase_batches(max_delay=PacketManager.TESTCASE_BATCH_MAX_DELAY):
+                    self._send_test_case_status(id, batch.cases)
             except Exception:
-                traceback.print_exc()
+                log.exception('Failed to flush test case results.')
+            finally:
+                self._testcase_queue_lock.release()
 
-    def _send_packet(self, packet: dict):
+    @staticmethod
+    def _encode_packet(packet: dict) -> bytes:
         for k, v in packet.items():
             if isinstance(v, bytes):
                 # Make sure we don't have any garbage utf-8 from e.g. weird compilers
                 # *cough* fpc *cough* that could cause this routine to crash
                 # We cannot use utf8text because it may not be text.
                 packet[k] = v.decode('utf-8', 'replace')
+        return utf8bytes(json.dumps(packet))
 
-        raw = zlib.compress(utf8bytes(json.dumps(packet)))
-        with self._lock:
-            try:
-                self.output.writelines((PacketManager.SIZE_PACK.pack(len(raw)), raw))
-            except Exception:  # connection reset by peer
-                log.exception('Exception while sending packet to site, will not attempt to reconnect! Quitting judge.')
-                os._exit(1)
+    def _send_packet(self, packet: dict):
+        data = self._encode_packet(packet)
+        # The event loop can't wait for itself to drain the queue.
+        if threading.get_ident() != self._loop_thread:
+            self._outbound.wait_for_space(len(data))
+
+        with self._journal_lock:
+            if packet['name'] in PacketManager.JOURNALED_PACKETS:
+                self._journal(packet['submission-id'], data, packet['name'] in PacketManager.FINAL_PACKETS)
+            self._outbound.put(data)
+
+    def _journal(self, submission_id: int, data: bytes, final: bool):
+        journal = self._journals.get(submission_id)
+        if journal is None:
+            journal = self._journals[submission_id] = SubmissionJournal()
+        journal.packets.append(data)
+        if not final:
+            return
+
+        journal.finished = True
+        finished = [id for id, journal in self._journals.items() if journal.finished]
+        for id in finished[: -PacketManager.MAX_FINISHED_JOURNALS]:
+            del self._journals[id]
+
+    def _resume_submissions(self, received: Dict[int, int]):
+        """
+        Replaces everything queued with the journaled packets that the site hasn't received, given how many it has
+        received per submission, and aborts the submissions the site doesn't want resumed.
+        """
+        abandoned = []
+        with self._journal_lock:
+            self._outbound_generation += 1
+            self._outbound.clear()
+            for submission_id, journal in list(self._journals.items()):
+                count = received.get(submission_id)
+                if count is None:
+                    del self._journals[submission_id]
+                    if not journal.finished:
+                        abandoned.append(submission_id)
+                    continue
+
+                for data in journal.packets[count:]:
+                    self._outbound.put(data)
+                if journal.finished and count >= len(journal.packets):
+                    del self._journals[submission_id]
+
+        for submission_id in abandoned:
+            log.warning('Site abandoned submission %d, aborting it.', submission_id)
+            self._loop.run_in_executor(None, self.judge.abort_grading, submission_id)
 
     def _receive_packet(self, packet: dict):
         name = packet['name']
@@ -255,8 +635,43 @@ class PacketManager:
             self.current_submission_packet()
         elif name == 'submission-request':
             self.submission_acknowledged_packet(packet['submission-id'])
-            from dmoj.judge import Submission
+            self._batches[packet['submission-id']] = 0
+            with self._pending_lock:
+                self._pending_submissions.add(packet['submission-id'])
+            self._submission_handler.submit(self._begin_grading, packet)
+        elif name == 'terminate-submission':
+            # Sites unaware of grading slots will not send a submission ID, in which case we abort everything.
+            submission_id = packet.get('submission-id')
+            with self._pending_lock:
+                if submission_id is None:
+                    cancelled = list(self._pending_submissions)
+                    self._pending_submissions.clear()
+                elif submission_id in self._pending_submissions:
+                    cancelled = [submission_id]
+                    self._pending_submissions.remove(submission_id)
+                else:
+                    cancelled = []
+            for id in cancelled:
+                log.info('Aborted submission before it started grading: %d', id)
+                self.submission_aborted_packet(id)
+            if submission_id is None or not cancelled:
+                self.judge.abort_grading(submission_id)
+        elif name == 'disconnect':
+            log.info('Received disconnect request, shutting down...')
+            self.disconnect()
+        else:
+            log.error('Unknown packet %s, payload %s', name, packet)
+
+    def _begin_grading(self, packet: dict):
+        from dmoj.judge import Submission
+
+        with self._pending_lock:
+            if packet['submission-id'] not in self._pending_submissions:
+                # Aborted while waiting its turn.
+                return
+            self._pending_submissions.remove(packet['submission-id'])
 
+        try:
             self.judge.begin_grading(
                 Submission(
                     id=packet['submission-id'],
@@ -269,29 +684,48 @@ class PacketManager:
                     meta=packet['meta'],
                 )
             )
-            self._batch = 0
-            log.info(
-                'Accept submission: %d: executor: %s, code: %s',
-                packet['submission-id'],
-                packet['language'],
-                packet['problem-id'],
-            )
-        elif name == 'terminate-submission':
-            self.judge.abort_grading()
-        elif name == 'disconnect':
-            log.info('Received disconnect request, shutting down...')
-            self.disconnect()
-        else:
-            log.error('Unknown packet %s, payload %s', name, packet)
+        except Exception:
+            log.exception('Failed to begin grading submission: %d', packet['submission-id'])
+            return
+        log.info(
+            'Accept submission: %d: executor: %s, code: %s',
+            packet['submission-id'],
+            packet['language'],
+            packet['problem-id'],
+        )
+
+    async def handshake(self, problems: List[Tuple[str, float]], runtimes, id: str, key: str, problems_digest: str):
+        packet = {
+            'name': 'handshake',
+            'problems': problems,
+            'problems-digest': problems_digest,
+            'executors': runtimes,
+            'id': id,
+            'key': key,
+            'slots': self.slots,
+            'protocol': PacketManager.PROTOCOL_VERSION,
+        }
+        with self._journal_lock:
+            packet['journal'] = [[id, len(journal.packets)] for id, journal in self._journals.items()]
+        if self._site_problem_digests:
+            # The site can tell whether its copy of our problem list is current from the digest alone.
+            del packet['problems']
+        # Until the site says otherwise, assume it's one that needs the full list, and only speaks the legacy protocol.
+        self._site_problem_digests = False
+        self._compressor = self._decompressor = None
+
+        reader, writer = self._reader, self._writer
+        assert reader is not None and writer is not None
+        raw = zlib.compress(self._encode_packet(packet))
+        writer.writelines((PacketManager.SIZE_PACK.pack(len(raw)), raw))
+        await writer.drain()
 
-    def handshake(self, problems: str, runtimes, id: str, key: str):
-        self._send_packet({'name': 'handshake', 'problems': problems, 'executors': runtimes, 'id': id, 'key': key})
         log.info('Awaiting handshake response: [%s]:%s', self.host, self.port)
         try:
-            data = self.input.read(PacketManager.SIZE_PACK.size)
+            data = await asyncio.wait_for(reader.readexactly(PacketManager.SIZE_PACK.size), PacketManager.READ_TIMEOUT)
             size = PacketManager.SIZE_PACK.unpack(data)[0]
-            packet = utf8text(zlib.decompress(self.input.read(size)))
-            resp = json.loads(packet)
+            data = await asyncio.wait_for(reader.readexactly(size), PacketManager.READ_TIMEOUT)
+            resp = json.loads(utf8text(zlib.decompress(data)))
         except Exception:
             log.exception('Cannot understand handshake response: [%s]:%s', self.host, self.port)
             raise JudgeAuthenticationFailed()
@@ -300,14 +734,47 @@ class PacketManager:
                 log.error('Handshake failed.')
                 raise JudgeAuthenticationFailed()
 
-    def supported_problems_packet(self, problems: List[Tuple[str, int]]):
+        if resp.get('protocol', PacketManager.LEGACY_PROTOCOL) == PacketManager.STREAMING_PROTOCOL:
+            self._compressor = zlib.compressobj()
+            self._decompressor = zlib.decompressobj()
+            log.info('Using streaming compression: [%s]:%s', self.host, self.port)
+
+        resumed = {int(id): count for id, count in resp.get('journal') or []}
+        if resumed:
+            log.info('Resuming submissions: %s', ', '.join(map(str, sorted(resumed))))
+        self._resume_submissions(resumed)
+
+        self._site_problem_digests = 'problems-digest' in resp
+        if 'problems' not in packet and resp.get('problems-digest') != problems_digest:
+            log.info('Site has a stale problem list, sending ours.')
+            self.supported_problems_packet(problems)
+
+    def supported_problems_packet(self, problems: List[Tuple[str, float]]):
         log.debug('Update problems')
         self._send_packet({'name': 'supported-problems', 'problems': problems})
 
-    def test_case_status_packet(self, position: int, result: Result):
+    def supported_problems_delta_packet(self, delta: ProblemIndexDelta):
+        if not self._site_problem_digests:
+            self.supported_problems_packet(get_supported_problems())
+            return
+
+        log.debug(
+            'Update problems: %d added, %d changed, %d removed', len(delta.added), len(delta.changed), len(delta.removed)
+        )
+        self._send_packet(
+            {
+                'name': 'supported-problems-delta',
+                'added': delta.added,
+                'changed': delta.changed,
+                'removed': delta.removed,
+                'digest': delta.digest,
+            }
+        )
+
+    def test_case_status_packet(self, submission_id: int, position: int, result: Result):
         log.debug(
             'Test case on %d: #%d, %s [%.3fs | %.2f MB], %.1f/%.0f',
-            self.judge.current_submission.id,
+            submission_id,
             position,
             ', '.join(result.readable_codes()),
             result.execution_time,
@@ -315,58 +782,87 @@ class PacketManager:
             result.points,
             result.total_points,
         )
+        batches = []
         with self._testcase_queue_lock:
-            self._testcase_queue.append((position, result))
+            now = time.monotonic()
+            idle = now - self._testcase_last_queued >= PacketManager.TESTCASE_IDLE_FLUSH
+            self._testcase_last_queued = now
+
+            batch = self._testcase_queue.get(submission_id)
+            if batch is None:
+                batch = self._testcase_queue[submission_id] = TestCaseBatch()
+            batch.cases.append((position, result))
+            batch.size += 256 + sum(
+                len(value) for value in (result.output, result.feedback, result.extended_feedback) if value
+            )
 
-    def compile_error_packet(self, message: str):
-        log.debug('Compile error: %d', self.judge.current_submission.id)
+            if (
+                idle
+                or len(batch.cases) >= PacketManager.TESTCASE_BATCH_MAX_CASES
+                or batch.size >= PacketManager.TESTCASE_BATCH_MAX_BYTES
+            ):
+                batches = self._take_testcase_batches(submission_id)
+        # Sending may block until the network catches up, so it happens outside the lock; see _flush_testcase_queue.
+        for id, batch in batches:
+            self._send_test_case_status(id, batch.cases)
+
+    def compile_error_packet(self, submission_id: int, message: str):
+        log.debug('Compile error: %d', submission_id)
         self.fallback = 4
-        self._send_packet({'name': 'compile-error', 'submission-id': self.judge.current_submission.id, 'log': message})
+        self._send_packet({'name': 'compile-error', 'submission-id': submission_id, 'log': message})
 
-    def compile_message_packet(self, message: str):
-        log.debug('Compile message: %d', self.judge.current_submission.id)
-        self._send_packet(
-            {'name': 'compile-message', 'submission-id': self.judge.current_submission.id, 'log': message}
-        )
+    def compile_message_packet(self, submission_id: int, message: str):
+        log.debug('Compile message: %d', submission_id)
+        self._send_packet({'name': 'compile-message', 'submission-id': submission_id, 'log': message})
 
-    def internal_error_packet(self, message: str):
-        log.debug('Internal error: %d', self.judge.current_submission.id)
-        self._flush_testcase_queue()
-        self._send_packet(
-            {'name': 'internal-error', 'submission-id': self.judge.current_submission.id, 'message': message}
-        )
+    def internal_error_packet(self, submission_id: int, message: str):
+        log.debug('Internal error: %d', submission_id)
+        self._flush_testcase_queue(submission_id)
+        self._batches.pop(submission_id, None)
+        self._send_packet({'name': 'internal-error', 'submission-id': submission_id, 'message': message})
 
-    def begin_grading_packet(self, is_pretested: bool):
-        log.debug('Begin grading: %d', self.judge.current_submission.id)
-        self._send_packet(
-            {'name': 'grading-begin', 'submission-id': self.judge.current_submission.id, 'pretested': is_pretested}
-        )
+    def begin_grading_packet(self, submission_id: int, is_pretested: bool):
+        log.debug('Begin grading: %d', submission_id)
+        self._send_packet({'name': 'grading-begin', 'submission-id': submission_id, 'pretested': is_pretested})
 
-    def grading_end_packet(self):
-        log.debug('End grading: %d', self.judge.current_submission.id)
+    def grading_end_packet(self, submission_id: int, timings: Optional[Dict[str, Any]] = None):
+        log.debug('End grading: %d', submission_id)
         self.fallback = 4
-        self._flush_testcase_queue()
-        self._send_packet({'name': 'grading-end', 'submission-id': self.judge.current_submission.id})
-
-    def batch_begin_packet(self):
-        self._batch += 1
-        log.debug('Enter batch number %d: %d', self._batch, self.judge.current_submission.id)
-        self._flush_testcase_queue()
-        self._send_packet({'name': 'batch-begin', 'submission-id': self.judge.current_submission.id})
-
-    def batch_end_packet(self):
-        log.debug('Exit batch number %d: %d', self._batch, self.judge.current_submission.id)
-        self._flush_testcase_queue()
-        self._send_packet({'name': 'batch-end', 'submission-id': self.judge.current_submission.id})
+        self._flush_testcase_queue(submission_id)
+        self._batches.pop(submission_id, None)
+        packet: Dict[str, Any] = {'name': 'grading-end', 'submission-id': submission_id}
+        if timings is not None:
+            packet['timings'] = timings
+        self._send_packet(packet)
+
+    def batch_begin_packet(self, submission_id: int):
+        self._batches[submission_id] += 1
+        log.debug('Enter batch number %d: %d', self._batches[submission_id], submission_id)
+        self._flush_testcase_queue(submission_id)
+        self._send_packet({'name': 'batch-begin', 'submission-id': submission_id})
+
+    def batch_end_packet(self, submission_id: int):
+        log.debug('Exit batch number %d: %d', self._batches[submission_id], submission_id)
+        self._flush_testcase_queue(submission_id)
+        self._send_packet({'name': 'batch-end', 'submission-id': submission_id})
 
     def current_submission_packet(self):
-        log.debug('Current submission query: %d', self.judge.current_submission.id)
-        self._send_packet({'name': 'current-submission-id', 'submission-id': self.judge.current_submission.id})
+        submission_ids = [submission.id for submission in self.judge.current_submissions]
+        log.debug('Current submission query: %s', submission_ids)
+        # 'submission-id' is kept for sites that only know about a single grading slot.
+        self._send_packet(
+            {
+                'name': 'current-submission-id',
+                'submission-id': submission_ids[0] if submission_ids else None,
+                'submission-ids': submission_ids,
+            }
+        )
 
-    def submission_aborted_packet(self):
-        log.debug('Submission aborted: %d', self.judge.current_submission.id)
-        self._flush_testcase_queue()
-        self._send_packet({'name': 'submission-terminated', 'submission-id': self.judge.current_submission.id})
+    def submission_aborted_packet(self, submission_id: int):
+        log.debug('Submission aborted: %d', submission_id)
+        self._flush_testcase_queue(submission_id)
+        self._batches.pop(submission_id, None)
+        self._send_packet({'name': 'submission-terminated', 'submission-id': submission_id})
 
     def ping_packet(self, when: float):
         data = {'name': 'ping-response', 'when': when, 'time': time.time()}
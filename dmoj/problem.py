@@ -1,25 +1,44 @@
+import hashlib
 import itertools
+import json
+import mmap
 import os
+import pickle
 import re
+import shutil
+import struct
 import subprocess
+import tempfile
+import threading
 import zipfile
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 from functools import partial
 
+import pylru
 import yaml
 from yaml.parser import ParserError
 from yaml.scanner import ScannerError
 
 from dmoj import checkers
 from dmoj.config import ConfigNode, InvalidInitException
-from dmoj.generator import GeneratorManager
+from dmoj.generator import GeneratorManager, get_generator_output_cache
 from dmoj.judgeenv import env, get_problem_root
+from dmoj.utils.disk_cache import DiskCache
 from dmoj.utils.helper_files import parse_helper_file_error
 from dmoj.utils.module import load_module_from_file
+from dmoj.utils.os_ext import anonymous_file, write_all
+from dmoj.utils.unicode import utf8bytes
 
 DEFAULT_TEST_CASE_INPUT_PATTERN = r'^(?=.*?\.in|in).*?(?:(?:^|\W)(?P<batch>\d+)[^\d\s]+)?(?P<case>\d+)[^\d\s]*$'
 DEFAULT_TEST_CASE_OUTPUT_PATTERN = r'^(?=.*?\.out|out).*?(?:(?:^|\W)(?P<batch>\d+)[^\d\s]+)?(?P<case>\d+)[^\d\s]*$'
 
+# Layout of a zip local file header, which precedes every member's data; see `zipfile.structFileHeader`.
+ZIP_LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+ZIP_LOCAL_HEADER_NAME_LENGTH = 10
+ZIP_LOCAL_HEADER_EXTRA_LENGTH = 11
+
+NEEDS_NEWLINE_NORMALIZATION = re.compile(b'\r')
+
 
 class Problem:
     def __init__(self, problem_id, time_limit, memory_limit, meta):
@@ -35,12 +54,21 @@ class Problem:
 
         # Checkers modules must be stored in a dict, for the duration of execution,
         # lest globals be deleted with the module.
-        self._checkers = {}
+        self._modules = {}
+
+        # Parsing init.yml and matching test cases against large archives is slow, so the results are reused across
+        # submissions for as long as the problem's files stay unchanged.
+        self._metadata = get_problem_metadata_cache().get(problem_id, self.root_dir)
+        if self._metadata.config is not None:
+            self.config = ConfigNode(self._metadata.load_config(meta))
+            self.problem_data.archive = self._metadata.archive
+            return
 
         try:
             doc = yaml.safe_load(self.problem_data['init.yml'])
             if not doc:
                 raise InvalidInitException('I find your lack of content disturbing.')
+            cacheable = not _has_dynamic_keys(doc)
             self.config = ConfigNode(
                 doc,
                 defaults={
@@ -49,6 +77,8 @@ class Problem:
                     'output_limit_length': 25165824,
                     'binary_data': False,
                     'short_circuit': True,
+                    'parallel_cases': 1,
+                    'fd_io': False,
                     'points': 1,
                     'symlinks': {},
                     'meta': meta,
@@ -60,6 +90,10 @@ class Problem:
         self.problem_data.archive = self._resolve_archive_files()
         self._resolve_test_cases()
 
+        # Dynamic keys are evaluated against the submission's metadata, so their results can't be reused.
+        if cacheable:
+            self._metadata.store_config(self.config.unwrap(), self.problem_data.archive)
+
     def _match_test_cases(self, filenames, input_case_pattern, output_case_pattern, case_points):
         def try_match_int(match, group):
             try:
@@ -153,11 +187,14 @@ class Problem:
             iter(get_with_default('case_points', itertools.repeat(self.config.points))),
         )
 
+    def load_module(self, name):
+        if name in self._modules:
+            return self._modules[name]
+        self._modules[name] = module = self._metadata.load_module(name)
+        return module
+
     def load_checker(self, name):
-        if name in self._checkers:
-            return self._checkers[name]
-        self._checkers[name] = checker = load_module_from_file(os.path.join(self.root_dir, name))
-        return checker
+        return self.load_module(name)
 
     @property
     def grader_class(self):
@@ -186,25 +223,432 @@ class Problem:
 
 
 class ProblemDataManager(dict):
+    """
+    Provides access to problem data files, either from the problem directory or from its archive.
+
+    Indexing returns a file's contents as `bytes`, while `get_buffer` returns a read-only `memoryview` backed by a
+    memory map of the file, without copying it. Plain files are mapped directly. Archive members are mapped from the
+    archive's extraction in the archive cache if it is enabled; otherwise, uncompressed members are mapped directly
+    from the archive, and compressed members are extracted once to a temporary directory, then mapped.
+    """
+
     def __init__(self, problem, **kwargs):
         super().__init__(**kwargs)
         self.problem = problem
         self.archive = None
+        self._buffers = {}
+        self._paths = {}
+        # Keys whose buffers map a file that is never modified in place.
+        self._immutable = set()
+        self._archive_map = None
+        self._extract_dir = None
+        self._extracted_archive = None
 
     def __missing__(self, key):
+        return self.get_buffer(key).tobytes()
+
+    def get_buffer(self, key):
+        if dict.__contains__(self, key):
+            data = self[key]
+            return memoryview(data if isinstance(data, bytes) else utf8bytes(data))
+
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = self._buffers[key] = self._map_file(key)
+        return buffer
+
+    def get_path(self, key):
+        """
+        Returns the path of a file holding exactly the contents of `get_buffer(key)`, or `None` if there is no such
+        file, e.g. for archive members when the archive cache is disabled. Must be called after `get_buffer(key)`.
+        """
+        return self._paths.get(key)
+
+    def is_immutable(self, key):
+        """
+        Returns whether the buffer of `key` maps a file that is never modified in place, i.e. an extraction in the
+        archive cache, and so can be kept around after this submission. Must be called after `get_buffer(key)`.
+        """
+        return key in self._immutable
+
+    def get_identity(self, key):
+        """
+        Returns a tuple that identifies the current contents of `key`, changing whenever they might have, or `None`
+        if `key` is only held in memory.
+        """
+        if dict.__contains__(self, key):
+            return None
+
+        try:
+            path = os.path.join(self.problem.root_dir, key)
+            stat = os.stat(path)
+        except OSError:
+            if not self.archive:
+                raise KeyError('file "%s" could not be found in "%s"' % (key, self.problem.root_dir))
+            zipinfo = self.archive.getinfo(key)
+            path = self.archive.filename
+            stat = os.stat(path)
+            return path, stat.st_ino, stat.st_mtime_ns, stat.st_size, key, zipinfo.CRC
+        return path, stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _map_file(self, key):
+        path = os.path.join(self.problem.root_dir, key)
         try:
-            with open(os.path.join(self.problem.root_dir, key), 'rb') as f:
-                return f.read()
+            buffer = _map_path(path)
         except IOError:
-            if self.archive:
-                zipinfo = self.archive.getinfo(key)
-                with self.archive.open(zipinfo) as f:
-                    return f.read()
-            raise KeyError('file "%s" could not be found in "%s"' % (key, self.problem.root_dir))
+            if not self.archive:
+                raise KeyError('file "%s" could not be found in "%s"' % (key, self.problem.root_dir))
+            extracted = self._get_extracted_archive()
+            if extracted is not None:
+                path = extracted.get_path(key)
+                buffer = _map_path(path)
+                self._paths[key] = path
+                self._immutable.add(key)
+                return buffer
+            zipinfo = self.archive.getinfo(key)
+            if zipinfo.compress_type == zipfile.ZIP_STORED and not zipinfo.flag_bits & 0x1:
+                return self._map_stored_member(zipinfo)
+            # The extracted file goes away with us, so don't hand out its path.
+            return _map_path(self._extract_member(zipinfo))
+        self._paths[key] = path
+        return buffer
+
+    def _get_extracted_archive(self):
+        if self._extracted_archive is None:
+            archive_cache = get_archive_cache()
+            if archive_cache is None:
+                return None
+            self._extracted_archive = archive_cache.get(self.archive)
+        return self._extracted_archive
+
+    def _map_stored_member(self, zipinfo):
+        if self._archive_map is None:
+            self._archive_map = memoryview(_map_path(self.archive.filename))
+        header = self._archive_map[zipinfo.header_offset : zipinfo.header_offset + ZIP_LOCAL_HEADER.size]
+        fields = ZIP_LOCAL_HEADER.unpack(header)
+        start = (
+            zipinfo.header_offset
+            + ZIP_LOCAL_HEADER.size
+            + fields[ZIP_LOCAL_HEADER_NAME_LENGTH]
+            + fields[ZIP_LOCAL_HEADER_EXTRA_LENGTH]
+        )
+        return self._archive_map[start : start + zipinfo.file_size]
+
+    def _extract_member(self, zipinfo):
+        if self._extract_dir is None:
+            self._extract_dir = tempfile.mkdtemp(dir=env.tempdir)
+        fd, path = tempfile.mkstemp(dir=self._extract_dir)
+        with os.fdopen(fd, 'wb') as f, self.archive.open(zipinfo) as member:
+            shutil.copyfileobj(member, f, 1048576)
+        return path
 
     def __del__(self):
-        if self.archive:
-            self.archive.close()
+        # The archive may be shared with later submissions through the problem metadata cache, so it is left to be
+        # closed once it's no longer referenced.
+        if self._extract_dir:
+            shutil.rmtree(self._extract_dir, ignore_errors=True)
+
+
+def _map_path(path):
+    with open(path, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            # Empty files can't be mapped.
+            return memoryview(b'')
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+class NormalizedDataCache:
+    """
+    A bounded LRU cache of normalized test data, which outlives the `Problem` objects of individual submissions, so
+    that the data of hot problems is neither re-read nor re-normalized for every submission.
+
+    Values are a normalized buffer, and the path of a file holding exactly that data, if any. If `disk_cache` is given,
+    normalized copies of data that needed changing are stored there and mapped, so that every worker process shares a
+    single copy through the page cache.
+    """
+
+    def __init__(self, max_entries, max_bytes, disk_cache=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_cache = disk_cache
+        # key -> (buffer, path, disk cache entry or None)
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, normalize):
+        """
+        Returns the cached `(buffer, path)` for `key`, calling `normalize()` to produce them on a miss.
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                return value[:2]
+
+        value = self._load_shared(key)
+        if value is None:
+            buffer, path = normalize()
+            # Only copies made by normalization are worth sharing; anything else is already mapped from a file.
+            if isinstance(buffer, bytes) and buffer and self.disk_cache is not None:
+                value = self._store_shared(key, buffer)
+            else:
+                value = buffer, path, None
+
+        self._insert(key, value)
+        return value[:2]
+
+    def _insert(self, key, value):
+        size = len(value[0])
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = value
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        value = self._entries.pop(key, None)
+        if value is not None:
+            self._size -= len(value[0])
+            if value[2] is not None:
+                value[2].close()
+
+    @staticmethod
+    def _shared_key(key):
+        return hashlib.sha384(utf8bytes(repr(key))).hexdigest()
+
+    def _load_shared(self, key):
+        if self.disk_cache is None:
+            return None
+        entry = self.disk_cache.get(self._shared_key(key))
+        if entry is None:
+            return None
+        try:
+            return _map_path(entry.path), entry.path, entry
+        except IOError:
+            entry.close()
+            return None
+
+    def _store_shared(self, key, buffer):
+        fd, temp_path = tempfile.mkstemp(dir=self.disk_cache.root)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(buffer)
+        entry = self.disk_cache.put(self._shared_key(key), temp_path)
+        return _map_path(entry.path), entry.path, entry
+
+
+_normalized_data_cache = None
+
+
+def get_normalized_data_cache():
+    global _normalized_data_cache
+    if _normalized_data_cache is None:
+        disk_cache = None
+        if env.test_data_cache_dir:
+            disk_cache = DiskCache(env.test_data_cache_dir, env.test_data_cache_size, env.test_data_cache_max_bytes)
+        _normalized_data_cache = NormalizedDataCache(
+            env.test_data_cache_size, env.test_data_cache_max_bytes, disk_cache
+        )
+    return _normalized_data_cache
+
+
+def _file_identity(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _has_dynamic_keys(doc):
+    if isinstance(doc, dict):
+        return any(
+            isinstance(key, str) and key.endswith('+') or _has_dynamic_keys(value) for key, value in doc.items()
+        )
+    elif isinstance(doc, list):
+        return any(_has_dynamic_keys(value) for value in doc)
+    return False
+
+
+class ProblemMetadata:
+    """
+    The parts of a problem that can be reused across submissions: its resolved configuration, its opened archive, and
+    the checker and grader modules loaded from its directory. Each is only valid for as long as the files it came from
+    are unchanged.
+    """
+
+    def __init__(self, root_dir, init_identity):
+        self.root_dir = root_dir
+        self.init_identity = init_identity
+        # Pickled, since unpickling is far cheaper than deep-copying a configuration with thousands of test cases,
+        # and each submission needs its own copy to modify.
+        self.config = None
+        self.archive = None
+        self.archive_identity = None
+        # name -> (file identity, module)
+        self.modules = {}
+        self._lock = threading.Lock()
+
+    def is_valid(self, root_dir, init_identity):
+        if init_identity is None or (root_dir, init_identity) != (self.root_dir, self.init_identity):
+            return False
+        return self.archive is None or _file_identity(self.archive.filename) == self.archive_identity
+
+    def load_config(self, meta):
+        config = pickle.loads(self.config)
+        config['meta'] = meta
+        return config
+
+    def store_config(self, config, archive):
+        if self.init_identity is None:
+            return
+        if archive is not None:
+            # Identify the file that was actually opened, which may since have been replaced.
+            stat = os.fstat(archive.fp.fileno())
+            self.archive_identity = stat.st_ino, stat.st_mtime_ns, stat.st_size
+        self.archive = archive
+        self.config = pickle.dumps({key: value for key, value in config.items() if key != 'meta'})
+
+    def load_module(self, name):
+        path = os.path.join(self.root_dir, name)
+        # Taken before loading, so that changes made while loading invalidate the module on next use.
+        identity = _file_identity(path)
+        with self._lock:
+            cached = self.modules.get(name)
+        if cached is not None and identity is not None and cached[0] == identity:
+            return cached[1]
+
+        module = load_module_from_file(path)
+        if identity is not None:
+            with self._lock:
+                self.modules[name] = identity, module
+        return module
+
+
+class ProblemMetadataCache:
+    """
+    A bounded LRU cache of `ProblemMetadata`, by problem id. Entries are checked against the current state of the
+    problem's files on every lookup, so edits to problems take effect with the next submission.
+    """
+
+    def __init__(self, max_entries):
+        self._entries = pylru.lrucache(max_entries)
+        self._lock = threading.Lock()
+
+    def get(self, problem_id, root_dir):
+        init_identity = _file_identity(os.path.join(root_dir, 'init.yml'))
+        with self._lock:
+            metadata = self._entries.get(problem_id)
+            if metadata is None or not metadata.is_valid(root_dir, init_identity):
+                metadata = ProblemMetadata(root_dir, init_identity)
+                if init_identity is not None:
+                    self._entries[problem_id] = metadata
+        return metadata
+
+
+_problem_metadata_cache = None
+
+
+def get_problem_metadata_cache():
+    global _problem_metadata_cache
+    if _problem_metadata_cache is None:
+        _problem_metadata_cache = ProblemMetadataCache(env.problem_cache_size)
+    return _problem_metadata_cache
+
+
+class ExtractedArchive:
+    """
+    An archive extracted into the archive cache. Members are stored by position under `members/`, and `index.json`
+    maps member names to them. The extraction can't be evicted for as long as this object is alive.
+    """
+
+    def __init__(self, entry):
+        self.entry = entry
+        with open(os.path.join(entry.path, 'index.json')) as f:
+            self.members = json.load(f)
+
+    def get_path(self, name):
+        try:
+            return os.path.join(self.entry.path, 'members', self.members[name])
+        except KeyError:
+            raise KeyError("There is no item named '%s' in the archive" % name)
+
+
+class ArchiveCache:
+    """
+    Extracts each problem archive once, no matter how many submissions or worker processes use it, so that archive
+    members are served as plain files and never decompressed while grading.
+
+    Extractions are stored in `disk_cache` by the digest of the archive's contents. An archive's digest is only
+    recomputed when the archive changes, at which point its old extraction is discarded.
+    """
+
+    def __init__(self, disk_cache):
+        self.disk_cache = disk_cache
+        # archive path -> (file identity, digest)
+        self._digests = {}
+        self._lock = threading.Lock()
+
+    def get(self, archive):
+        stat = os.fstat(archive.fp.fileno())
+        identity = stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+        with self._lock:
+            known = self._digests.get(archive.filename)
+            if known is not None and known[0] == identity:
+                digest = known[1]
+            else:
+                digest = _file_digest(archive.fp.fileno())
+                self._digests[archive.filename] = identity, digest
+                if known is not None and known[1] != digest:
+                    self.disk_cache.discard(known[1])
+
+            entry = self.disk_cache.get(digest)
+            if entry is None:
+                entry = self.disk_cache.put(digest, self._extract(archive))
+        return ExtractedArchive(entry)
+
+    def _extract(self, archive):
+        path = tempfile.mkdtemp(dir=self.disk_cache.root)
+        os.mkdir(os.path.join(path, 'members'))
+        index = {}
+        for position, zipinfo in enumerate(archive.infolist()):
+            if zipinfo.is_dir():
+                continue
+            index[zipinfo.filename] = name = str(position)
+            with open(os.path.join(path, 'members', name), 'wb') as f, archive.open(zipinfo) as member:
+                shutil.copyfileobj(member, f, 1048576)
+        with open(os.path.join(path, 'index.json'), 'w') as f:
+            json.dump(index, f)
+        return path
+
+
+def _file_digest(fd):
+    # Reads with pread, so as not to move the file offset from under `zipfile`.
+    digest = hashlib.sha256()
+    offset = 0
+    while True:
+        chunk = os.pread(fd, 1048576, offset)
+        if not chunk:
+            return digest.hexdigest()
+        digest.update(chunk)
+        offset += len(chunk)
+
+
+_archive_cache = None
+
+
+def get_archive_cache():
+    global _archive_cache
+    if _archive_cache is None and env.archive_cache_dir:
+        _archive_cache = ArchiveCache(
+            DiskCache(env.archive_cache_dir, env.archive_cache_size, env.archive_cache_max_bytes)
+        )
+    return _archive_cache
 
 
 class BatchedTestCase:
@@ -231,6 +675,10 @@ class TestCase:
         self.output_prefix_length = config.output_prefix_length
         self.has_binary_data = config.binary_data
         self._generated = None
+        self._input_data_view = None
+        self._input_path = None
+        # The `CheckerStream` fed this case's output during grading, if any.
+        self.checker_stream = None
 
     def _normalize(self, data):
         # Perhaps the correct answer may be "no output", in which case it'll be
@@ -242,6 +690,12 @@ class TestCase:
         if self.has_binary_data or not data:
             return data
 
+        if isinstance(data, memoryview):
+            # Most data is already normalized, in which case we can serve it without copying.
+            if not NEEDS_NEWLINE_NORMALIZATION.search(data) and data[-1:] == b'\n':
+                return data
+            data = data.tobytes()
+
         # Normalize all newline formats (\r\n, \r, \n) to \n, otherwise we have
         # problems with people creating data on Macs (\r newline) when judged
         # programs assume \n.
@@ -254,6 +708,29 @@ class TestCase:
 
         return data
 
+    def _normalized_file(self, name):
+        """
+        Returns the normalized contents of problem data file `name`, and the path of a file holding exactly those
+        contents, or `None`.
+        """
+        problem_data = self.problem.problem_data
+        identity = problem_data.get_identity(name)
+        if identity is None:
+            return self._normalize(problem_data.get_buffer(name)), None
+
+        def normalize():
+            buffer = problem_data.get_buffer(name)
+            normalized = self._normalize(buffer)
+            if normalized is not buffer:
+                return normalized, None
+            if problem_data.is_immutable(name):
+                return buffer, problem_data.get_path(name)
+            # The cache outlives this submission, and problem files may be truncated in place while it holds them, at
+            # which point touching a map of one kills the worker with SIGBUS. So it gets a copy.
+            return buffer.tobytes(), None
+
+        return get_normalized_data_cache().get((self.problem.id, name, self.has_binary_data, identity), normalize)
+
     def _run_generator(self, gen, args=None):
         flags = []
         args = args or []
@@ -298,7 +775,19 @@ class TestCase:
         )
 
         # convert all args to str before launching; allows for smoother int passing
-        args = map(str, args)
+        args = list(map(str, args))
+
+        try:
+            input = self.problem.problem_data.get_buffer(self.config['in']) if self.config['in'] else None
+        except KeyError:
+            input = None
+
+        cache = get_generator_output_cache()
+        if cache is not None:
+            cache_key = self._generator_cache_key(executor, args, input, time_limit, memory_limit)
+            self._generated = self._load_generated(cache, cache_key)
+            if self._generated is not None:
+                return
 
         # setting large buffers is really important, because otherwise stderr is unbuffered
         # and the generator begins calling into cptbox Python code really frequently
@@ -313,17 +802,61 @@ class TestCase:
             stdout_buffer_size=65536
         )
 
-        try:
-            input = self.problem.problem_data[self.config['in']] if self.config['in'] else None
-        except KeyError:
-            input = None
-
         stdout, stderr = proc.unsafe_communicate(input)
         self._generated = list(map(self._normalize, (stdout, stderr)))
 
         parse_helper_file_error(proc, executor, 'generator', stderr, time_limit, memory_limit)
 
+        if cache is not None:
+            self._store_generated(cache, cache_key, self._generated)
+
+    def _generator_cache_key(self, executor, args, input, time_limit, memory_limit):
+        key = hashlib.sha384()
+        key.update(utf8bytes(executor.__class__.__name__ + executor.__module__))
+        if hasattr(executor, 'get_binary_cache_key'):
+            key.update(hashlib.sha384(executor.get_binary_cache_key()).digest())
+        else:
+            key.update(hashlib.sha384(utf8bytes(executor.source)).digest())
+        key.update(utf8bytes('\0'.join(args)))
+        key.update(b'\0no input' if input is None else hashlib.sha384(input).digest())
+        key.update(utf8bytes('%r/%r/%r' % (time_limit, memory_limit, self.has_binary_data)))
+        return key.hexdigest()
+
+    @staticmethod
+    def _load_generated(cache, cache_key):
+        entry = cache.get(cache_key)
+        if entry is None:
+            return None
+        try:
+            generated = []
+            for name in ('stdout', 'stderr'):
+                with open(os.path.join(entry.path, name), 'rb') as f:
+                    generated.append(f.read())
+            return generated
+        except IOError:
+            return None
+        finally:
+            entry.close()
+
+    @staticmethod
+    def _store_generated(cache, cache_key, generated):
+        temp_dir = tempfile.mkdtemp(dir=cache.root)
+        for name, data in zip(('stdout', 'stderr'), generated):
+            with open(os.path.join(temp_dir, name), 'wb') as f:
+                f.write(data)
+        cache.put(cache_key, temp_dir).close()
+
     def input_data(self):
+        return bytes(self.input_data_view())
+
+    def input_data_view(self):
+        """
+        Like `input_data`, but returns a bytes-like object that may be a view of memory-mapped problem data, to avoid
+        copying large inputs.
+        """
+        if self._input_data_view is not None:
+            return self._input_data_view
+
         gen = self.config.generator
 
         # don't try running the generator if we specify an output file explicitly,
@@ -334,11 +867,34 @@ class TestCase:
             if self._generated[0]:
                 return self._generated[0]
         # in file is optional
-        return self._normalize(self.problem.problem_data[self.config['in']]) if self.config['in'] else b''
+        if self.config['in']:
+            self._input_data_view, self._input_path = self._normalized_file(self.config['in'])
+            return self._input_data_view
+        return b''
+
+    def open_input(self):
+        """
+        Returns a new file descriptor for the normalized input data, positioned at its start, to be used directly as a
+        submission's stdin. The input file itself is opened if it needed no normalization; otherwise, the data is
+        copied into an anonymous in-memory file.
+        """
+        data = self.input_data_view()
+
+        if self._input_path is not None:
+            return os.open(self._input_path, os.O_RDONLY | os.O_CLOEXEC)
+
+        fd = anonymous_file('stdin', dir=env.tempdir)
+        try:
+            write_all(fd, data)
+            os.lseek(fd, 0, os.SEEK_SET)
+        except OSError:
+            os.close(fd)
+            raise
+        return fd
 
     def output_data(self):
         if self.config.out:
-            return self._normalize(self.problem.problem_data[self.config.out])
+            return bytes(self._normalized_file(self.config.out)[0])
         gen = self.config.generator
         if gen:
             if self._generated is None:
@@ -347,6 +903,23 @@ class TestCase:
         return b''
 
     def checker(self):
+        checker, params = self._load_checker()
+        return partial(checker.check, **params)
+
+    def open_checker_stream(self):
+        """
+        Creates a `CheckerStream` that checks the output of this case as it is produced, and stores it in
+        `checker_stream`. Returns `None` if the checker can't check output incrementally.
+        """
+        checker, params = self._load_checker()
+        stream = getattr(checker, 'stream', None)
+        # Checkers that must also see the output of submissions that crashed can't stop them early.
+        if stream is None or getattr(checker.check, 'run_on_error', False):
+            return None
+        self.checker_stream = stream(self.output_data(), **params)
+        return self.checker_stream
+
+    def _load_checker(self):
         try:
             name = self.config['checker'] or 'standard'
             if isinstance(name, ConfigNode):
@@ -366,17 +939,20 @@ class TestCase:
         if not hasattr(checker, 'check') or not callable(checker.check):
             raise InvalidInitException('malformed checker: no check method found')
 
-        return partial(checker.check, **params)
+        return checker, params
 
     def free_data(self):
         self._generated = None
+        self._input_data_view = None
+        self._input_path = None
+        self.checker_stream = None
 
     def __str__(self):
         return 'TestCase{in=%s,out=%s,points=%s}' % (self.config['in'], self.config['out'], self.config['points'])
 
     # FIXME(tbrindus): this is a hack working around the fact we can't pickle these fields, but we do need parts of
     # TestCase itself on the other end of the IPC.
-    _pickle_blacklist = ('_generated', 'config', 'problem')
+    _pickle_blacklist = ('_generated', '_input_data_view', '_input_path', 'checker_stream', 'config', 'problem')
 
     def __getstate__(self):
         k = {k: v for k, v in self.__dict__.items() if k not in self._pickle_blacklist}
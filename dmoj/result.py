@@ -113,3 +113,31 @@ class CheckerResult:
         self.points = points
         self.feedback = feedback
         self.extended_feedback = extended_feedback
+
+
+class CheckerStream:
+    """
+    Checks a submission's output incrementally, as the submission produces it, so that grading can stop at the first
+    mismatch. Checker modules that support this expose `stream(judge_output, **kwargs)`, which returns an instance.
+    """
+
+    def __init__(self):
+        self.rejected = False
+
+    def feed(self, chunk) -> bool:
+        """
+        Consumes the next chunk of output, a bytes-like object only valid for the duration of the call. Returns False
+        once the output can no longer pass, after which nothing more needs to be fed.
+        """
+        if not self.rejected and not self._feed(chunk):
+            self.rejected = True
+        return not self.rejected
+
+    def _feed(self, chunk) -> bool:
+        raise NotImplementedError
+
+    def result(self):
+        """
+        Returns the verdict on all output fed so far, in any of the forms a checker's `check` may return.
+        """
+        raise NotImplementedError
@@ -61,3 +61,68 @@ class CheckerTest(unittest.TestCase):
         assert check(b'1 2\n3', b'3\n1 2')
         assert not check(b'1 2\n3', b'3\n2 1')
         assert check(b'1 2\n3', b'3\n2 1', split_on='whitespace')
+
+
+class CheckerStreamTest(unittest.TestCase):
+    CASES = [
+        (b'a', b'a'),
+        (b'a b', b'a  b'),
+        (b'a b   \n', b'a b'),
+        (b'\n\na b \n    ', b'a b'),
+        (b'a\n\n\nb', b'a\nb'),
+        (b'a\r\nb\r\n', b'a\nb\n'),
+        (b'  a   \n\n', b'\n\n\n  a   \n'),
+        (b'a', b'b'),
+        (b'ab', b'a b'),
+        (b'a', b'ab'),
+        (b'ab', b'a'),
+        (b'a\n\n\nb', b'a b'),
+        (b'a\nb\nc', b'a\nb\nc\n'),
+        (b'', b''),
+        (b'', b'\n'),
+        (b'a', b''),
+    ]
+
+    def assert_same_as_check(self, checker, **kwargs):
+        def verdict(result):
+            return result if isinstance(result, bool) else (result.passed, result.feedback)
+
+        for process_output, judge_output in self.CASES:
+            expected = verdict(checker.check(process_output, judge_output, **kwargs))
+            for size in (1, 2, 3, 1024):
+                stream = checker.stream(judge_output, **kwargs)
+                for i in range(0, len(process_output), size):
+                    if not stream.feed(memoryview(process_output[i : i + size])):
+                        break
+                self.assertEqual(
+                    verdict(stream.result()),
+                    expected,
+                    'expecting stream of %r in chunks of %d to agree with check on %r'
+                    % (process_output, size, judge_output),
+                )
+
+    def test_standard(self):
+        from dmoj.checkers import standard
+
+        self.assert_same_as_check(standard)
+
+    def test_identical(self):
+        from dmoj.checkers import identical
+
+        self.assert_same_as_check(identical)
+        self.assert_same_as_check(identical, pe_allowed=False)
+
+    def test_rstripped(self):
+        from dmoj.checkers import rstripped
+
+        self.assert_same_as_check(rstripped)
+        self.assert_same_as_check(rstripped, filter_new_line=True)
+
+    def test_early_rejection(self):
+        from dmoj.checkers import standard
+
+        stream = standard.stream(b'1 2 3\n')
+        self.assertTrue(stream.feed(b'1 2'))
+        self.assertFalse(stream.feed(b' 4'))
+        self.assertTrue(stream.rejected)
+        self.assertFalse(stream.result())
@@ -0,0 +1,48 @@
+import subprocess
+import sys
+import unittest
+
+from dmoj.error import OutputLimitExceeded
+from dmoj.utils.communicate import safe_communicate
+
+ECHO = 'import sys; data = sys.stdin.buffer.read(); sys.stdout.buffer.write(data); sys.stderr.buffer.write(data[:10])'
+
+
+class Popen(subprocess.Popen):
+    is_ole = False
+
+    def mark_ole(self):
+        self.is_ole = True
+
+
+class SafeCommunicateTest(unittest.TestCase):
+    def launch(self, code=ECHO):
+        return Popen(
+            [sys.executable, '-c', code], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+
+    def test_large_input(self):
+        data = b'0123456789abcdef' * 1048576
+        stdout, stderr = safe_communicate(self.launch(), memoryview(data), outlimit=len(data))
+        self.assertEqual(stdout, data)
+        self.assertEqual(stderr, data[:10])
+
+    def test_no_input(self):
+        self.assertEqual(safe_communicate(self.launch(), b''), (b'', b''))
+
+    def test_output_limit(self):
+        proc = self.launch()
+        with self.assertRaises(OutputLimitExceeded):
+            safe_communicate(proc, b'x' * 101, outlimit=100, errlimit=100)
+        proc.kill()
+        proc.wait()
+        self.assertTrue(proc.is_ole)
+
+    def test_output_at_limit(self):
+        stdout, _ = safe_communicate(self.launch(), b'x' * 100, outlimit=100)
+        self.assertEqual(stdout, b'x' * 100)
+
+    def test_early_exit(self):
+        # The process exits without reading its input, which must not hang or crash.
+        stdout, _ = safe_communicate(self.launch('print("done")'), b'x' * 16777216)
+        self.assertEqual(stdout, b'done\n')
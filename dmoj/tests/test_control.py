@@ -27,6 +27,7 @@ class ControlServerTest(unittest.TestCase):
 
     def setUp(self):
         self.update_mock = self.judge.update_problems = mock.Mock()
+        self.judge.collect_metrics = mock.Mock()
 
     def test_get_404(self):
         self.assertEqual(requests.get(self.connect).status_code, 404)
@@ -41,6 +42,13 @@ class ControlServerTest(unittest.TestCase):
         requests.post(self.connect + 'update/problems')
         self.update_mock.assert_called_with()
 
+    def test_metrics(self):
+        response = requests.get(self.connect + 'metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['Content-Type'].startswith('text/plain'))
+        self.assertIn('# TYPE dmoj_submissions_total counter', response.text)
+        self.judge.collect_metrics.assert_called_once_with()
+
     @classmethod
     def tearDownClass(cls):
         cls.server.shutdown()
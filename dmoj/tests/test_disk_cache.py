@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+
+from dmoj.utils.disk_cache import DiskCache
+
+
+class DiskCacheTest(unittest.TestCase):
+    def setUp(self):
+        self._root = tempfile.TemporaryDirectory()
+        self.root = self._root.name
+
+    def tearDown(self):
+        self._root.cleanup()
+
+    def make_entry(self, data=b'data'):
+        fd, path = tempfile.mkstemp(dir=self.root)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_put_get(self):
+        cache = DiskCache(self.root, 10, 1024)
+        self.assertIsNone(cache.get('key'))
+
+        entry = cache.put('key', self.make_entry(), {'executable': 'a.out'})
+        self.assertEqual(entry.metadata, {'executable': 'a.out'})
+        entry.close()
+
+        # A fresh instance sees the same entries, as another process would.
+        entry = DiskCache(self.root, 10, 1024).get('key')
+        self.assertIsNotNone(entry)
+        self.assertEqual(entry.metadata, {'executable': 'a.out'})
+        with open(entry.path, 'rb') as f:
+            self.assertEqual(f.read(), b'data')
+        entry.close()
+
+    def test_put_existing(self):
+        cache = DiskCache(self.root, 10, 1024)
+        cache.put('key', self.make_entry(b'first'), {'n': 1}).close()
+
+        duplicate = self.make_entry(b'second')
+        entry = cache.put('key', duplicate, {'n': 2})
+        self.assertEqual(entry.metadata, {'n': 1})
+        self.assertFalse(os.path.exists(duplicate))
+        entry.close()
+
+    def test_evict_by_count(self):
+        cache = DiskCache(self.root, 2, 1024)
+        for key in ('a', 'b'):
+            cache.put(key, self.make_entry()).close()
+        # Use 'a', so that 'b' is the least recently used.
+        cache.get('a').close()
+        cache.put('c', self.make_entry()).close()
+
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('c'))
+
+    def test_evict_by_size(self):
+        cache = DiskCache(self.root, 10, 10)
+        cache.put('a', self.make_entry(b'x' * 6)).close()
+        cache.put('b', self.make_entry(b'x' * 6)).close()
+
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('b'))
+
+    def test_open_entries_not_evicted(self):
+        cache = DiskCache(self.root, 1, 1024)
+        entry = cache.put('a', self.make_entry())
+        cache.put('b', self.make_entry()).close()
+
+        self.assertTrue(os.path.exists(entry.path))
+        entry.close()
+
+        cache.put('c', self.make_entry()).close()
+        self.assertFalse(os.path.exists(entry.path))
+
+    def test_discard(self):
+        cache = DiskCache(self.root, 10, 1024)
+        entry = cache.put('a', self.make_entry())
+        cache.discard('a')
+        self.assertTrue(os.path.exists(entry.path))
+
+        entry.close()
+        cache.discard('a')
+        self.assertFalse(os.path.exists(entry.path))
+        self.assertIsNone(cache.get('a'))
+
+    def test_get_leaves_index(self):
+        cache = DiskCache(self.root, 10, 1024)
+        cache.put('a', self.make_entry()).close()
+        index = os.path.join(self.root, DiskCache.INDEX_FILE)
+        before = os.stat(index)
+
+        os.utime(os.path.join(self.root, 'a'), (0, 0))
+        cache.get('a').close()
+
+        # Use is recorded on the entry, without rewriting the index.
+        self.assertEqual(os.stat(index).st_ino, before.st_ino)
+        self.assertGreater(os.stat(os.path.join(self.root, 'a')).st_mtime, 0)
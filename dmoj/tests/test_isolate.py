@@ -0,0 +1,120 @@
+import os
+import re
+import unittest
+from unittest import mock
+
+from dmoj.cptbox._cptbox import NATIVE_ABI
+from dmoj.cptbox.handlers import ALLOW, DISALLOW, PID, allow_if
+from dmoj.cptbox.isolate import IsolateTracer, _compile_fs_jail
+from dmoj.cptbox.syscalls import sys_chdir, sys_clone, sys_kill, sys_prlimit64, translator
+from dmoj.cptbox.tracer import _SYSCALL_INDICIES, TracedPopen
+
+
+class IsolateTracerTest(unittest.TestCase):
+    def setUp(self):
+        self.tracer = IsolateTracer(['/usr/', '/proc/{pid}$', '/sandbox/'], write_fs=['/dev/null$'])
+        self.cwd = '/sandbox'
+        self.tracer._getcwd_pid = mock.Mock(side_effect=lambda pid: self.cwd)
+        self.tracer._getfd_pid = mock.Mock(return_value='/usr/lib')
+
+    def debugger(self, pid=1000, flags=os.O_RDONLY):
+        return mock.Mock(pid=pid, uarg1=flags)
+
+    def check(self, file, **kwargs):
+        return self.tracer._file_access_check(file, self.debugger(**kwargs), True)
+
+    def test_jail(self):
+        self.assertEqual(self.check('/usr/bin/python'), ('/usr/bin/python', True))
+        self.assertEqual(self.check('/etc/passwd'), ('/etc/passwd', False))
+        self.assertEqual(self.check('/proc/1000'), ('/proc/1000', True))
+        self.assertEqual(self.check('/proc/1001'), ('/proc/1001', False))
+        self.assertEqual(self.check('/proc/1001', pid=1001), ('/proc/1001', True))
+        self.assertEqual(self.check('/dev/null', flags=os.O_WRONLY), ('/dev/null', True))
+        self.assertEqual(self.check('/usr/bin/python', flags=os.O_WRONLY), ('/usr/bin/python', False))
+        self.assertEqual(self.check('../usr/./bin'), ('/usr/bin', True))
+
+    def test_jail_shared(self):
+        _compile_fs_jail.cache_clear()
+        for dir in ('/tmp/a', '/tmp/b', '/tmp/c'):
+            tracer = IsolateTracer([r'/usr/(?!home)', '/proc/{pid}$', re.escape(dir)])
+            self.assertEqual(tracer._file_access_check(dir + '/input', self.debugger(), True), (dir + '/input', True))
+            self.assertEqual(tracer._file_access_check('/tmp/d', self.debugger(), True), ('/tmp/d', False))
+
+        # The submission directories are matched by each tracer, so every one of them reuses the same compiled jail.
+        self.assertEqual(_compile_fs_jail.cache_info().currsize, 1)
+
+    def test_relative_to_dirfd(self):
+        debugger = self.debugger()
+        self.assertEqual(self.tracer._file_access_check('libc.so', debugger, True, dirfd=3), ('/usr/lib/libc.so', True))
+        self.tracer._getfd_pid.assert_called_once_with(1000, 3)
+
+    def test_cwd_cached(self):
+        for _ in range(3):
+            self.assertEqual(self.check('input.txt'), ('/sandbox/input.txt', True))
+            self.assertEqual(self.check('output.txt'), ('/sandbox/output.txt', True))
+        self.assertEqual(self.tracer._getcwd_pid.call_count, 1)
+        self.check('input.txt', pid=1001)
+        self.assertEqual(self.tracer._getcwd_pid.call_count, 2)
+
+    def test_chdir(self):
+        self.tracer[sys_chdir] = ALLOW
+        self.assertEqual(self.check('lib'), ('/sandbox/lib', True))
+
+        self.assertTrue(self.tracer[sys_chdir](self.debugger()))
+        self.cwd = '/etc'
+        self.assertEqual(self.check('lib'), ('/etc/lib', False))
+        self.cwd = '/usr'
+        self.assertEqual(self.check('lib'), ('/usr/lib', True))
+
+    def test_native_path_rules(self):
+        tracer = IsolateTracer(
+            [
+                r'/usr/(?!home)',
+                r'/opt/',
+                r'/etc$',
+                r'/tmp/a\-b/',
+                '/proc/{pid}$',
+                '/(?P<x>srv)/',
+                r'/lib\b/',
+                r'/var/[^]x]',
+                r'/var/[]x]',
+                r'/home/[^/]+/',
+            ],
+            write_fs=[r'/dev/null$'],
+        )
+        self.assertEqual(
+            list(tracer.native_path_rules()),
+            [
+                (False, 'regex', r'/usr/(?!home)'),
+                (False, 'prefix', '/opt/'),
+                (False, 'exact', '/etc'),
+                (False, 'prefix', '/tmp/a-b/'),
+                (False, 'regex', r'/home/[^/]+/'),
+                (True, 'exact', '/dev/null'),
+            ],
+        )
+
+    def test_allow_if(self):
+        @allow_if(arg0=PID, arg2=(1, 2))
+        def handler(debugger):
+            pass
+
+        self.assertEqual(handler.seccomp_rules, [((0, PID), (2, 1)), ((0, PID), (2, 2))])
+        self.assertRaises(ValueError, allow_if, pid=PID)
+
+    def test_seccomp_rules(self):
+        index = _SYSCALL_INDICIES[NATIVE_ABI]
+        (kill,) = translator[sys_kill][index]
+        (prlimit,) = translator[sys_prlimit64][index]
+        self.tracer[sys_clone] = DISALLOW
+        rules = TracedPopen._get_seccomp_rules(mock.Mock(_security=self.tracer))
+        self.assertIn((kill, [(0, True, 0)]), rules)
+        self.assertIn((prlimit, [(0, False, 0)]), rules)
+        self.assertIn((prlimit, [(0, True, 0)]), rules)
+
+        # Children inherit the filter, which would then let them signal their parent, where the handler would not.
+        self.tracer[sys_clone] = ALLOW
+        rules = TracedPopen._get_seccomp_rules(mock.Mock(_security=self.tracer))
+        self.assertNotIn((kill, [(0, True, 0)]), rules)
+        self.assertNotIn((prlimit, [(0, True, 0)]), rules)
+        self.assertIn((prlimit, [(0, False, 0)]), rules)
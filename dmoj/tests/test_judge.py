@@ -0,0 +1,180 @@
+import threading
+import unittest
+from unittest import mock
+
+from dmoj import metrics
+from dmoj.judge import IPC, Judge, JudgeWorkerPool, Submission
+from dmoj.judgeenv import env
+
+
+def make_submission(id):
+    return Submission(id, 'aplusb', 'PY3', 'print(1)', 1.0, 65536, False, {})
+
+
+class FakeWorker:
+    def __init__(self):
+        self.submission = None
+        self.release = threading.Event()
+        self.aborted = False
+
+    def begin_grading(self, submission):
+        self.submission = submission
+
+    def communicate(self):
+        yield IPC.HELLO, ()
+        yield IPC.GRADING_BEGIN, (False,)
+        self.release.wait(5)
+        if self.aborted:
+            yield IPC.GRADING_ABORTED, ()
+
+    def request_abort_grading(self):
+        self.aborted = True
+        self.release.set()
+
+    def wait_for_grading_end(self):
+        pass
+
+
+class FakeWorkerPool:
+    def __init__(self, size):
+        self.released = []
+
+    def acquire(self):
+        return FakeWorker()
+
+    def release(self, worker):
+        self.released.append(worker)
+        worker.submission = None
+
+
+class JudgeTest(unittest.TestCase):
+    def setUp(self):
+        patch = mock.patch('dmoj.judge.JudgeWorkerPool', FakeWorkerPool)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.packet_manager = mock.Mock()
+        self.judge = Judge(self.packet_manager, slots=2)
+        self.workers = {}
+
+    def begin_grading(self, id):
+        submission = make_submission(id)
+        self.judge.begin_grading(submission, report=lambda message: None)
+        self.workers[id] = self.judge.current_judge_workers[id]
+
+    def finish(self, id):
+        worker = self.workers[id]
+        worker.release.set()
+        for _ in range(50):
+            if worker in self.judge.worker_pool.released:
+                return
+            threading.Event().wait(0.1)
+        self.fail('submission %d did not finish' % id)
+
+    def test_multiple_slots(self):
+        self.begin_grading(1)
+        self.begin_grading(2)
+        self.assertEqual(sorted(submission.id for submission in self.judge.current_submissions), [1, 2])
+
+        # The third submission has to wait for a free slot.
+        third = threading.Thread(target=self.begin_grading, args=(3,))
+        third.start()
+        third.join(0.2)
+        self.assertTrue(third.is_alive())
+
+        self.finish(2)
+        third.join(5)
+        self.assertFalse(third.is_alive())
+        self.assertEqual(sorted(submission.id for submission in self.judge.current_submissions), [1, 3])
+
+        self.finish(1)
+        self.finish(3)
+        self.assertEqual(self.judge.current_submissions, [])
+        self.assertEqual(
+            sorted(call.args for call in self.packet_manager.begin_grading_packet.call_args_list),
+            [(1, False), (2, False), (3, False)],
+        )
+
+    def test_abort_one(self):
+        self.begin_grading(1)
+        self.begin_grading(2)
+
+        self.judge.abort_grading(1)
+        self.assertTrue(self.workers[1].aborted)
+        self.assertFalse(self.workers[2].aborted)
+        self.finish(1)
+        self.packet_manager.submission_aborted_packet.assert_called_once_with(1)
+
+        self.finish(2)
+        self.assertEqual(self.judge.current_submissions, [])
+
+
+class JudgeWorkerPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = JudgeWorkerPool(1)
+        self.addCleanup(self.pool.close)
+
+    def restarts(self, reason):
+        return metrics.worker_restarts.get(reason=reason)
+
+    def test_reuse(self):
+        worker = self.pool.acquire()
+        self.pool.release(worker)
+        self.assertIs(self.pool.acquire(), worker)
+        self.assertEqual(worker.submissions_graded, 1)
+        self.pool.release(worker)
+
+    def test_recycle_after_submissions(self):
+        recycled = self.restarts('recycled')
+        with mock.patch.object(env, 'worker_max_submissions', 2):
+            worker = self.pool.acquire()
+            self.pool.release(worker)
+            self.assertIs(self.pool.acquire(), worker)
+            self.pool.release(worker)
+
+            replacement = self.pool.acquire()
+            self.assertIsNot(replacement, worker)
+            self.pool.release(replacement)
+
+        self.assertFalse(worker.worker_process.is_alive())
+        self.assertEqual(worker.worker_process.exitcode, 0)
+        self.assertEqual(self.restarts('recycled'), recycled + 1)
+
+    def test_recycle_after_memory(self):
+        worker = self.pool.acquire()
+        with mock.patch.object(worker, 'memory_usage', return_value=env.worker_max_memory):
+            self.pool.release(worker)
+        replacement = self.pool.acquire()
+        self.assertIsNot(replacement, worker)
+        self.assertFalse(worker.worker_process.is_alive())
+        self.pool.release(replacement)
+
+    def test_dead_worker(self):
+        died = self.restarts('died')
+        worker = self.pool.acquire()
+        self.pool.release(worker)
+        worker.worker_process.kill()
+        worker.worker_process.join(5)
+
+        replacement = self.pool.acquire()
+        self.assertIsNot(replacement, worker)
+        self.assertTrue(replacement.worker_process.is_alive())
+        self.assertEqual(self.restarts('died'), died + 1)
+        self.pool.release(replacement)
+
+    def test_abort(self):
+        worker = self.pool.acquire()
+        # The worker never hears of the submission nor the abort, as if it were stuck.
+        with mock.patch.object(worker.worker_process_conn, 'send') as send:
+            worker.begin_grading(make_submission(1))
+            worker.request_abort_grading()
+        self.assertEqual(send.call_args.args[0], (IPC.REQUEST_ABORT, ()))
+        # The worker doesn't acknowledge the abort, so it's killed.
+        worker.wait_for_grading_end(timeout=0)
+        worker.worker_process.join(5)
+
+        self.pool.release(worker)
+        self.assertFalse(worker.is_reusable)
+        replacement = self.pool.acquire()
+        self.assertIsNot(replacement, worker)
+        self.assertTrue(replacement.worker_process.is_alive())
+        self.pool.release(replacement)
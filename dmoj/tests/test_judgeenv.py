@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from dmoj import judgeenv
+from dmoj.judgeenv import ProblemIndex
+
+
+class ProblemIndexTest(unittest.TestCase):
+    def setUp(self):
+        self._root = tempfile.TemporaryDirectory()
+        self.roots = [os.path.join(self._root.name, 'a'), os.path.join(self._root.name, 'b')]
+        for root in self.roots:
+            os.mkdir(root)
+        self.add_problem(self.roots[0], 'p1')
+        self.add_problem(self.roots[1], 'p2')
+
+        self.dirs_patch = mock.patch('dmoj.judgeenv.problem_dirs', self.roots)
+        self.dirs_patch.start()
+        judgeenv.clear_problem_dirs_cache()
+
+        self.index = ProblemIndex()
+        self.index.watched = True
+
+    def tearDown(self):
+        self.dirs_patch.stop()
+        judgeenv.clear_problem_dirs_cache()
+        self._root.cleanup()
+
+    def add_problem(self, root, problem, mtime=1):
+        path = os.path.join(root, problem)
+        os.mkdir(path)
+        with open(os.path.join(path, 'init.yml'), 'w'):
+            pass
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_scan(self):
+        self.assertEqual(self.index.problems(), [('p1', 1), ('p2', 1)])
+
+        # Problems are found in the first root that has them.
+        self.add_problem(self.roots[1], 'p1', mtime=2)
+        self.assertEqual(self.index.update().changed, [])
+
+    def test_incremental_update(self):
+        digest = self.index.digest
+        self.add_problem(self.roots[0], 'p3')
+        os.utime(os.path.join(self.roots[1], 'p2'), (2, 2))
+        os.unlink(os.path.join(self.roots[0], 'p1', 'init.yml'))
+
+        with mock.patch.object(self.index, '_scan_all') as scan_all:
+            delta = self.index.update(['p3', 'p1'])
+            scan_all.assert_not_called()
+        self.assertEqual(delta.added, [('p3', 1)])
+        self.assertEqual(delta.removed, ['p1'])
+        # p2 wasn't reported as changed.
+        self.assertEqual(delta.changed, [])
+        self.assertNotEqual(delta.digest, digest)
+        self.assertEqual(delta.digest, self.index.digest)
+
+        delta = self.index.update(['p2'])
+        self.assertEqual(delta.changed, [('p2', 2)])
+
+    def test_problem_roots(self):
+        self.assertEqual(judgeenv.get_problem_root('p2'), os.path.join(self.roots[1], 'p2'))
+        self.add_problem(self.roots[0], 'p2')
+        self.assertEqual(judgeenv.get_problem_root('p2'), os.path.join(self.roots[1], 'p2'))
+
+        # A worker finds out the judge's caches changed when it's handed its next submission.
+        generation = judgeenv.get_problem_dirs_generation()
+        judgeenv.sync_problem_dirs_cache(generation)
+        self.assertEqual(judgeenv.get_problem_root('p2'), os.path.join(self.roots[1], 'p2'))
+        judgeenv.sync_problem_dirs_cache(generation + 1)
+        self.assertEqual(judgeenv.get_problem_root('p2'), os.path.join(self.roots[0], 'p2'))
+        self.assertEqual(judgeenv.get_problem_dirs_generation(), generation + 1)
+
+    def test_locate(self):
+        self.assertEqual(self.index.locate(os.path.join(self.roots[1], 'p2', 'data', '1.in')), ('p2', 'data/1.in'))
+        self.assertEqual(self.index.locate(os.path.join(self.roots[0], 'p1')), ('p1', ''))
+        self.assertIsNone(self.index.locate(self.roots[0]))
+        self.assertIsNone(self.index.locate(self._root.name))
+
+    def test_unwatched(self):
+        self.index.watched = False
+        self.index.problems()
+        self.add_problem(self.roots[0], 'p3')
+        self.assertIn(('p3', 1), self.index.problems())
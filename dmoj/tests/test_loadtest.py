@@ -0,0 +1,92 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from dmoj.loadtest import CorpusEntry, SiteSimulator, percentile
+from dmoj.packet import PacketManager
+
+
+class SiteSimulatorTest(unittest.TestCase):
+    def setUp(self):
+        for name, value in (
+            ('get_problem_index', mock.Mock(return_value=mock.Mock(snapshot=lambda: ([['aplusb', 0]], 'digest')))),
+            ('get_runtime_versions', mock.Mock(return_value={'PY3': []})),
+        ):
+            patch = mock.patch('dmoj.packet.' + name, value)
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def grade(self, manager, submission):
+        with self.lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        manager.begin_grading_packet(submission.id, False)
+        for position in range(1, 3):
+            result = mock.Mock(
+                result_flag=0,
+                execution_time=0.0,
+                points=1,
+                total_points=1,
+                max_memory=0,
+                output='',
+                feedback='',
+                extended_feedback='',
+                readable_codes=lambda: ['AC'],
+            )
+            time.sleep(self.case_time)
+            manager.test_case_status_packet(submission.id, position, result)
+        with self.lock:
+            self.in_flight -= 1
+        manager.grading_end_packet(submission.id)
+
+    def simulate(self, corpus, count, slots, case_time=0.0):
+        self.lock = threading.Lock()
+        self.in_flight = self.peak_in_flight = 0
+        self.case_time = case_time
+
+        simulator = SiteSimulator(corpus, count, ping_interval=0.01, seed=0)
+        simulator.listen('127.0.0.1', 0)
+        reports = []
+        site = threading.Thread(target=lambda: reports.append(simulator.run()))
+        site.start()
+
+        judge = mock.Mock()
+        manager = PacketManager('127.0.0.1', simulator.port, judge, 'judge', 'key', slots=slots)
+        judge.begin_grading.side_effect = lambda submission: threading.Thread(
+            target=self.grade, args=(manager, submission)
+        ).start()
+        runner = threading.Thread(target=manager.run)
+        runner.start()
+
+        site.join(10)
+        self.assertFalse(site.is_alive())
+        manager.close()
+        runner.join(5)
+        self.assertFalse(runner.is_alive())
+        return simulator, reports[0]
+
+    def test_simulate(self):
+        corpus = [CorpusEntry('aplusb', 'PY3', 'print(1)', 1, 65536), CorpusEntry('missing', 'PY3', '', 1, 65536)]
+        simulator, report = self.simulate(corpus, 5, 2)
+
+        self.assertEqual(report['outcomes'], {'graded': 5})
+        self.assertEqual(report['completed'], 5)
+        self.assertGreater(report['throughput'], 0)
+        self.assertEqual(report['latency']['grading']['count'], 5)
+        for submission in simulator.submissions.values():
+            self.assertEqual(submission.entry.problem, 'aplusb')
+
+    def test_fills_slots(self):
+        corpus = [CorpusEntry('aplusb', 'PY3', 'print(1)', 1, 65536)]
+        _, report = self.simulate(corpus, 8, 4, case_time=0.05)
+
+        self.assertEqual(report['completed'], 8)
+        # Every free slot is kept busy, rather than grading one submission at a time.
+        self.assertEqual(self.peak_in_flight, 4)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([], 0.5), 0.0)
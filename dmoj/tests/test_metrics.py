@@ -0,0 +1,46 @@
+import unittest
+
+from dmoj.metrics import Counter, Histogram, Registry
+
+
+class MetricsTest(unittest.TestCase):
+    def test_counter(self):
+        counter = Counter('test_total', 'Test counter.', ['result'])
+        counter.inc(result='hit')
+        counter.inc(2, result='hit')
+        counter.inc(result='mi"ss')
+        self.assertEqual(counter.get(result='hit'), 3)
+        self.assertEqual(
+            counter.render(),
+            [
+                '# HELP test_total Test counter.',
+                '# TYPE test_total counter',
+                'test_total{result="hit"} 3',
+                'test_total{result="mi\\"ss"} 1',
+            ],
+        )
+        with self.assertRaises(ValueError):
+            counter.inc(outcome='hit')
+
+    def test_histogram(self):
+        histogram = Histogram('test_seconds', 'Test histogram.', buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.count(), 4)
+        self.assertEqual(
+            histogram.render()[2:],
+            [
+                'test_seconds_bucket{le="0.1"} 2',
+                'test_seconds_bucket{le="1"} 3',
+                'test_seconds_bucket{le="+Inf"} 4',
+                'test_seconds_sum 2.65',
+                'test_seconds_count 4',
+            ],
+        )
+
+    def test_registry(self):
+        registry = Registry()
+        registry.register(Counter('test_total', 'Test counter.'))
+        with self.assertRaises(ValueError):
+            registry.register(Counter('test_total', 'Test counter.'))
+        self.assertTrue(registry.render().endswith('\n'))
@@ -0,0 +1,54 @@
+import os
+import queue
+import tempfile
+import unittest
+from unittest import mock
+
+from dmoj import judgeenv
+from dmoj.monitor import SendProblemsHandler
+
+
+class SendProblemsHandlerTest(unittest.TestCase):
+    def setUp(self):
+        self._root = tempfile.TemporaryDirectory()
+        self.root = self._root.name
+        self.dirs_patch = mock.patch('dmoj.judgeenv.problem_dirs', [self.root])
+        self.dirs_patch.start()
+        judgeenv.clear_problem_dirs_cache()
+
+        self.updates = queue.Queue()
+        self.refresher = mock.Mock()
+        self.handler = SendProblemsHandler(self.refresher, quiet_window=0.1)
+        self.handler.callback = self.updates.put
+        self.handler.start()
+
+    def tearDown(self):
+        self.handler.stop()
+        self.handler.join()
+        self.dirs_patch.stop()
+        judgeenv.clear_problem_dirs_cache()
+        self._root.cleanup()
+
+    def event(self, *path, dest_path=None):
+        self.handler.on_any_event(mock.Mock(src_path=os.path.join(self.root, *path), dest_path=dest_path))
+
+    def test_coalescing(self):
+        for i in range(10):
+            self.event('a', '%d.in' % i)
+        self.event('b', 'init.yml')
+        self.event('c', '.init.yml.swp', dest_path=os.path.join(self.root, 'd', 'init.yml'))
+
+        self.assertEqual(self.updates.get(timeout=5), {'a', 'b', 'd'})
+        self.assertTrue(self.updates.empty())
+        self.refresher.refresh.assert_called_once_with()
+
+    def test_ignored(self):
+        self.event('a', 'init.yml~')
+        self.event('a', 'tests', 'ac', 'init.yml')
+        self.event('b', 'init.yml')
+        self.assertEqual(self.updates.get(timeout=5), {'b'})
+
+    def test_unknown_path(self):
+        self.handler.on_any_event(mock.Mock(src_path=self.root, dest_path=None))
+        self.event('a', 'init.yml')
+        self.assertIsNone(self.updates.get(timeout=5))
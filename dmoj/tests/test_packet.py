@@ -0,0 +1,320 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+import unittest
+import zlib
+from unittest import mock
+
+from dmoj.packet import OutboundQueue, PacketManager, TestCaseBatch as QueuedBatch
+
+RESULT = mock.Mock(
+    result_flag=0,
+    execution_time=0.0,
+    points=1,
+    total_points=1,
+    max_memory=0,
+    output='',
+    feedback='',
+    extended_feedback='',
+    readable_codes=lambda: ['AC'],
+)
+
+
+class FakeSite:
+    """
+    Accepts a single judge connection, and speaks the site's side of the protocol on it.
+    """
+
+    def __init__(self, handshake_response):
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(1)
+        self.server.settimeout(10)
+        self.port = self.server.getsockname()[1]
+        self.conn = None
+        self.frame_sizes = []
+        self.accept(handshake_response)
+
+    def accept(self, handshake_response):
+        """
+        Accepts the next connection in the background, and completes its handshake with `handshake_response`.
+        """
+        if self.conn is not None:
+            self.conn.shutdown(socket.SHUT_RDWR)
+            self.conn.close()
+        self.handshake_response = handshake_response
+        self.compressor = self.decompressor = None
+        self.accepted = threading.Thread(target=self._accept)
+        self.accepted.start()
+
+    def _accept(self):
+        self.conn = self.server.accept()[0]
+        self.conn.settimeout(10)
+        self.file = self.conn.makefile('rwb', 0)
+        self.handshake = self.read()
+        self.send(self.handshake_response)
+        if self.handshake_response.get('protocol') == PacketManager.STREAMING_PROTOCOL:
+            self.compressor = zlib.compressobj()
+            self.decompressor = zlib.decompressobj()
+
+    def read(self):
+        size = PacketManager.SIZE_PACK.unpack(self.file.read(PacketManager.SIZE_PACK.size))[0]
+        self.frame_sizes.append(size)
+        data = self.file.read(size)
+        return json.loads(self.decompressor.decompress(data) if self.decompressor else zlib.decompress(data))
+
+    def send(self, packet):
+        data = json.dumps(packet).encode()
+        if self.compressor:
+            data = self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        else:
+            data = zlib.compress(data)
+        self.file.write(PacketManager.SIZE_PACK.pack(len(data)) + data)
+
+    def close(self):
+        self.conn.close()
+        self.server.close()
+
+
+class PacketManagerTest(unittest.TestCase):
+    def setUp(self):
+        for name, value in (
+            ('get_problem_index', mock.Mock(return_value=mock.Mock(snapshot=lambda: ([], 'digest')))),
+            ('get_runtime_versions', mock.Mock(return_value={})),
+        ):
+            patch = mock.patch('dmoj.packet.' + name, value)
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def connect(self, handshake_response):
+        self.site = FakeSite(handshake_response)
+        self.manager = PacketManager('127.0.0.1', self.site.port, mock.Mock(), 'judge', 'key')
+        self.site.accepted.join()
+        self.runner = threading.Thread(target=self.manager.run)
+        self.runner.start()
+
+    def tearDown(self):
+        self.manager.close()
+        self.runner.join(5)
+        self.assertFalse(self.runner.is_alive())
+        self.site.close()
+
+    def test_legacy(self):
+        self.connect({'name': 'handshake-success'})
+        self.assertEqual(self.site.handshake['protocol'], PacketManager.STREAMING_PROTOCOL)
+
+        self.site.send({'name': 'ping', 'when': 1})
+        self.assertEqual(self.site.read()['when'], 1)
+
+        # Packets can be sent from any thread.
+        self.manager._send_packet({'name': 'grading-end', 'submission-id': 1})
+        self.assertEqual(self.site.read(), {'name': 'grading-end', 'submission-id': 1})
+
+    def test_streaming(self):
+        self.connect({'name': 'handshake-success', 'protocol': PacketManager.STREAMING_PROTOCOL})
+        for when in range(3):
+            self.site.send({'name': 'ping', 'when': when})
+            self.assertEqual(self.site.read()['when'], when)
+
+        # Later packets benefit from the history of earlier ones.
+        self.assertLess(self.site.frame_sizes[-1], self.site.frame_sizes[1])
+
+    def test_disconnect(self):
+        self.connect({'name': 'handshake-success'})
+        self.site.send({'name': 'disconnect'})
+        self.runner.join(5)
+        self.assertFalse(self.runner.is_alive())
+        self.manager.judge.abort_grading.assert_called_once_with()
+
+    def test_resume(self):
+        self.connect({'name': 'handshake-success', 'journal': []})
+        self.manager.fallback = 0.01
+        packets = [
+            {'name': 'grading-begin', 'submission-id': 1, 'pretested': False},
+            {'name': 'batch-begin', 'submission-id': 1},
+            {'name': 'batch-end', 'submission-id': 1},
+            {'name': 'grading-begin', 'submission-id': 2, 'pretested': False},
+        ]
+        for packet in packets:
+            self.manager._send_packet(dict(packet))
+        self.assertEqual(self.site.read(), packets[0])
+
+        # The site only received the first packet before the connection dropped, and no longer wants submission 2.
+        self.site.accept({'name': 'handshake-success', 'journal': [[1, 1]]})
+        self.site.accepted.join()
+        self.assertEqual(self.site.handshake['journal'], [[1, 3], [2, 1]])
+        self.assertEqual([self.site.read(), self.site.read()], packets[1:3])
+
+        for _ in range(50):
+            if self.manager.judge.abort_grading.called:
+                break
+            time.sleep(0.1)
+        self.manager.judge.abort_grading.assert_called_once_with(2)
+
+    def test_testcase_batching(self):
+        self.connect({'name': 'handshake-success'})
+        result = RESULT
+
+        # The first result after the queue was idle is sent by itself, and the rest are batched.
+        for position in range(1, 4):
+            self.manager.test_case_status_packet(1, position, result)
+        self.assertEqual([case['position'] for case in self.site.read()['cases']], [1])
+        self.assertEqual([case['position'] for case in self.site.read()['cases']], [2, 3])
+
+        stats = self.manager.transport_stats()
+        self.assertEqual(stats['testcase_batches'], 2)
+        self.assertEqual(stats['testcase_cases_sent'], 3)
+        self.assertEqual(stats['testcase_max_batch'], 2)
+        self.assertGreaterEqual(stats['testcase_max_flush_seconds'], PacketManager.TESTCASE_BATCH_MAX_DELAY)
+
+    @mock.patch.object(PacketManager, 'TESTCASE_BATCH_MAX_DELAY', 5)
+    def test_concurrent_submissions(self):
+        self.connect({'name': 'handshake-success'})
+        self.manager.begin_grading_packet(1, False)
+        self.manager.begin_grading_packet(2, True)
+        self.manager.test_case_status_packet(1, 1, RESULT)
+        self.manager.test_case_status_packet(2, 1, RESULT)
+        self.manager.test_case_status_packet(1, 2, RESULT)
+
+        # Ending one submission only flushes its own results.
+        self.manager.grading_end_packet(1)
+        self.manager.batch_begin_packet(2)
+        self.manager.batch_end_packet(2)
+        self.manager.grading_end_packet(2)
+
+        packets = [self.site.read() for _ in range(8)]
+        self.assertEqual(
+            [(packet['name'], packet['submission-id']) for packet in packets],
+            [
+                ('grading-begin', 1),
+                ('grading-begin', 2),
+                ('test-case-status', 1),
+                ('test-case-status', 1),
+                ('grading-end', 1),
+                ('test-case-status', 2),
+                ('batch-begin', 2),
+                ('batch-end', 2),
+            ],
+        )
+        self.assertEqual([case['position'] for case in packets[3]['cases']], [2])
+        self.assertEqual(self.site.read(), {'name': 'grading-end', 'submission-id': 2})
+
+    def test_slots_busy(self):
+        self.connect({'name': 'handshake-success'})
+        free_slot = threading.Event()
+        self.manager.judge.begin_grading.side_effect = lambda submission: free_slot.wait(5)
+        for id in (1, 2):
+            self.site.send(
+                {
+                    'name': 'submission-request',
+                    'submission-id': id,
+                    'problem-id': 'aplusb',
+                    'language': 'PY3',
+                    'source': '',
+                    'time-limit': 1,
+                    'memory-limit': 65536,
+                    'short-circuit': False,
+                    'meta': {},
+                }
+            )
+
+        # While the first submission waits for a grading slot, the judge stays responsive...
+        self.site.send({'name': 'ping', 'when': 1})
+        packets = [self.site.read() for _ in range(3)]
+        self.assertEqual([packet['name'] for packet in packets], ['submission-acknowledged'] * 2 + ['ping-response'])
+
+        # ...and can abort the second before it starts.
+        self.site.send({'name': 'terminate-submission', 'submission-id': 2})
+        self.assertEqual(self.site.read(), {'name': 'submission-terminated', 'submission-id': 2})
+        self.manager.judge.abort_grading.assert_not_called()
+
+        free_slot.set()
+        self.site.send({'name': 'ping', 'when': 2})
+        self.assertEqual(self.site.read()['when'], 2)
+        # Skipping the aborted submission is all that's left for the submission thread.
+        self.manager._submission_handler.shutdown(wait=True)
+        self.assertEqual(
+            [call.args[0].id for call in self.manager.judge.begin_grading.call_args_list],
+            [1],
+        )
+
+    def set_connected(self, connected):
+        async def update():
+            if connected:
+                self.manager._connected.set()
+            else:
+                self.manager._connected.clear()
+
+        asyncio.run_coroutine_threadsafe(update(), self.manager._loop).result(5)
+
+    def fill_outbound_queue(self):
+        # Stall the link, and fill the queue, so that the next packet has to wait for it to drain.
+        self.set_connected(False)
+        self.manager._outbound.max_bytes = 1
+        self.manager._send_packet({'name': 'grading-begin', 'submission-id': 1, 'pretested': False})
+
+    def test_flush_full_queue(self):
+        self.connect({'name': 'handshake-success'})
+        self.fill_outbound_queue()
+        batch = QueuedBatch()
+        batch.cases.append((1, RESULT))
+        self.manager._testcase_queue[1] = batch
+
+        grader = threading.Thread(target=self.manager.batch_end_packet, args=(1,))
+        grader.start()
+        # Give the periodic flush a chance to contend with the blocked grading thread; the event loop must stay live.
+        time.sleep(PacketManager.TESTCASE_BATCH_MAX_DELAY)
+        self.set_connected(True)
+        grader.join(5)
+        self.assertFalse(grader.is_alive())
+
+        self.assertEqual(self.site.read()['name'], 'grading-begin')
+        self.assertEqual([case['position'] for case in self.site.read()['cases']], [1])
+        self.assertEqual(self.site.read()['name'], 'batch-end')
+
+    def test_test_case_full_queue(self):
+        self.connect({'name': 'handshake-success'})
+        self.fill_outbound_queue()
+
+        # Results after an idle queue are sent immediately, which has to wait for space.
+        grader = threading.Thread(target=self.manager.test_case_status_packet, args=(1, 1, RESULT))
+        grader.start()
+        time.sleep(PacketManager.TESTCASE_BATCH_MAX_DELAY)
+        self.set_connected(True)
+        grader.join(5)
+        self.assertFalse(grader.is_alive())
+
+        self.assertEqual(self.site.read()['name'], 'grading-begin')
+        self.assertEqual([case['position'] for case in self.site.read()['cases']], [1])
+
+
+class OutboundQueueTest(unittest.TestCase):
+    def test_backpressure(self):
+        queue = OutboundQueue(10)
+        # An empty queue takes packets of any size.
+        queue.wait_for_space(100)
+        queue.put(b'x' * 8)
+
+        blocked = threading.Thread(target=queue.wait_for_space, args=(8,))
+        blocked.start()
+        time.sleep(0.1)
+        self.assertTrue(blocked.is_alive())
+        queue.put(b'z')
+
+        queue.pop(1)
+        blocked.join(5)
+        self.assertFalse(blocked.is_alive())
+        self.assertEqual(queue.peek(), [b'z'])
+        self.assertEqual(queue.blocked_count, 1)
+        self.assertEqual(queue.peak_bytes, 9)
+
+    def test_close(self):
+        queue = OutboundQueue(10)
+        queue.put(b'x' * 8)
+        blocked = threading.Thread(target=queue.wait_for_space, args=(8,))
+        blocked.start()
+        queue.close()
+        blocked.join(5)
+        self.assertFalse(blocked.is_alive())
@@ -0,0 +1,68 @@
+import threading
+import time
+import unittest
+
+from dmoj.judge import ParallelCaseRunner
+from dmoj.result import Result
+
+
+class FakeCase:
+    output_prefix_length = 0
+
+    def __init__(self, position, delay=0.0):
+        self.position = position
+        self.delay = delay
+
+
+class FakeGrader:
+    def __init__(self):
+        self.graded = []
+        self.killed_threads = []
+        self.release = threading.Event()
+
+    def grade(self, case):
+        if case.delay < 0:
+            self.release.wait(5)
+        else:
+            time.sleep(case.delay)
+        self.graded.append(case.position)
+        return Result(case, result_flag=Result.AC)
+
+    def end_case(self):
+        pass
+
+    def abort_grading_in_thread(self, thread_id):
+        self.killed_threads.append(thread_id)
+        self.release.set()
+
+
+class ParallelCaseRunnerTest(unittest.TestCase):
+    def test_results_in_order(self):
+        grader = FakeGrader()
+        # Earlier cases take longer, so they finish last.
+        cases = [FakeCase(i, delay=0.05 * (4 - i)) for i in range(4)]
+        runner = ParallelCaseRunner(grader, cases, 4)
+        try:
+            results = [runner.result(case) for case in cases]
+        finally:
+            runner.close()
+
+        self.assertEqual([result.case.position for result in results], [0, 1, 2, 3])
+        self.assertEqual(sorted(grader.graded), [0, 1, 2, 3])
+        self.assertNotEqual(grader.graded, [0, 1, 2, 3])
+
+    def test_cancel(self):
+        grader = FakeGrader()
+        blocked, queued = FakeCase(0, delay=-1), FakeCase(1)
+        runner = ParallelCaseRunner(grader, [blocked, queued], 1)
+        try:
+            # Wait until the first case is running.
+            while not runner._running:
+                time.sleep(0.01)
+            runner.cancel([blocked, queued])
+            self.assertIsNone(runner.result(queued))
+        finally:
+            runner.close()
+
+        self.assertEqual(len(grader.killed_threads), 1)
+        self.assertEqual(grader.graded, [0])
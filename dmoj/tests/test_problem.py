@@ -1,9 +1,19 @@
 import os
+import tempfile
 import unittest
+import zipfile
 from unittest import mock
 
 from dmoj.config import InvalidInitException
-from dmoj.problem import Problem, ProblemDataManager
+from dmoj.problem import (
+    ArchiveCache,
+    NormalizedDataCache,
+    Problem,
+    ProblemDataManager,
+    ProblemMetadataCache,
+    TestCase as ProblemTestCase,
+)
+from dmoj.utils.disk_cache import DiskCache
 
 
 class ProblemTest(unittest.TestCase):
@@ -98,3 +108,308 @@ class ProblemTest(unittest.TestCase):
 
     def tearDown(self):
         self.data_patch.stop()
+
+
+class ProblemDataManagerTest(unittest.TestCase):
+    def setUp(self):
+        self._root = tempfile.TemporaryDirectory()
+        self.root = self._root.name
+        with open(os.path.join(self.root, 'plain.in'), 'wb') as f:
+            f.write(b'plain\n')
+        with open(os.path.join(self.root, 'empty.in'), 'wb'):
+            pass
+
+        archive_path = os.path.join(self.root, 'data.zip')
+        with zipfile.ZipFile(archive_path, 'w') as archive:
+            archive.writestr('stored.in', b'stored\n', zipfile.ZIP_STORED)
+            archive.writestr('deflated.in', b'deflated\n' * 100, zipfile.ZIP_DEFLATED)
+
+        self.data = ProblemDataManager(mock.Mock(root_dir=self.root))
+        self.data.archive = zipfile.ZipFile(archive_path)
+
+    def tearDown(self):
+        del self.data
+        self._root.cleanup()
+
+    def test_plain_file(self):
+        self.assertEqual(self.data['plain.in'], b'plain\n')
+        self.assertEqual(self.data.get_buffer('plain.in'), b'plain\n')
+        self.assertEqual(self.data.get_buffer('empty.in'), b'')
+
+    def test_archive_members(self):
+        self.assertEqual(self.data.get_buffer('stored.in'), b'stored\n')
+        self.assertEqual(self.data['deflated.in'], b'deflated\n' * 100)
+        self.assertEqual(self.data.get_buffer('deflated.in'), b'deflated\n' * 100)
+
+    def test_get_path(self):
+        self.data.get_buffer('plain.in')
+        self.assertEqual(self.data.get_path('plain.in'), os.path.join(self.root, 'plain.in'))
+
+        self.data.get_buffer('stored.in')
+        self.assertIsNone(self.data.get_path('stored.in'))
+
+        self.data.get_buffer('deflated.in')
+        self.assertIsNone(self.data.get_path('deflated.in'))
+
+    def test_get_identity(self):
+        identity = self.data.get_identity('plain.in')
+        self.assertEqual(identity, self.data.get_identity('plain.in'))
+
+        with open(os.path.join(self.root, 'plain.in'), 'wb') as f:
+            f.write(b'changed\n')
+        os.utime(os.path.join(self.root, 'plain.in'), ns=(0, 0))
+        self.assertNotEqual(self.data.get_identity('plain.in'), identity)
+
+        self.assertIsNotNone(self.data.get_identity('stored.in'))
+        self.data['memory.in'] = b'memory\n'
+        self.assertIsNone(self.data.get_identity('memory.in'))
+
+    def test_is_immutable(self):
+        self.data.get_buffer('plain.in')
+        self.assertFalse(self.data.is_immutable('plain.in'))
+
+        with mock.patch(
+            'dmoj.problem._archive_cache', ArchiveCache(DiskCache(os.path.join(self.root, 'cache'), 10, 1024))
+        ):
+            self.data.get_buffer('deflated.in')
+        self.assertTrue(self.data.is_immutable('deflated.in'))
+
+    def test_missing(self):
+        with self.assertRaises(KeyError):
+            self.data['missing.in']
+
+
+class ArchiveCacheTest(unittest.TestCase):
+    def setUp(self):
+        self._root = tempfile.TemporaryDirectory()
+        self.root = self._root.name
+        self.cache_root = os.path.join(self.root, 'cache')
+        self.archive_path = os.path.join(self.root, 'data.zip')
+        self.write_archive(b'deflated\n')
+
+    def tearDown(self):
+        self._root.cleanup()
+
+    def write_archive(self, data):
+        with zipfile.ZipFile(self.archive_path, 'w') as archive:
+            archive.writestr('dir/', b'')
+            archive.writestr('stored.in', b'stored\n', zipfile.ZIP_STORED)
+            archive.writestr('dir/deflated.in', data, zipfile.ZIP_DEFLATED)
+
+    def get_data(self, cache):
+        data = ProblemDataManager(mock.Mock(root_dir=self.root))
+        data.archive = zipfile.ZipFile(self.archive_path)
+        with mock.patch('dmoj.problem._archive_cache', cache):
+            data.get_buffer('stored.in')
+            data.get_buffer('dir/deflated.in')
+        return data
+
+    def test_extraction(self):
+        data = self.get_data(ArchiveCache(DiskCache(self.cache_root, 10, 1024)))
+        self.assertEqual(data.get_buffer('dir/deflated.in'), b'deflated\n')
+        with open(data.get_path('dir/deflated.in'), 'rb') as f:
+            self.assertEqual(f.read(), b'deflated\n')
+        with open(data.get_path('stored.in'), 'rb') as f:
+            self.assertEqual(f.read(), b'stored\n')
+        with self.assertRaises(KeyError):
+            data.get_buffer('missing.in')
+
+        # Another process finds the extraction.
+        cache = ArchiveCache(DiskCache(self.cache_root, 10, 1024))
+        with mock.patch.object(cache, '_extract') as extract:
+            other = self.get_data(cache)
+            extract.assert_not_called()
+        self.assertEqual(other.get_path('stored.in'), data.get_path('stored.in'))
+
+    def test_stale_extraction(self):
+        cache = ArchiveCache(DiskCache(self.cache_root, 10, 1024))
+        old_path = self.get_data(cache).get_path('stored.in')
+
+        self.write_archive(b'changed\n')
+        data = self.get_data(cache)
+        self.assertEqual(data.get_buffer('dir/deflated.in'), b'changed\n')
+        self.assertFalse(os.path.exists(os.path.dirname(os.path.dirname(old_path))))
+
+
+class NormalizedDataCacheTest(unittest.TestCase):
+    def setUp(self):
+        self._root = tempfile.TemporaryDirectory()
+        self.root = self._root.name
+
+    def tearDown(self):
+        self._root.cleanup()
+
+    def normalizer(self, data, path=None):
+        calls = []
+
+        def normalize():
+            calls.append(None)
+            return data, path
+
+        return normalize, calls
+
+    def test_hit(self):
+        cache = NormalizedDataCache(10, 1024)
+        normalize, calls = self.normalizer(b'data\n', '/path')
+        self.assertEqual(cache.get('a', normalize), (b'data\n', '/path'))
+        self.assertEqual(cache.get('a', normalize), (b'data\n', '/path'))
+        self.assertEqual(len(calls), 1)
+
+    def test_eviction(self):
+        cache = NormalizedDataCache(2, 10)
+        for key in ('a', 'b', 'c'):
+            cache.get(key, self.normalizer(b'1234\n')[0])
+        normalize, calls = self.normalizer(b'1234\n')
+        cache.get('a', normalize)
+        self.assertEqual(len(calls), 1)
+
+        # Too large to cache at all.
+        normalize, calls = self.normalizer(b'x' * 11)
+        cache.get('d', normalize)
+        cache.get('d', normalize)
+        self.assertEqual(len(calls), 2)
+
+    def test_shared(self):
+        disk_cache = DiskCache(self.root, 10, 1024)
+        cache = NormalizedDataCache(10, 1024, disk_cache)
+        buffer, path = cache.get('a', self.normalizer(b'normalized\n')[0])
+        self.assertEqual(buffer, b'normalized\n')
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'normalized\n')
+
+        # Another process finds the copy on disk.
+        normalize, calls = self.normalizer(b'normalized\n')
+        self.assertEqual(NormalizedDataCache(10, 1024, disk_cache).get('a', normalize), (b'normalized\n', path))
+        self.assertEqual(calls, [])
+
+    def test_mutable_files_copied(self):
+        with open(os.path.join(self.root, 'plain.in'), 'wb') as f:
+            f.write(b'plain\n')
+        config = mock.Mock(points=1, output_prefix_length=0, binary_data=False)
+        problem = mock.Mock(id='problem', root_dir=self.root)
+        problem.problem_data = ProblemDataManager(problem)
+
+        with mock.patch('dmoj.problem._normalized_data_cache', NormalizedDataCache(10, 1024)):
+            buffer, path = ProblemTestCase(1, None, config, problem)._normalized_file('plain.in')
+            # Problem files can be truncated in place, so the cache must not keep a map of them.
+            self.assertIsInstance(buffer, bytes)
+            self.assertIsNone(path)
+
+            with open(os.path.join(self.root, 'plain.in'), 'r+b') as f:
+                f.truncate(0)
+            self.assertEqual(buffer, b'plain\n')
+
+
+class FakeGenerator:
+    def __init__(self, source):
+        self.source = source
+        process = mock.Mock()
+        process.unsafe_communicate.return_value = (b'generated', b'')
+        self.launch = mock.Mock(return_value=process)
+
+
+class GeneratorCacheTest(unittest.TestCase):
+    def setUp(self):
+        self._root = tempfile.TemporaryDirectory()
+        self.root = self._root.name
+        for name, value in (
+            ('get_generator_output_cache', mock.Mock(return_value=DiskCache(self.root, 10, 1024))),
+            ('get_problem_root', mock.Mock(return_value=self.root)),
+            ('parse_helper_file_error', mock.Mock()),
+        ):
+            patch = mock.patch('dmoj.problem.' + name, value)
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self._root.cleanup()
+
+    def run_generator(self, generator, args=('1', '2')):
+        config = mock.MagicMock(points=1, output_prefix_length=0, binary_data=False)
+        config.__getitem__.return_value = None
+        problem = mock.Mock(id='problem')
+        problem.generator_manager.get_generator.return_value = generator
+        case = ProblemTestCase(1, None, config, problem)
+        case._run_generator('gen.cpp', args=list(args))
+        return case._generated
+
+    def test_cached(self):
+        generator = FakeGenerator(b'int main() {}')
+        self.assertEqual(self.run_generator(generator), [b'generated\n', b''])
+        self.assertEqual(generator.launch.call_count, 1)
+
+        # A later submission, possibly in another worker, reuses the output.
+        self.assertEqual(self.run_generator(generator), [b'generated\n', b''])
+        self.assertEqual(generator.launch.call_count, 1)
+
+    def test_invalidation(self):
+        generator = FakeGenerator(b'int main() {}')
+        self.run_generator(generator)
+
+        changed = FakeGenerator(b'int main() { return 0; }')
+        self.run_generator(changed)
+        self.assertEqual(changed.launch.call_count, 1)
+
+        self.run_generator(generator, args=('1', '3'))
+        self.assertEqual(generator.launch.call_count, 2)
+        self.run_generator(generator, args=('1', '3'))
+        self.assertEqual(generator.launch.call_count, 2)
+
+
+class ProblemMetadataCacheTest(unittest.TestCase):
+    def setUp(self):
+        self._root = tempfile.TemporaryDirectory()
+        self.root = self._root.name
+        self.write('init.yml', 'archive: data.zip\ncustom_judge: grader.py\n')
+        self.write('grader.py', 'loads = []\n')
+        with zipfile.ZipFile(os.path.join(self.root, 'data.zip'), 'w') as archive:
+            archive.writestr('1.in', b'')
+            archive.writestr('1.out', b'')
+
+        self.cache_patch = mock.patch('dmoj.problem._problem_metadata_cache', ProblemMetadataCache(10))
+        self.cache_patch.start()
+        self.root_patch = mock.patch('dmoj.problem.get_problem_root', return_value=self.root)
+        self.root_patch.start()
+
+    def tearDown(self):
+        self.root_patch.stop()
+        self.cache_patch.stop()
+        self._root.cleanup()
+
+    def write(self, name, content, mtime_ns=None):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        if mtime_ns is not None:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    def test_reuse(self):
+        first = Problem('test', 2, 16384, {'id': 1})
+        with mock.patch('dmoj.problem.yaml.safe_load') as safe_load:
+            second = Problem('test', 2, 16384, {'id': 2})
+            safe_load.assert_not_called()
+
+        self.assertEqual(second.config.test_cases.unwrap(), [{'in': '1.in', 'out': '1.out', 'points': 1}])
+        self.assertEqual(second.config.meta.id, 2)
+        self.assertIs(first.problem_data.archive, second.problem_data.archive)
+        self.assertIs(first.load_module('grader.py'), second.load_module('grader.py'))
+
+        # Submissions can't see each other's changes to the configuration.
+        second.config['points'] = 10
+        self.assertEqual(Problem('test', 2, 16384, {}).config.points, 1)
+
+    def test_invalidation(self):
+        problem = Problem('test', 2, 16384, {})
+        grader = problem.load_module('grader.py')
+
+        self.write('init.yml', 'archive: data.zip\ncustom_judge: grader.py\npoints: 5\n', mtime_ns=0)
+        self.write('grader.py', 'loads = [1]\n', mtime_ns=0)
+        problem = Problem('test', 2, 16384, {})
+        self.assertEqual(problem.config.test_cases[0].points, 5)
+        self.assertIsNot(problem.load_module('grader.py'), grader)
+        self.assertEqual(problem.load_module('grader.py').loads, [1])
+
+    def test_dynamic_keys(self):
+        self.write('init.yml', 'archive: data.zip\npoints+: "len(node.meta.name)"\n')
+        self.assertEqual(Problem('test', 2, 16384, {'name': 'ab'}).config.points, 2)
+        self.assertEqual(Problem('test', 2, 16384, {'name': 'abc'}).config.points, 3)
@@ -0,0 +1,59 @@
+import threading
+import unittest
+
+from dmoj.utils import timing
+
+
+class TimingTest(unittest.TestCase):
+    def tearDown(self):
+        timing.end_submission()
+
+    def test_no_submission(self):
+        with timing.span('compile'):
+            pass
+        self.assertIsNone(timing.end_submission())
+
+    def test_spans(self):
+        timings = timing.begin_submission()
+        with timing.span('compile'):
+            pass
+
+        def grade(position):
+            with timing.case(position):
+                with timing.span('communicate'):
+                    pass
+                with timing.span('communicate'):
+                    pass
+
+        threads = [threading.Thread(target=grade, args=(position,)) for position in (1, 2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        @timing.span('check')
+        def check():
+            pass
+
+        check()
+        self.assertIs(timing.end_submission(), timings)
+
+        result = timings.to_dict()
+        self.assertEqual(
+            {stage: totals['count'] for stage, totals in result['stages'].items()},
+            {'compile': 1, 'case': 2, 'communicate': 4, 'check': 1},
+        )
+        self.assertEqual(sorted(result['cases']), [1, 2])
+        for case in result['cases'].values():
+            self.assertEqual(sorted(case), ['case', 'communicate'])
+            self.assertGreaterEqual(case['case'], case['communicate'])
+
+    def test_syscalls(self):
+        timing.syscalls({'open': {'count': 1, 'seconds': 0.5}})
+        timings = timing.begin_submission()
+        timing.syscalls({'open': {'count': 2, 'seconds': 0.25}, 'kill': {'count': 1, 'seconds': 0.125}})
+        timing.syscalls({'open': {'count': 3, 'seconds': 0.5}})
+        self.assertEqual(
+            timings.to_dict()['syscalls'],
+            {'open': {'count': 5, 'seconds': 0.75}, 'kill': {'count': 1, 'seconds': 0.125}},
+        )
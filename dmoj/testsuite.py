@@ -38,7 +38,10 @@ class TestManager:
     def supported_problems_packet(self, problems):
         pass
 
-    def test_case_status_packet(self, position, result):
+    def supported_problems_delta_packet(self, delta):
+        pass
+
+    def test_case_status_packet(self, submission_id, position, result):
         code = result.readable_codes()[0]
         if position in self.codes_cases:
             if code not in self.codes_cases[position]:
@@ -65,35 +68,35 @@ class TestManager:
         if feedback is not None and result.feedback not in feedback:
             self.fail('Unexpected feedback: "%s", expected: "%s"' % (result.feedback, '", "'.join(feedback)))
 
-    def compile_error_packet(self, log):
+    def compile_error_packet(self, submission_id, log):
         if 'CE' not in self.codes_all:
             self.fail('Unexpected compile error')
 
-    def compile_message_packet(self, log):
+    def compile_message_packet(self, submission_id, log):
         pass
 
-    def internal_error_packet(self, message):
+    def internal_error_packet(self, submission_id, message):
         allow_IE = 'IE' in self.codes_all
         allow_feedback = not self.feedback_all or any(map(lambda feedback: feedback in message, self.feedback_all))
         if not allow_IE or not allow_feedback:
             self.fail('Unexpected internal error:\n' + message)
 
-    def begin_grading_packet(self, is_pretested):
+    def begin_grading_packet(self, submission_id, is_pretested):
         pass
 
-    def grading_end_packet(self):
+    def grading_end_packet(self, submission_id, timings=None):
         pass
 
-    def batch_begin_packet(self):
+    def batch_begin_packet(self, submission_id):
         pass
 
-    def batch_end_packet(self):
+    def batch_end_packet(self, submission_id):
         pass
 
     def current_submission_packet(self):
         pass
 
-    def submission_aborted_packet(self):
+    def submission_aborted_packet(self, submission_id):
         pass
 
     def submission_acknowledged_packet(self, sub_id):
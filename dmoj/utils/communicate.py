@@ -1,13 +1,108 @@
 import errno
+import fcntl
 import os
 import select
+import sys
 
-from dmoj.error import OutputLimitExceeded
+from dmoj.error import OutputLimitExceeded, OutputRejected
 
-_PIPE_BUF = getattr(select, 'PIPE_BUF', 512)
+# The fcntl module only exposes F_SETPIPE_SZ from Python 3.10 onwards.
+_F_SETPIPE_SZ = getattr(fcntl, 'F_SETPIPE_SZ', 1031 if sys.platform.startswith('linux') else None)
 
+# Pipes are grown to this size where possible, so that data moves in few, large system calls. This is the default
+# maximum for unprivileged processes (/proc/sys/fs/pipe-max-size).
+PIPE_SIZE = 1048576
 
-def safe_communicate(proc, input=None, outlimit=None, errlimit=None):
+# Output buffers start out this large, and double in size whenever they fill up, until they reach the output limit.
+INITIAL_BUFFER_SIZE = 65536
+
+
+def _grow_pipe(fd):
+    if _F_SETPIPE_SZ is None:
+        return
+    try:
+        fcntl.fcntl(fd, _F_SETPIPE_SZ, PIPE_SIZE)
+    except OSError:
+        # Not a pipe (e.g. a pty), or pipe-max-size is lower than we'd like; the default size still works.
+        pass
+
+
+def _readinto(fd, buffer):
+    try:
+        return os.readv(fd, [buffer])
+    except OSError as e:
+        # Reading the master side of a pty whose slave has been closed fails with EIO instead of returning EOF.
+        if e.errno == errno.EIO:
+            return 0
+        raise
+
+
+class _OutputBuffer:
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        # One byte past the limit is enough to tell that the limit was exceeded.
+        self.data = bytearray(min(INITIAL_BUFFER_SIZE, limit + 1))
+        self.length = 0
+        self.rejected = False
+
+    def read_from(self, fd):
+        """
+        Reads whatever is available from `fd` straight into the buffer. Returns False at end of file.
+        """
+        if self.length == len(self.data):
+            self.data += bytes(min(len(self.data), self.limit + 1 - len(self.data)))
+
+        with memoryview(self.data)[self.length :] as window:
+            read = _readinto(fd, window)
+        self.length += read
+        return read > 0
+
+    @property
+    def exceeded(self):
+        return self.length > self.limit
+
+    def getvalue(self):
+        del self.data[self.length :]
+        return bytes(self.data)
+
+
+class _StreamedOutput(_OutputBuffer):
+    """
+    Feeds output to a consumer as it is read, rather than accumulating it. Only the first `keep` bytes are kept.
+    """
+
+    def __init__(self, name, limit, consumer, keep):
+        super().__init__(name, limit)
+        self.consumer = consumer
+        self.keep = keep
+        self.prefix = bytearray()
+        # Every read reuses the same buffer.
+        self.data = bytearray(min(PIPE_SIZE, limit + 1))
+
+    def read_from(self, fd):
+        with memoryview(self.data) as buffer:
+            read = _readinto(fd, buffer)
+            if read:
+                self.length += read
+                with buffer[:read] as chunk:
+                    if len(self.prefix) < self.keep:
+                        self.prefix += chunk[: self.keep - len(self.prefix)]
+                    if not self.exceeded and not self.consumer.feed(chunk):
+                        self.rejected = True
+        return read > 0
+
+    def getvalue(self):
+        return bytes(self.prefix)
+
+
+def safe_communicate(proc, input=None, outlimit=None, errlimit=None, stdout_consumer=None, stdout_prefix_length=0):
+    """
+    Feeds `input` to the process, and returns its stdout and stderr once it exits.
+
+    If `stdout_consumer` is given, stdout is passed chunk by chunk to its `feed` method as soon as it is read, and only
+    its first `stdout_prefix_length` bytes are returned. `OutputRejected` is raised once `feed` returns False.
+    """
     if outlimit is None:
         outlimit = 10485760
     if errlimit is None:
@@ -23,8 +118,6 @@ def safe_communicate(proc, input=None, outlimit=None, errlimit=None):
     stderr = None  # Return
     fd2file = {}
     fd2output = {}
-    fd2length = {}
-    fd2limit = {}
 
     poller = select.poll()
 
@@ -38,19 +131,26 @@ def safe_communicate(proc, input=None, outlimit=None, errlimit=None):
         fd2file.pop(fd)
 
     if proc.stdin and input:
+        # Slices of a memoryview don't copy the input, however large the writes.
+        input = memoryview(input).cast('B')
+        _grow_pipe(proc.stdin.fileno())
+        # A write larger than PIPE_BUF blocks until all of it fits in the pipe, even once polled as writable.
+        os.set_blocking(proc.stdin.fileno(), False)
         register_and_append(proc.stdin, select.POLLOUT)
 
     select_POLLIN_POLLPRI = select.POLLIN | select.POLLPRI
     if proc.stdout:
+        _grow_pipe(proc.stdout.fileno())
         register_and_append(proc.stdout, select_POLLIN_POLLPRI)
-        fd2output[proc.stdout.fileno()] = stdout = []
-        fd2length[proc.stdout.fileno()] = 0
-        fd2limit[proc.stdout.fileno()] = outlimit
+        if stdout_consumer is None:
+            stdout = _OutputBuffer('stdout', outlimit)
+        else:
+            stdout = _StreamedOutput('stdout', outlimit, stdout_consumer, stdout_prefix_length)
+        fd2output[proc.stdout.fileno()] = stdout
     if proc.stderr:
+        _grow_pipe(proc.stderr.fileno())
         register_and_append(proc.stderr, select_POLLIN_POLLPRI)
-        fd2output[proc.stderr.fileno()] = stderr = []
-        fd2length[proc.stderr.fileno()] = 0
-        fd2limit[proc.stderr.fileno()] = errlimit
+        fd2output[proc.stderr.fileno()] = stderr = _OutputBuffer('stderr', errlimit)
 
     input_offset = 0
     while fd2file:
@@ -63,9 +163,10 @@ def safe_communicate(proc, input=None, outlimit=None, errlimit=None):
 
         for fd, mode in ready:
             if mode & select.POLLOUT:
-                chunk = input[input_offset : input_offset + _PIPE_BUF]
                 try:
-                    input_offset += os.write(fd, chunk)
+                    input_offset += os.write(fd, input[input_offset:])
+                except BlockingIOError:
+                    continue
                 except OSError as e:
                     if e.errno == errno.EPIPE:
                         close_unregister_and_remove(fd)
@@ -75,23 +176,20 @@ def safe_communicate(proc, input=None, outlimit=None, errlimit=None):
                     if input_offset >= len(input):
                         close_unregister_and_remove(fd)
             elif mode & select_POLLIN_POLLPRI:
-                data = os.read(fd, 4096)
-                if not data:
+                output = fd2output[fd]
+                if not output.read_from(fd):
                     close_unregister_and_remove(fd)
-                fd2output[fd].append(data)
-                fd2length[fd] += len(data)
-                if fd2length[fd] > fd2limit[fd]:
+                if output.exceeded:
                     proc.mark_ole()
-                    raise OutputLimitExceeded(
-                        'stdout' if proc.stdout is not None and proc.stdout.fileno() == fd else 'stderr', fd2limit[fd]
-                    )
+                    raise OutputLimitExceeded(output.name, output.limit)
+                if output.rejected:
+                    raise OutputRejected(output.getvalue())
             else:
                 # Ignore hang up or errors.
                 close_unregister_and_remove(fd)
 
-    # All data exchanged.  Translate lists into strings.
-    stdout = b''.join(stdout) if stdout is not None else b''
-    stderr = b''.join(stderr) if stderr is not None else b''
+    stdout = stdout.getvalue() if stdout is not None else b''
+    stderr = stderr.getvalue() if stderr is not None else b''
 
     proc.wait()
     return stdout, stderr
@@ -0,0 +1,231 @@
+import fcntl
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+log = logging.getLogger(__name__)
+
+# Temporary files and directories left behind in the cache root by a process that died before committing them are
+# removed once they are this old.
+STALE_TEMPORARY_AGE = 86400  # seconds
+
+
+class DiskCacheEntry:
+    """
+    A committed cache entry. While the entry is open, it holds a shared lock that keeps it from being evicted.
+    """
+
+    def __init__(self, path: str, metadata: Dict[str, Any], fd: int) -> None:
+        self.path = path
+        self.metadata = metadata
+        self._fd: Optional[int] = fd
+
+    @classmethod
+    def open(cls, path: str, metadata: Dict[str, Any]) -> 'DiskCacheEntry':
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+        except OSError:
+            os.close(fd)
+            raise
+        return cls(path, metadata, fd)
+
+    def duplicate(self) -> 'DiskCacheEntry':
+        return DiskCacheEntry.open(self.path, self.metadata)
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __del__(self):
+        self.close()
+
+
+class DiskCache:
+    """
+    A directory of files or directories, shared between processes and persisted across restarts.
+
+    Entries are stored as `<root>/<key>`. `<root>/index.json` records the size and metadata of every entry, and is only
+    ever rewritten while holding an exclusive lock on `<root>/.lock`; lookups only need a shared lock, and record use
+    in the modification time of the entry itself instead. Least recently used entries are evicted once there are more
+    than `max_entries` of them, or they take up more than `max_bytes`; entries held open by any process are never
+    evicted.
+    """
+
+    INDEX_FILE = 'index.json'
+    LOCK_FILE = '.lock'
+
+    def __init__(self, root: str, max_entries: int, max_bytes: int) -> None:
+        self.root = root
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    @contextmanager
+    def _lock(self, operation: int) -> Iterator[None]:
+        with open(os.path.join(self.root, self.LOCK_FILE), 'a') as lock:
+            fcntl.flock(lock, operation)
+            yield
+
+    @contextmanager
+    def _locked_index(self) -> Iterator[Dict[str, Dict[str, Any]]]:
+        with self._lock(fcntl.LOCK_EX):
+            index = self._read_index()
+            yield index
+            self._write_index(index)
+
+    def _read_index(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.root, self.INDEX_FILE)) as f:
+                return json.load(f)['entries']
+        except (IOError, ValueError, KeyError):
+            return {}
+
+    def _write_index(self, index: Dict[str, Dict[str, Any]]) -> None:
+        fd, temp_path = tempfile.mkstemp(prefix='.index', dir=self.root)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'entries': index}, f)
+        os.replace(temp_path, os.path.join(self.root, self.INDEX_FILE))
+
+    def get(self, key: str) -> Optional[DiskCacheEntry]:
+        # Entries are only removed under the exclusive lock, so one can't be evicted between looking it up and locking
+        # it open.
+        with self._lock(fcntl.LOCK_SH):
+            info = self._read_index().get(key)
+            if info is None:
+                return None
+
+            try:
+                entry = DiskCacheEntry.open(self._path(key), info['metadata'])
+            except OSError:
+                # Someone removed the entry behind our back; the next eviction drops it from the index.
+                return None
+
+            _touch(entry.path)
+            return entry
+
+    def put(self, key: str, path: str, metadata: Optional[Dict[str, Any]] = None) -> DiskCacheEntry:
+        """
+        Moves the file or directory at `path` into the cache under `key`. `path` must be on the same filesystem as the
+        cache root. If another process committed `key` first, its entry is kept and `path` is deleted.
+        """
+        metadata = metadata or {}
+        size = _disk_usage(path)
+
+        with self._locked_index() as index:
+            target = self._path(key)
+            # Everyone commits while holding the index lock, so this can't race.
+            if os.path.lexists(target):
+                _remove(path)
+                info = index.get(key)
+                if info is not None:
+                    metadata = info['metadata']
+                    size = info['size']
+            else:
+                os.rename(path, target)
+
+            _touch(target)
+            index[key] = {'size': size, 'metadata': metadata}
+            entry = DiskCacheEntry.open(target, metadata)
+            self._evict(index)
+            return entry
+
+    def discard(self, key: str) -> None:
+        """
+        Removes the entry for `key` ahead of eviction, unless some process holds it open.
+        """
+        with self._locked_index() as index:
+            if key in index:
+                self._remove_entry(index, key)
+
+    def _evict(self, index: Dict[str, Dict[str, Any]]) -> None:
+        total_size = sum(info['size'] for info in index.values())
+        for key in sorted(index, key=self._last_used):
+            if len(index) <= self.max_entries and total_size <= self.max_bytes:
+                break
+
+            size = index[key]['size']
+            if self._remove_entry(index, key):
+                total_size -= size
+
+        self._remove_stale_temporaries(index)
+
+    def _last_used(self, key: str) -> float:
+        try:
+            return os.lstat(self._path(key)).st_mtime
+        except OSError:
+            # Already gone, so it may as well go first.
+            return 0.0
+
+    def _remove_entry(self, index: Dict[str, Dict[str, Any]], key: str) -> bool:
+        path = self._path(key)
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            del index[key]
+            return True
+
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            # In use by some process; try again on the next eviction.
+            return False
+        else:
+            _remove(path)
+            del index[key]
+            log.info('Evicted cache entry: %s', path)
+            return True
+        finally:
+            os.close(fd)
+
+    def _remove_stale_temporaries(self, index: Dict[str, Dict[str, Any]]) -> None:
+        cutoff = time.time() - STALE_TEMPORARY_AGE
+        for name in os.listdir(self.root):
+            if name in index or name in (self.INDEX_FILE, self.LOCK_FILE):
+                continue
+            path = self._path(name)
+            try:
+                if os.lstat(path).st_mtime < cutoff:
+                    _remove(path)
+            except OSError:
+                pass
+
+
+def _disk_usage(path: str) -> int:
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+
+    size = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def _touch(path: str) -> None:
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _remove(path: str) -> None:
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
@@ -2,6 +2,7 @@ import ctypes
 import ctypes.util
 import os
 import signal
+import tempfile
 
 from dmoj.utils.unicode import utf8bytes
 
@@ -51,3 +52,27 @@ def find_exe_in_path(path):
 def bool_env(name):
     value = os.environ.get(name, '')
     return value.lower() in ('true', 'yes', '1', 'y', 't')
+
+
+def anonymous_file(name, dir=None):
+    """
+    Creates a file that exists only for as long as it is open, and returns a read-write file descriptor to it.
+
+    Uses a memfd where available; otherwise, falls back to an unlinked temporary file in `dir`.
+    """
+    memfd_create = getattr(os, 'memfd_create', None)
+    if memfd_create is not None:
+        try:
+            return memfd_create(name, os.MFD_CLOEXEC)
+        except OSError:
+            pass
+
+    fd, path = tempfile.mkstemp(prefix=name, dir=dir)
+    os.unlink(path)
+    return fd
+
+
+def write_all(fd, data):
+    data = memoryview(data)
+    while data:
+        data = data[os.write(fd, data) :]
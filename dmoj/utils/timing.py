@@ -0,0 +1,127 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+
+class SubmissionTimings:
+    """
+    Time spent in each stage of grading a submission, in total and for each test case, and how often notable events
+    (e.g. cache hits) happened.
+
+    Spans recorded while a thread is grading a case, i.e. within `case`, are attributed to that case as well.
+
+    Also totals the syscalls made by sandboxed processes that trapped into the tracer, and the time spent handling them.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.cases: Dict[int, Dict[str, float]] = {}
+        self.events: Dict[str, int] = {}
+        self.syscalls: Dict[str, Dict[str, float]] = {}
+
+    def record(self, stage: str, seconds: float) -> None:
+        position = getattr(self._local, 'case', None)
+        with self._lock:
+            totals = self.stages.setdefault(stage, {'count': 0, 'seconds': 0.0})
+            totals['count'] += 1
+            totals['seconds'] += seconds
+            if position is not None:
+                case = self.cases.setdefault(position, {})
+                case[stage] = case.get(stage, 0.0) + seconds
+
+    def count(self, event: str) -> None:
+        with self._lock:
+            self.events[event] = self.events.get(event, 0) + 1
+
+    def add_syscalls(self, profile: Dict[str, Dict[str, float]]) -> None:
+        with self._lock:
+            for name, traps in profile.items():
+                totals = self.syscalls.setdefault(name, {'count': 0, 'seconds': 0.0})
+                totals['count'] += traps['count']
+                totals['seconds'] += traps['seconds']
+
+    @contextmanager
+    def case(self, position: int) -> Iterator[None]:
+        self._local.case = position
+        try:
+            with span('case'):
+                yield
+        finally:
+            self._local.case = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'stages': {stage: dict(totals) for stage, totals in self.stages.items()},
+                'cases': {position: dict(case) for position, case in sorted(self.cases.items())},
+                'events': dict(self.events),
+                'syscalls': {name: dict(totals) for name, totals in self.syscalls.items()},
+            }
+
+
+# Timings of the submission being graded by this process, if any.
+_current: Optional[SubmissionTimings] = None
+
+
+def begin_submission() -> SubmissionTimings:
+    global _current
+    _current = SubmissionTimings()
+    return _current
+
+
+def end_submission() -> Optional[SubmissionTimings]:
+    global _current
+    timings, _current = _current, None
+    return timings
+
+
+def count(event: str) -> None:
+    """
+    Counts an occurrence of `event` for the submission being graded.
+    """
+    timings = _current
+    if timings is not None:
+        timings.count(event)
+
+
+def syscalls(profile: Dict[str, Dict[str, float]]) -> None:
+    """
+    Adds the syscall trap profile of a sandboxed process to the submission being graded.
+    """
+    timings = _current
+    if timings is not None:
+        timings.add_syscalls(profile)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """
+    Records the time spent in the body against `stage` of the submission being graded. Also usable as a decorator.
+    """
+    timings = _current
+    if timings is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.record(stage, time.perf_counter() - start)
+
+
+@contextmanager
+def case(position: int) -> Iterator[None]:
+    """
+    Records the time spent grading case `position`, attributing any spans recorded by this thread meanwhile to it.
+    """
+    timings = _current
+    if timings is None:
+        yield
+        return
+
+    with timings.case(position):
+        yield
@@ -125,7 +125,7 @@ class build_ext_dmoj(build_ext, object):
 
 
 cptbox_sources = ['_cptbox.pyx', 'helper.cpp', 'ptdebug.cpp', 'ptdebug_x86.cpp', 'ptdebug_x64.cpp',
-                  'ptdebug_arm.cpp', 'ptdebug_arm64.cpp', 'ptdebug_freebsd_x64.cpp', 'ptproc.cpp']
+                  'ptdebug_arm.cpp', 'ptdebug_arm64.cpp', 'ptdebug_freebsd_x64.cpp', 'ptproc.cpp', 'ptpolicy.cpp']
 
 if not has_pyx:
     cptbox_sources[0] = cptbox_sources[0].replace('.pyx', '.cpp')
@@ -171,6 +171,7 @@ setup(
             'dmoj = dmoj.judge:main',
             'dmoj-cli = dmoj.cli:main',
             'dmoj-autoconf = dmoj.executors.autoconfig:main',
+            'dmoj-loadtest = dmoj.loadtest:main',
         ],
     },
     ext_modules=cythonize(extensions),